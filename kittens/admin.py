@@ -1,7 +1,16 @@
 from django.contrib import admin
 from kittens import models
 
+
+class RatingAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'kitten', 'user', 'rating')
+    # Rating.__str__ обращается к котенку и пользователю - без select_related это запрос на каждую строку
+    list_select_related = ('kitten', 'user')
+    raw_id_fields = ('kitten', 'user')
+
+
 # Register your models here.
 admin.site.register(models.Breed)
 admin.site.register(models.Kitten)
-admin.site.register(models.Rating)
\ No newline at end of file
+admin.site.register(models.Rating, RatingAdmin)
+admin.site.register(models.LeaderboardEntry)
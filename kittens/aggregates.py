@@ -0,0 +1,96 @@
+"""Инкрементальное обновление агрегатов оценок котёнка
+
+Каждое изменение оценки превращается в набор приращений полей `Kitten`
+(`rating_count`, `rating_sum`, `rating_<n>_count`), которые применяются
+одним `UPDATE ... SET field = field + delta`. Вызывать внутри транзакции,
+в которой изменяется сама оценка.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from kittens import models
+
+
+RATING_VALUES = range(1, 6)
+HISTOGRAM_FIELDS = {value: f'rating_{value}_count' for value in RATING_VALUES}
+AGGREGATE_FIELDS = ('rating_count', 'rating_sum', *HISTOGRAM_FIELDS.values())
+
+
+def rating_deltas(old, new):
+    """Приращения агрегатов при смене оценки `old` на `new` (None - оценки нет)."""
+    deltas = defaultdict(int)
+    if old is not None:
+        deltas['rating_count'] -= 1
+        deltas['rating_sum'] -= old
+        deltas[HISTOGRAM_FIELDS[old]] -= 1
+    if new is not None:
+        deltas['rating_count'] += 1
+        deltas['rating_sum'] += new
+        deltas[HISTOGRAM_FIELDS[new]] += 1
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def apply_rating_changes(changes, using=None):
+    """
+    Применяет изменения оценок одним UPDATE.
+
+    `changes` - итерируемое из кортежей `(kitten_id, old, new)`.
+    """
+    per_kitten = defaultdict(lambda: defaultdict(int))
+    for kitten_id, old, new in changes:
+        for field, delta in rating_deltas(old, new).items():
+            per_kitten[kitten_id][field] += delta
+
+    updates = {}
+    for field in AGGREGATE_FIELDS:
+        whens = [
+            When(id=kitten_id, then=Value(deltas[field]))
+            for kitten_id, deltas in per_kitten.items() if deltas.get(field)
+        ]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0))
+
+    if updates:
+        kitten_ids = [kitten_id for kitten_id, deltas in per_kitten.items() if any(deltas.values())]
+        models.Kitten.objects.using(using).filter(id__in=kitten_ids).update(**updates)
+
+
+def apply_rating_change(kitten_id, old, new, using=None):
+    apply_rating_changes([(kitten_id, old, new)], using=using)
+
+
+def actual_aggregates():
+    """Аннотации `Kitten` с агрегатами, посчитанными заново по таблице `Rating`."""
+    annotations = {
+        'actual_rating_count': Count('rating'),
+        'actual_rating_sum': Coalesce(Sum('rating__rating'), 0),
+    }
+    for value, field in HISTOGRAM_FIELDS.items():
+        annotations[f'actual_{field}'] = Count('rating', filter=Q(rating__rating=value))
+    return annotations
+
+
+def drifted_kittens():
+    """Котята, у которых сохраненные агрегаты расходятся с таблицей `Rating`."""
+    drift = Q()
+    for field in AGGREGATE_FIELDS:
+        drift |= ~Q(**{field: F(f'actual_{field}')})
+    return models.Kitten.objects.annotate(**actual_aggregates()).filter(drift).order_by('id')
+
+
+def refresh_kitten_aggregates(kitten_id, using=None):
+    """Пересчитывает агрегаты одного котёнка по таблице `Rating`."""
+    actual = (
+        models.Kitten.objects.using(using)
+        .filter(id=kitten_id)
+        .annotate(**actual_aggregates())
+        .values(*(f'actual_{field}' for field in AGGREGATE_FIELDS))
+        .first()
+    )
+    if actual is not None:
+        models.Kitten.objects.using(using).filter(id=kitten_id).update(
+            **{field: actual[f'actual_{field}'] for field in AGGREGATE_FIELDS}
+        )
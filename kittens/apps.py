@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KittensConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kittens'
+
+    def ready(self):
+        from kittens import signals  # noqa: F401
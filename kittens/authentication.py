@@ -0,0 +1,182 @@
+"""Аутентификация
+
+Пользователь аутентифицированного запроса строится из утверждений JWT
+(`user_id`, `username`) без чтения строки из таблицы пользователей. Из БД
+берется только признак `is_active`, и тот через небольшой кэш в памяти
+процесса с ограничением по размеру (LRU) и времени жизни записей (TTL).
+Сохранение или удаление пользователя обновляет запись кэша своего процесса
+сигналом; в остальных процессах изменение станет видно не позже чем через
+`USER_CACHE_TTL` секунд.
+
+Пароли при входе проверяются в пуле процессов (`PooledModelBackend`).
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kittens import hashing
+from kittens import timing
+from kittens.conf import kitten_setting
+
+
+UserState = namedtuple('UserState', ['is_active', 'username'])
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш, записи которого устаревают через `ttl` секунд."""
+
+    def __init__(self, size_setting, ttl_setting):
+        self.size_setting = size_setting
+        self.ttl_setting = ttl_setting
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + kitten_setting(self.ttl_setting)
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > kitten_setting(self.size_setting):
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_states = TTLCache('USER_CACHE_SIZE', 'USER_CACHE_TTL')
+
+
+def remember_user(user):
+    """Обновляет состояние пользователя в кэше (вызывается по сигналам модели пользователя)."""
+    user_states.set(user.pk, UserState(user.is_active, user.get_username()))
+
+
+def forget_user(user_id):
+    user_states.pop(user_id)
+
+
+def get_user_state(user_id):
+    """Состояние пользователя из кэша, при промахе - одним запросом к БД. None, если пользователя нет."""
+    state = user_states.get(user_id)
+    if state is None:
+        User = get_user_model()
+        row = User.objects.filter(pk=user_id).values_list('is_active', User.USERNAME_FIELD).first()
+        if row is None:
+            return None
+        state = UserState(*row)
+        user_states.set(user_id, state)
+    return state
+
+
+class ClaimsUser(TokenUser):
+    """
+    Пользователь, построенный из утверждений токена.
+
+    Подходит везде, где нужен только id пользователя (`request.user.pk`).
+    Модель пользователя загружается из БД при первом обращении к `instance`.
+    """
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.state.username
+
+    @property
+    def is_active(self):
+        return self.state.is_active
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.pk)
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend, который проверяет пароль в пуле процессов `kittens.hashing`."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Как и ModelBackend, тратим время на хеширование, чтобы по времени ответа
+            # нельзя было узнать, существует ли пользователь
+            hashing.make_password(password)
+            return None
+
+        valid, must_update = hashing.check_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user
+
+
+class UserRefreshToken(RefreshToken):
+    """RefreshToken с утверждением `username`; оно копируется и в токен доступа."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.get_username()
+        return token
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, время работы которой попадает в этап `auth` заголовка Server-Timing."""
+
+    def authenticate(self, request):
+        with timing.timed('auth'):
+            return super().authenticate(request)
+
+
+class ClaimsJWTAuthentication(TimedJWTAuthentication):
+    """JWT-аутентификация без загрузки пользователя из БД: `request.user` - это `ClaimsUser`."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Токен не содержит идентификатор пользователя")
+
+        state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed("Пользователь не найден", code='user_not_found')
+        if not state.is_active:
+            raise AuthenticationFailed("Пользователь неактивен", code='user_inactive')
+        return ClaimsUser(validated_token, state)
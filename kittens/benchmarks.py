@@ -0,0 +1,239 @@
+"""Бенчмарк эндпоинтов kittens/urls.py
+
+Для каждого URL из `kittens.urls.urlpatterns` описан сценарий запроса
+(`CASES`). Сценарий выполняется через тестовый клиент Django на текущей
+базе, для каждого запроса замеряются время, количество SQL-запросов и
+размер ответа. Данные для прогона создает команда `seed_synthetic`.
+
+`run_slow_clients()` нагружает уже запущенный HTTP-сервер (например, gunicorn
+с `settings.wsgi` и uvicorn с `settings.asgi`) большим числом медленных
+клиентов: каждый открывает соединение, отправляет начало запроса, простаивает
+и только потом дописывает заголовки и читает ответ. Клиенты для всех серверов
+одинаковы (один цикл событий, сырые сокеты), поэтому разница в результатах -
+это разница серверов: синхронный воркер держит на медленном соединении поток
+или процесс, асинхронный - только сокет.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from kittens import models
+from kittens import urls
+from kittens.authentication import UserRefreshToken
+
+
+User = get_user_model()
+
+
+class BenchmarkContext:
+    """Данные, на которых строятся запросы сценариев."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.user = User.objects.filter(kitten__isnull=False).order_by('id').first()
+        if self.user is None:
+            raise RuntimeError("Нет данных для бенчмарка, сначала запустите seed_synthetic")
+
+        self.kitten_ids = list(models.Kitten.objects.values_list('id', flat=True)[:10000])
+        self.own_kitten_ids = list(models.Kitten.objects.filter(owner=self.user).values_list('id', flat=True))
+        self.breed_ids = list(models.Breed.objects.values_list('id', flat=True))
+        refresh = UserRefreshToken.for_user(self.user)
+        self.refresh_token = str(refresh)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {refresh.access_token}'}
+
+    def kitten_id(self):
+        return self.random.choice(self.kitten_ids)
+
+    def own_kitten_id(self):
+        return self.random.choice(self.own_kitten_ids)
+
+    def breed_id(self):
+        return self.random.choice(self.breed_ids)
+
+    def catalog_query(self):
+        return self.random.choice([
+            {},
+            {'breed': f'{self.breed_id()},{self.breed_id()}', 'ordering': '-rating'},
+            {'color': 'Белый', 'age_min': 2, 'age_max': 24, 'ordering': 'name'},
+            {'min_rating': 4, 'ordering': '-age'},
+        ])
+
+    def search_query(self):
+        return self.random.choice(['Белый', 'Рыжий кот', 'Порода 1', 'Бенчмарк', 'Черепах'])
+
+    def new_kitten(self):
+        return {
+            'name': 'Бенчмарк',
+            'color': 'Белый',
+            'age_in_months': 3,
+            'description': 'Котёнок, созданный бенчмарком',
+            'breed': self.breed_id(),
+        }
+
+    def manage_request(self):
+        method = self.random.choice(['post', 'put', 'delete'])
+        if method == 'post':
+            return 'post', self.new_kitten(), True
+        if method == 'put':
+            return 'put', {'kitten_id': self.own_kitten_id(), 'age_in_months': self.random.randint(1, 100)}, True
+        return 'delete', {'kitten_id': self.disposable_kitten_id()}, True
+
+    def disposable_kitten_id(self):
+        """Котёнок пользователя, созданный заранее, чтобы его удалить в замеряемом запросе."""
+        return models.Kitten.objects.create(owner=self.user, breed_id=self.breed_id(), **{
+            key: value for key, value in self.new_kitten().items() if key != 'breed'
+        }).id
+
+
+# Сценарии: имя URL -> функция, возвращающая (метод, тело запроса, нужна ли авторизация)
+CASES = {
+    'register': lambda ctx: ('post', {'username': f'bench-{uuid.uuid4().hex}', 'password': 'password'}, False),
+    'token_obtain_pair': lambda ctx: ('post', {'username': ctx.user.username, 'password': 'password'}, False),
+    'token_refresh': lambda ctx: ('post', {'refresh': ctx.refresh_token}, False),
+    'breedlist': lambda ctx: ('get', None, False),
+    'kittenlist': lambda ctx: ('get', None, False),
+    'kittenbybreed': lambda ctx: ('post', {'breed_id': ctx.breed_id()}, False),
+    'kittencatalog': lambda ctx: ('get', ctx.catalog_query(), False),
+    'kittenexport': lambda ctx: ('get', None, False),
+    'kittensearch': lambda ctx: ('get', {'q': ctx.search_query()}, False),
+    'kittendetail': lambda ctx: ('post', {'kitten_id': ctx.kitten_id()}, False),
+    'mykittens': lambda ctx: ('get', None, True),
+    'leaderboard': lambda ctx: ('get', None, False),
+    'kittenmanage': lambda ctx: ctx.manage_request(),
+    'ratekitten': lambda ctx: ('post', {'kitten_id': ctx.kitten_id(), 'rating_value': ctx.random.randint(1, 5)}, True),
+    'ratekittenbatch': lambda ctx: ('post', [
+        {'kitten_id': ctx.kitten_id(), 'rating_value': ctx.random.randint(1, 5)} for _ in range(100)
+    ], True),
+}
+
+
+def url_names():
+    return [pattern.name for pattern in urls.urlpatterns if pattern.name]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_case(client, ctx, name, requests, warmup=3):
+    """Выполняет сценарий `requests` раз и возвращает сводку замеров."""
+    path = reverse(name)
+    durations, queries, sizes, statuses = [], [], [], {}
+
+    for iteration in range(warmup + requests):
+        method, body, auth = CASES[name](ctx)
+        kwargs = {'content_type': 'application/json'} if body is not None else {}
+        if auth:
+            kwargs.update(ctx.auth)
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data=body, **kwargs)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+
+        if iteration < warmup:
+            continue
+        durations.append(elapsed * 1000)
+        queries.append(len(captured.captured_queries))
+        sizes.append(len(content))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    return {
+        'path': path,
+        'requests': requests,
+        'p50_ms': percentile(durations, 50),
+        'p95_ms': percentile(durations, 95),
+        'p99_ms': percentile(durations, 99),
+        'mean_ms': float(np.mean(durations)),
+        'queries_per_request': float(np.mean(queries)),
+        'max_queries': int(max(queries)),
+        'bytes_per_response': float(np.mean(sizes)),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def run(requests=100, warmup=3, only=None, seed=0):
+    """Прогоняет все сценарии. URL без сценария попадают в результат с пометкой `skipped`."""
+    ctx = BenchmarkContext(seed=seed)
+    client = Client()
+    results = {}
+    for name in url_names():
+        if only and name not in only:
+            continue
+        if name not in CASES:
+            results[name] = {'skipped': True}
+            continue
+        results[name] = run_case(client, ctx, name, requests, warmup)
+    return results
+
+
+def summarize(latencies, statuses, elapsed):
+    return {
+        'requests': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def run_slow_clients(url, connections, idle, timeout=60.0):
+    """
+    `connections` одновременных медленных клиентов сервера по адресу `url`.
+
+    Клиент отправляет строку запроса и заголовок Host, `idle` секунд
+    простаивает, затем дописывает остальные заголовки и читает ответ до
+    закрытия соединения. Задержка отсчитывается от открытия соединения.
+    Соединения, которые не удалось открыть или завершить за `timeout`
+    секунд, учитываются с кодом `error`.
+    """
+    parts = urlsplit(url)
+    target = parts.path or '/'
+    if parts.query:
+        target = f'{target}?{parts.query}'
+
+    async def client():
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            writer.write(f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n'.encode())
+            await writer.drain()
+            await asyncio.sleep(idle)
+            writer.write(b'Connection: close\r\n\r\n')
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        return status_line.split()[1].decode()
+
+    async def timed_client():
+        started = time.perf_counter()
+        try:
+            code = await asyncio.wait_for(client(), timeout)
+        except (OSError, IndexError, asyncio.TimeoutError):
+            code = 'error'
+        return time.perf_counter() - started, code
+
+    async def run_all():
+        return await asyncio.gather(*(timed_client() for _ in range(connections)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for _, code in results:
+        statuses[code] = statuses.get(code, 0) + 1
+    return summarize([latency * 1000 for latency, _ in results], statuses, elapsed)
@@ -0,0 +1,96 @@
+"""Кэш списка пород в памяти процесса
+
+Сериализованный список пород хранится в памяти процесса вместе с номером
+версии, под которым он был построен. Номер версии лежит в кэше Django
+(`django.core.cache`) и увеличивается сигналами `post_save`/`post_delete`
+модели `Breed`. Пока версия не изменилась, запрос не обращается к БД.
+
+С кэшем по умолчанию (LocMemCache) версия видна только своему процессу;
+чтобы изменения пород сразу замечали все рабочие процессы, в `CACHES`
+нужно настроить общий бэкенд (Redis, Memcached).
+"""
+
+import hashlib
+import json
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from kittens import models
+from kittens import serializers
+
+
+BREED_LIST_VERSION_KEY = 'kittens:breedlist:version'
+
+BreedList = namedtuple('BreedList', ['version', 'etag', 'data'])
+
+_breed_list = None
+
+
+def _new_version():
+    # Уникальное значение, чтобы после вытеснения ключа из кэша не вернуться к старой версии
+    return time.time_ns()
+
+
+def breed_list_version():
+    version = cache.get(BREED_LIST_VERSION_KEY)
+    if version is None:
+        cache.add(BREED_LIST_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(BREED_LIST_VERSION_KEY)
+    return version
+
+
+async def abreed_list_version():
+    version = await cache.aget(BREED_LIST_VERSION_KEY)
+    if version is None:
+        await cache.aadd(BREED_LIST_VERSION_KEY, _new_version(), timeout=None)
+        version = await cache.aget(BREED_LIST_VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(BREED_LIST_VERSION_KEY)
+    except ValueError:
+        cache.set(BREED_LIST_VERSION_KEY, _new_version(), timeout=None)
+
+
+def bump_breed_list_version():
+    """
+    Сбрасывает кэш списка пород. Версия увеличивается сразу и еще раз после
+    фиксации транзакции, чтобы параллельный запрос, успевший прочитать
+    незафиксированное состояние, не закэшировал его под новой версией.
+    """
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def _build_breed_list(version, breeds):
+    global _breed_list
+
+    data = serializers.BreedSerializer(breeds, many=True).data
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    etag = '"%s"' % hashlib.sha256(payload).hexdigest()
+    breed_list = BreedList(version, etag, data)
+    _breed_list = breed_list
+    return breed_list
+
+
+def get_breed_list():
+    """Возвращает `BreedList` для текущей версии, при необходимости строя его заново."""
+    version = breed_list_version()
+    breed_list = _breed_list
+    if breed_list is not None and breed_list.version == version:
+        return breed_list
+    return _build_breed_list(version, models.Breed.objects.all())
+
+
+async def aget_breed_list():
+    """Асинхронный вариант `get_breed_list()`."""
+    version = await abreed_list_version()
+    breed_list = _breed_list
+    if breed_list is not None and breed_list.version == version:
+        return breed_list
+    return _build_breed_list(version, [breed async for breed in models.Breed.objects.all()])
@@ -0,0 +1,120 @@
+"""Каталог котят с фильтрами, сортировками и фасетами
+
+Параметры запроса `/api/kittens` разбираются в `CatalogQuery`: фильтры
+превращаются в условия queryset, сортировка - в ключ курсорной пагинации
+(`KeysetPaginator`). Для каждой сортировки есть составные индексы без
+фильтра и с фильтром по породе или цвету (см. `Kitten.Meta.indexes`).
+
+Фасеты - количество подходящих котят по породам и цветам - считаются одним
+запросом `GROUP BY breed_id, color`, суммы по каждому фасету складываются
+в Python.
+"""
+
+from collections import Counter
+
+from django.db.models import Count
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from kittens import models
+
+
+# Значение параметра `ordering` -> поле модели
+SORT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'age': 'age_in_months',
+    'rating': 'rating_average',
+}
+
+
+class InvalidCatalogParameter(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'invalid_catalog_parameter'
+
+    def __init__(self, name):
+        super().__init__({"error": f"Некорректный параметр '{name}'"})
+
+
+def parse_int_list(params, name):
+    """Список id из повторяющегося параметра и/или значений через запятую (`breed=1,2&breed=3`)."""
+    try:
+        return [int(value) for raw in params.getlist(name) for value in raw.split(',') if value]
+    except ValueError:
+        raise InvalidCatalogParameter(name)
+
+
+def parse_number(params, name, cast=int, minimum=0):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        raise InvalidCatalogParameter(name)
+    if value < minimum:
+        raise InvalidCatalogParameter(name)
+    return value
+
+
+class CatalogQuery:
+    """Фильтры и сортировка каталога из параметров запроса."""
+
+    def __init__(self, params):
+        self.breed_ids = parse_int_list(params, 'breed')
+        self.colors = [color for color in params.getlist('color') if color]
+        self.age_min = parse_number(params, 'age_min')
+        self.age_max = parse_number(params, 'age_max')
+        self.owner_id = parse_number(params, 'owner')
+        self.min_rating = parse_number(params, 'min_rating', cast=float)
+
+        ordering = params.get('ordering', 'id')
+        field = SORT_FIELDS.get(ordering.lstrip('-'))
+        if field is None:
+            raise InvalidCatalogParameter('ordering')
+        prefix = '-' if ordering.startswith('-') else ''
+        # id замыкает ключ сортировки, чтобы он был уникальным
+        self.ordering = (f'{prefix}{field}',) if field == 'id' else (f'{prefix}{field}', f'{prefix}id')
+
+    def filter(self, queryset):
+        if self.breed_ids:
+            queryset = queryset.filter(breed_id__in=self.breed_ids)
+        if self.colors:
+            queryset = queryset.filter(color__in=self.colors)
+        if self.age_min is not None:
+            queryset = queryset.filter(age_in_months__gte=self.age_min)
+        if self.age_max is not None:
+            queryset = queryset.filter(age_in_months__lte=self.age_max)
+        if self.owner_id is not None:
+            queryset = queryset.filter(owner_id=self.owner_id)
+        if self.min_rating is not None:
+            queryset = queryset.filter(rating_average__gte=self.min_rating)
+        return queryset
+
+    def queryset(self):
+        return self.filter(models.Kitten.objects.all())
+
+    def facets_queryset(self):
+        return (
+            self.queryset()
+            .order_by()
+            .values('breed_id', 'color')
+            .annotate(count=Count('id'))
+        )
+
+
+def build_facets(rows):
+    """Фасеты из строк (breed_id, color, count) сгруппированного запроса."""
+    breeds, colors = Counter(), Counter()
+    for row in rows:
+        breeds[row['breed_id']] += row['count']
+        colors[row['color']] += row['count']
+    return {
+        'breed': [{'id': breed_id, 'count': count} for breed_id, count in by_count(breeds)],
+        'color': [{'value': color, 'count': count} for color, count in by_count(colors)],
+    }
+
+
+def by_count(counter):
+    """Значения по убыванию количества, при равенстве - по возрастанию значения."""
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,66 @@
+"""Настройки приложения kittens"""
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Размер страницы по умолчанию для списков с курсорной пагинацией
+    'PAGE_SIZE': 100,
+    # Максимальный размер страницы, который может запросить клиент
+    'MAX_PAGE_SIZE': 1000,
+    # Сколько мест хранится в общем рейтинге и в рейтинге каждой породы
+    'LEADERBOARD_SIZE': 100,
+    # Вес априорной средней оценки в байесовской формуле (None - среднее число оценок у котёнка)
+    'LEADERBOARD_PRIOR_WEIGHT': None,
+    # Максимальное количество оценок в одном запросе /api/ratekitten/batch
+    'RATING_BATCH_MAX_SIZE': 1000,
+    # Максимальное количество котят в одном пакетном запросе /api/kittenmanage
+    'KITTEN_BATCH_MAX_SIZE': 1000,
+    # Максимальное количество котят в одном пакетном запросе /api/kittendetail
+    'KITTEN_DETAIL_BATCH_MAX_SIZE': 100,
+    # Сколько строк читается из курсора БД за раз при выгрузке /api/kittens/export
+    'EXPORT_CHUNK_SIZE': 2000,
+    # Доля запросов, для которых ServerTimingMiddleware замеряет этапы обработки (0 - выключено)
+    'SERVER_TIMING_SAMPLE_RATE': 0.0,
+    # Каталог, через который воркеры объединяют метрики для /metrics (None - только текущий процесс)
+    'METRICS_DIR': None,
+    # Как часто (в секундах) процесс сохраняет свои метрики в METRICS_DIR
+    'METRICS_FLUSH_INTERVAL': 1.0,
+    # Сколько пользователей хранит кэш состояний JWT-аутентификации
+    'USER_CACHE_SIZE': 10000,
+    # Через сколько секунд запись кэша состояний пользователей перечитывается из БД
+    'USER_CACHE_TTL': 60,
+    # Каталог снимка /api/kittenlist (kittens/snapshot.py); None - снимок не используется
+    'SNAPSHOT_DIR': None,
+    # Как часто (в секундах) сборщик снимка проверяет изменения котят
+    'SNAPSHOT_DEBOUNCE': 2.0,
+    # Запускать сборщик снимка в веб-процессах (собирает один из них, держатель блокировки файла);
+    # False - снимок обновляет команда build_catalog_snapshot --watch
+    'SNAPSHOT_BUILDER_THREAD': True,
+    # Псевдонимы реплик из DATABASES для чтения (kittens/routers.py); пустой список - все запросы в default
+    'REPLICAS': [],
+    # Сколько секунд после записи клиент читает из default, пока реплики догоняют основную БД
+    'REPLICA_PIN_SECONDS': 5,
+    # Реплика с большим отставанием (в секундах) не используется для чтения
+    'REPLICA_MAX_LAG': 10.0,
+    # Как часто (в секундах) проверяется отставание каждой реплики
+    'REPLICA_LAG_CHECK_INTERVAL': 1.0,
+    # Отложенная запись оценок /api/ratekitten через очередь PendingRating (kittens/rating_queue.py)
+    'RATING_QUEUE': False,
+    # Пауза (в секундах) между переносами очереди в таблицу оценок
+    'RATING_QUEUE_FLUSH_INTERVAL': 0.2,
+    # Сколько строк очереди переносится одной транзакцией
+    'RATING_QUEUE_BATCH_SIZE': 5000,
+    # Переносить очередь в фоновом потоке веб-процесса (только при одном процессе);
+    # по умолчанию очередь переносит один процесс - команда flush_ratings
+    'RATING_QUEUE_FLUSH_THREAD': False,
+    # Процессов в пуле хеширования паролей (0 - хешировать в потоке запроса)
+    'HASHING_WORKERS': 2,
+    # Сколько задач хеширования может ждать и выполняться одновременно; остальные получают 503
+    'HASHING_MAX_PENDING': 64,
+}
+
+
+def kitten_setting(name):
+    """Возвращает значение из словаря `KITTENS` в settings.py или значение по умолчанию."""
+    return getattr(settings, 'KITTENS', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,130 @@
+"""Хеширование и проверка паролей в пуле процессов
+
+PBKDF2 занимает сотни миллисекунд процессорного времени и держит GIL,
+поэтому при всплеске регистраций и входов хеширование на потоке запроса
+замедляет все остальные эндпоинты того же воркера. Здесь эта работа
+выполняется в общем для процесса пуле из `HASHING_WORKERS` процессов
+(`spawn`, без копии состояния Django). Одновременно в пуле может быть не
+больше `HASHING_MAX_PENDING` задач, включая выполняемые; сверх этого задача
+отклоняется исключением `HashingPoolBusy` (503 с заголовком `Retry-After`).
+
+Синхронные функции ждут результат на потоке запроса (WSGI), асинхронные -
+в цикле событий (ASGI). `HASHING_WORKERS = 0` отключает пул: хеширование
+выполняется в вызывающем потоке, лимит задач при этом не действует.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from kittens import metrics
+from kittens.conf import kitten_setting
+
+
+class HashingPoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервер перегружен запросами авторизации, повторите попытку позже."
+    default_code = 'hashing_pool_busy'
+    # DRF передает это значение в заголовке Retry-After
+    wait = 1
+
+
+# Функции, выполняемые в процессах пула
+
+def _init_worker(password_hashers):
+    if not settings.configured:
+        settings.configure(PASSWORD_HASHERS=password_hashers)
+
+
+def _make_password(password):
+    return hashers.make_password(password)
+
+
+def _check_password(password, encoded):
+    """Возвращает (пароль верен, хеш нужно пересчитать по текущим настройкам)."""
+    must_update = False
+
+    def setter(raw_password):
+        nonlocal must_update
+        must_update = True
+
+    return hashers.check_password(password, encoded, setter), must_update
+
+
+# Пул
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=kitten_setting('HASHING_WORKERS'),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(list(settings.PASSWORD_HASHERS),),
+                )
+    return _pool
+
+
+def _reserve(operation):
+    global _pending
+    with _pending_lock:
+        if _pending >= kitten_setting('HASHING_MAX_PENDING'):
+            metrics.registry.inc('kittens_hashing_rejected_total', {'operation': operation})
+            raise HashingPoolBusy()
+        _pending += 1
+    metrics.registry.inc('kittens_hashing_pending', {})
+
+
+def _release(operation, started):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    metrics.registry.inc('kittens_hashing_pending', {}, -1)
+    metrics.registry.observe('kittens_hashing_duration_seconds', {'operation': operation}, time.perf_counter() - started)
+
+
+def submit(operation, func, *args):
+    """Отправляет задачу в пул и возвращает Future или бросает HashingPoolBusy, если очередь заполнена."""
+    _reserve(operation)
+    started = time.perf_counter()
+    try:
+        future = get_pool().submit(func, *args)
+    except BaseException:
+        _release(operation, started)
+        raise
+    future.add_done_callback(lambda _: _release(operation, started))
+    return future
+
+
+def make_password(password):
+    if not kitten_setting('HASHING_WORKERS'):
+        return hashers.make_password(password)
+    return submit('make_password', _make_password, password).result()
+
+
+async def amake_password(password):
+    if not kitten_setting('HASHING_WORKERS'):
+        return hashers.make_password(password)
+    return await asyncio.wrap_future(submit('make_password', _make_password, password))
+
+
+def check_password(password, encoded):
+    """Проверяет пароль; возвращает (пароль верен, хеш нужно пересчитать)."""
+    if not kitten_setting('HASHING_WORKERS'):
+        return _check_password(password, encoded)
+    return submit('check_password', _check_password, password, encoded).result()
@@ -0,0 +1,143 @@
+"""Пересчет рейтинга котят
+
+Все пары `(kitten_id, rating)` выгружаются в массивы NumPy (на PostgreSQL -
+через `COPY TO STDOUT`), суммы и количества оценок считаются через
+`bincount`, а байесовская оценка
+
+    score = (C * m + sum) / (C + count)
+
+где `m` - средняя оценка по всем котятам, `C` - вес априорной оценки,
+вычисляется векторно. Результат записывается в `LeaderboardEntry`
+в одной транзакции, поэтому читатели видят либо старый, либо новый рейтинг.
+"""
+
+import io
+import itertools
+
+import numpy as np
+from django.db import connection, transaction
+
+from kittens import models
+from kittens.conf import kitten_setting
+
+
+def _copy_pairs(sql):
+    """Выгружает две целочисленные колонки через COPY TO STDOUT (только PostgreSQL)."""
+    buffer = io.BytesIO()
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT", buffer)
+    if not buffer.tell():
+        return np.empty((0, 2), dtype=np.int64)
+    buffer.seek(0)
+    return np.loadtxt(buffer, dtype=np.int64, delimiter='\t', ndmin=2).reshape(-1, 2)
+
+
+def _iterate_pairs(queryset, chunk_size):
+    flat = itertools.chain.from_iterable(queryset.iterator(chunk_size=chunk_size))
+    return np.fromiter(flat, dtype=np.int64).reshape(-1, 2)
+
+
+def _load_pairs(model, fields, chunk_size):
+    if connection.vendor == 'postgresql':
+        columns = ', '.join(model._meta.get_field(field).column for field in fields)
+        return _copy_pairs(f"SELECT {columns} FROM {model._meta.db_table}")
+    return _iterate_pairs(model.objects.order_by().values_list(*fields), chunk_size)
+
+
+def load_ratings(chunk_size=50000):
+    """Возвращает массивы id котят и оценок."""
+    pairs = _load_pairs(models.Rating, ('kitten', 'rating'), chunk_size)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def load_breeds(chunk_size=50000):
+    """Возвращает массив, в котором по индексу id котёнка лежит id его породы (0 - котёнка нет)."""
+    pairs = _load_pairs(models.Kitten, ('id', 'breed'), chunk_size)
+
+    breed_of = np.zeros(pairs[:, 0].max() + 1 if len(pairs) else 1, dtype=np.int64)
+    breed_of[pairs[:, 0]] = pairs[:, 1]
+    return breed_of
+
+
+def compute_scores(kitten_ids, values, prior_weight=None):
+    """
+    Считает байесовские оценки.
+
+    Возвращает массивы id оцененных котят, количества оценок, средних и
+    байесовских оценок.
+    """
+    counts = np.bincount(kitten_ids)
+    sums = np.bincount(kitten_ids, weights=values)
+
+    rated = np.flatnonzero(counts)
+    counts = counts[rated]
+    sums = sums[rated]
+    if not len(rated):
+        return rated, counts, sums, sums
+
+    mean = sums.sum() / counts.sum()
+    if prior_weight is None:
+        prior_weight = counts.mean()
+
+    averages = sums / counts
+    scores = (prior_weight * mean + sums) / (prior_weight + counts)
+    return rated, counts, averages, scores
+
+
+def rank(kitten_ids, counts, scores, groups=None):
+    """
+    Индексы строк в порядке мест: по убыванию оценки, затем по убыванию
+    количества оценок, затем по id. Если заданы `groups`, места считаются
+    внутри каждой группы. Возвращает индексы и места (с 1).
+    """
+    keys = (kitten_ids, -counts, -scores) if groups is None else (kitten_ids, -counts, -scores, groups)
+    order = np.lexsort(keys)
+    if groups is None:
+        return order, np.arange(1, len(order) + 1)
+
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order, np.arange(len(order)) - group_start + 1
+
+
+def build_entries(size=None, prior_weight=None):
+    size = size or kitten_setting('LEADERBOARD_SIZE')
+    if prior_weight is None:
+        prior_weight = kitten_setting('LEADERBOARD_PRIOR_WEIGHT')
+
+    kitten_ids, counts, averages, scores = compute_scores(*load_ratings(), prior_weight=prior_weight)
+
+    # Котята, удаленные между выгрузками оценок и пород, получают породу 0 и пропускаются
+    breed_of = load_breeds()
+    breeds = np.zeros_like(kitten_ids)
+    known = kitten_ids < len(breed_of)
+    breeds[known] = breed_of[kitten_ids[known]]
+    present = breeds > 0
+    kitten_ids, counts, averages, scores, breeds = (
+        array[present] for array in (kitten_ids, counts, averages, scores, breeds)
+    )
+
+    entries = []
+    for groups in (None, breeds):
+        order, positions = rank(kitten_ids, counts, scores, groups)
+        top = positions <= size
+        for index, position in zip(order[top].tolist(), positions[top].tolist()):
+            entries.append(models.LeaderboardEntry(
+                breed_id=None if groups is None else int(breeds[index]),
+                position=position,
+                kitten_id=int(kitten_ids[index]),
+                score=float(scores[index]),
+                rating_count=int(counts[index]),
+                rating_average=float(averages[index]),
+            ))
+    return entries
+
+
+def recompute(size=None, prior_weight=None, batch_size=5000):
+    """Пересчитывает рейтинг и атомарно подменяет содержимое `LeaderboardEntry`."""
+    entries = build_entries(size=size, prior_weight=prior_weight)
+    with transaction.atomic():
+        models.LeaderboardEntry.objects.all().delete()
+        models.LeaderboardEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
@@ -0,0 +1,62 @@
+"""Сравнение HTTP-серверов при большом числе медленных соединений"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from kittens import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Открывает заданное число одновременных соединений с каждым из запущенных серверов. "
+        "Клиент отправляет начало GET-запроса, --idle секунд простаивает, затем дописывает "
+        "заголовки и читает ответ. Выводит пропускную способность и задержки (с учетом простоя) "
+        "для каждого сервера. Серверы запускаются отдельно, например:\n"
+        "  gunicorn settings.wsgi --workers 4 --threads 4 --bind 127.0.0.1:8001\n"
+        "  uvicorn settings.asgi:application --workers 4 --port 8002\n"
+        "  python manage.py benchmark_concurrency "
+        "--server wsgi=http://127.0.0.1:8001 --server asgi=http://127.0.0.1:8002"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', action='append', required=True, metavar='NAME=URL',
+            help="Имя и базовый адрес запущенного сервера; можно указать несколько раз.",
+        )
+        parser.add_argument('--connections', type=int, default=2000, help="Количество одновременных соединений.")
+        parser.add_argument('--idle', type=float, default=0.5, help="Простой соединения посреди запроса, с.")
+        parser.add_argument('--timeout', type=float, default=60.0, help="Предельное время одного соединения, с.")
+        parser.add_argument('--url-name', default='kittenlist', help="Имя URL с GET-обработчиком.")
+        parser.add_argument('--output', help="Путь к JSON-файлу с результатами.")
+
+    def handle(self, *args, **options):
+        servers = {}
+        for server in options['server']:
+            name, separator, url = server.partition('=')
+            if not separator or not url.startswith('http://'):
+                raise CommandError(f"Ожидается --server ИМЯ=http://хост:порт, получено '{server}'.")
+            servers[name] = url.rstrip('/')
+
+        path = reverse(options['url_name'])
+        connections, idle = options['connections'], options['idle']
+        results = {
+            name: benchmarks.run_slow_clients(f'{url}{path}', connections, idle, options['timeout'])
+            for name, url in servers.items()
+        }
+
+        self.stdout.write(f"{path}: {connections} соединений, простой {idle} с")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: {result['throughput_rps']:.0f} запросов/с, p50 {result['p50_ms']:.0f} мс, "
+                f"p99 {result['p99_ms']:.0f} мс, коды ответов {result['status_codes']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {'path': path, 'connections': connections, 'idle_s': idle, 'servers': servers, 'results': results},
+                    file, indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
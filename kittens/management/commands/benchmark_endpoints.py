@@ -0,0 +1,68 @@
+"""Бенчмарк всех эндпоинтов kittens/urls.py"""
+
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from kittens import benchmarks
+from kittens import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет запросы ко всем URL из kittens/urls.py и выводит p50/p95/p99 задержки, "
+        "количество SQL-запросов и размер ответа. Результат можно сохранить в JSON, чтобы "
+        "сравнивать коммиты. Данные создает команда seed_synthetic; для локальной SQLite "
+        "используйте --settings=settings.benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Запросов на каждый эндпоинт.")
+        parser.add_argument('--warmup', type=int, default=3, help="Запросов прогрева, не входящих в замеры.")
+        parser.add_argument('--only', nargs='*', help="Имена URL, которые нужно замерить.")
+        parser.add_argument('--output', help="Путь к JSON-файлу с результатами.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = benchmarks.run(
+            requests=options['requests'], warmup=options['warmup'], only=options['only'], seed=options['seed'],
+        )
+
+        self.stdout.write(
+            f"{'эндпоинт':<20}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'запросов':>10}{'байт':>12}"
+        )
+        for name, result in results.items():
+            if result.get('skipped'):
+                self.stdout.write(self.style.WARNING(f"{name:<20} нет сценария, пропущен"))
+                continue
+            self.stdout.write(
+                f"{name:<20}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries_per_request']:>10.1f}{result['bytes_per_response']:>12.0f}"
+            )
+
+        if options['output']:
+            report = {
+                'commit': self.git_commit(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'rows': {
+                    'breeds': models.Breed.objects.count(),
+                    'kittens': models.Kitten.objects.count(),
+                    'ratings': models.Rating.objects.count(),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
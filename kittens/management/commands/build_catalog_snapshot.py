@@ -0,0 +1,34 @@
+"""Сборка снимка каталога для /api/kittenlist"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kittens import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает снимок страниц /api/kittenlist (JSON и gzip) в каталоге настройки SNAPSHOT_DIR "
+        "и делает его текущим. С --watch остается сборщиком снимка: пересобирает страницы, "
+        "затронутые изменениями котят (для SNAPSHOT_BUILDER_THREAD = False)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', action='store_true',
+            help="После сборки пересобирать снимок при изменениях котят, пока команда не остановлена",
+        )
+
+    def handle(self, *args, **options):
+        if not snapshot.enabled():
+            raise CommandError("Не задана настройка SNAPSHOT_DIR.")
+
+        started = time.perf_counter()
+        version, pages = snapshot.build(full=True)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Снимок {version}: страниц {pages} за {elapsed:.2f} с."))
+
+        if options['watch']:
+            self.stdout.write("Ожидание изменений котят...")
+            snapshot.run_builder()
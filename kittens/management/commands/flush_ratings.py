@@ -0,0 +1,47 @@
+"""Перенос очереди отложенной записи оценок в таблицу оценок"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from kittens import rating_queue
+from kittens.conf import kitten_setting
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит оценки из очереди PendingRating (настройка RATING_QUEUE) в таблицу оценок. "
+        "Без --once работает постоянно с паузой RATING_QUEUE_FLUSH_INTERVAL секунд между переносами; "
+        "запускается в одном экземпляре рядом с веб-процессами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Перенести очередь один раз и завершиться.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Строк очереди в одной транзакции.")
+
+    def handle(self, *args, once=False, batch_size=None, **options):
+        while True:
+            started = time.perf_counter()
+            try:
+                processed, written = rating_queue.flush_all(batch_size)
+            except Exception:
+                if once:
+                    raise
+                # Единственный переносчик очереди не должен останавливаться из-за одной ошибки
+                logger.exception("Не удалось перенести очередь оценок")
+                connection.close()
+                time.sleep(kitten_setting('RATING_QUEUE_FLUSH_INTERVAL'))
+                continue
+            if once or processed:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(self.style.SUCCESS(
+                    f"Строк очереди: {processed}, записано оценок: {written} за {elapsed:.2f} с."
+                ))
+            if once:
+                return
+            time.sleep(kitten_setting('RATING_QUEUE_FLUSH_INTERVAL'))
@@ -0,0 +1,321 @@
+"""Массовая загрузка пород, котят и оценок из CSV или NDJSON"""
+
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from kittens import aggregates
+from kittens import cache
+from kittens import models
+from kittens import snapshot
+
+
+User = get_user_model()
+
+COLUMNS = {
+    'breeds': ['name'],
+    # У столбцов агрегатов нет значения по умолчанию в БД, поэтому COPY передает их явно
+    'kittens': ['name', 'color', 'age_in_months', 'description', 'breed', 'owner', *aggregates.AGGREGATE_FIELDS],
+    'ratings': ['kitten_id', 'username', 'rating'],
+}
+
+# Оценки загружаются во временную таблицу и переносятся одним INSERT, который пропускает
+# уже существующие пары (котёнок, пользователь) и возвращает добавленные оценки для агрегатов
+RATINGS_STAGING_TABLE = 'import_ratings'
+
+CREATE_RATINGS_STAGING_SQL = (
+    f"CREATE TEMPORARY TABLE {RATINGS_STAGING_TABLE} (kitten_id bigint, user_id bigint, rating smallint) "
+    "ON COMMIT DROP"
+)
+
+INSERT_RATINGS_SQL = """
+    INSERT INTO {rating} (kitten_id, user_id, rating)
+    SELECT kitten_id, user_id, rating FROM {staging}
+    ON CONFLICT (kitten_id, user_id) DO NOTHING
+    RETURNING kitten_id, user_id, rating
+"""
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, file_format):
+    """
+    Построчно читает файл, не загружая его в память целиком. Вместо
+    некорректной строки NDJSON возвращается RowError: строка учитывается
+    в контрольной точке и пропускается при подготовке пачки.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as error:
+                        yield RowError(f"некорректный JSON: {error}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает породы, котят или оценки из CSV или NDJSON пачками. На PostgreSQL "
+        "используется COPY FROM STDIN, на остальных СУБД - bulk_create. Контрольная точка "
+        "(таблица ImportCheckpoint, ключ - абсолютный путь к файлу) сохраняется в транзакции "
+        "каждой пачки, и повторный запуск продолжает загрузку с последней зафиксированной "
+        "пачки. Оценки только добавляются: повторная оценка "
+        "того же котёнка тем же пользователем пропускается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(COLUMNS), help="Что загружается.")
+        parser.add_argument('path', help="Путь к файлу .csv или .ndjson.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Формат файла (по умолчанию - по расширению).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Количество строк в одной транзакции.")
+        parser.add_argument(
+            '--restart', action='store_true',
+            help="Удалить контрольную точку файла и загрузить его с начала.",
+        )
+        parser.add_argument(
+            '--create-missing-breeds', action='store_true',
+            help="Создавать породы, которых нет в БД, при загрузке котят.",
+        )
+
+    def handle(self, *args, kind, path, **options):
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        batch_size = self.batch_size = options['batch_size']
+        self.path = os.path.abspath(path)
+        self.create_missing_breeds = options['create_missing_breeds']
+        self.breeds = dict(models.Breed.objects.values_list('name', 'id'))
+        self.users = {}
+
+        if options['restart']:
+            models.ImportCheckpoint.objects.filter(path=self.path).delete()
+        done = self.read_checkpoint(kind)
+        if done:
+            self.stdout.write(f"Продолжение с контрольной точки: пропущено {done} строк.")
+
+        rows = islice(read_rows(path, file_format), done, None)
+        prepare = getattr(self, f'prepare_{kind}')
+        write = self.copy_rows if connection.vendor == 'postgresql' else self.create_rows
+
+        started = time.perf_counter()
+        loaded = skipped = 0
+        for batch in iter(lambda: list(islice(rows, batch_size)), []):
+            with transaction.atomic():
+                values = write(kind, prepare(self.objects(batch, first_line=done + 1)))
+                self.after_batch(kind, values)
+                self.write_checkpoint(kind, done + len(batch))
+
+            done += len(batch)
+            loaded += len(values)
+            skipped += len(batch) - len(values)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Загружено строк: {loaded} ({loaded / elapsed:.0f} строк/с)")
+
+        models.ImportCheckpoint.objects.filter(path=self.path).delete()
+
+        if kind == 'kittens' and loaded and snapshot.enabled():
+            # COPY и bulk_create не вызывают сигналы, а фоновая сборка не переживет завершение команды
+            snapshot.build(full=True)
+            self.stdout.write("Снимок каталога пересобран.")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: загружено {loaded}, пропущено {skipped} строк за {elapsed:.1f} с "
+            f"({loaded / elapsed if elapsed else 0:.0f} строк/с)."
+        ))
+
+    # Контрольная точка
+
+    def read_checkpoint(self, kind):
+        checkpoint = models.ImportCheckpoint.objects.filter(path=self.path).first()
+        if checkpoint is None:
+            return 0
+        if checkpoint.kind != kind:
+            raise CommandError(
+                f"Контрольная точка файла {self.path} относится к загрузке '{checkpoint.kind}'. "
+                "Чтобы начать заново, передайте --restart."
+            )
+        return checkpoint.rows
+
+    def write_checkpoint(self, kind, rows):
+        """Сохраняет контрольную точку в транзакции пачки: она фиксируется вместе с данными."""
+        models.ImportCheckpoint.objects.update_or_create(path=self.path, defaults={'kind': kind, 'rows': rows})
+
+    # Подготовка строк: проверка значений и замена имен на id
+
+    def skip(self, line, error):
+        self.stderr.write(f"Строка {line} пропущена: {error}")
+
+    def objects(self, batch, first_line):
+        """Пары (номер строки, строка) для строк-объектов пачки; остальные строки пропускаются."""
+        rows = []
+        for line, row in enumerate(batch, start=first_line):
+            if isinstance(row, RowError):
+                self.skip(line, row)
+            elif not isinstance(row, dict):
+                self.skip(line, "ожидается объект")
+            else:
+                rows.append((line, row))
+        return rows
+
+    def prepare(self, rows, convert):
+        values = []
+        for line, row in rows:
+            try:
+                values.append(convert(row))
+            except (RowError, KeyError, TypeError, ValueError) as error:
+                self.skip(line, error)
+        return values
+
+    def prepare_breeds(self, rows):
+        def convert(row):
+            name = row['name'].strip()
+            if not name:
+                raise RowError("пустое название породы")
+            if name in self.breeds:
+                raise RowError(f"порода '{name}' уже существует")
+            self.breeds[name] = None
+            return (name,)
+
+        return self.prepare(rows, convert)
+
+    def prepare_kittens(self, rows):
+        self.resolve_users(row.get('owner') for _, row in rows)
+        missing_breeds = {row.get('breed') for _, row in rows if isinstance(row.get('breed'), str)} - set(self.breeds)
+        if self.create_missing_breeds and missing_breeds - {''}:
+            created = models.Breed.objects.bulk_create(
+                [models.Breed(name=name) for name in missing_breeds - {''}]
+            )
+            self.breeds.update((breed.name, breed.id) for breed in created)
+            cache.bump_breed_list_version()
+
+        def convert(row):
+            if row['breed'] not in self.breeds:
+                raise RowError(f"неизвестная порода '{row['breed']}'")
+            if self.users.get(row['owner']) is None:
+                raise RowError(f"неизвестный пользователь '{row['owner']}'")
+            age = int(row['age_in_months'])
+            if age < 0:
+                raise RowError("отрицательный возраст")
+            return (
+                row['name'], row['color'], age, row.get('description') or '',
+                self.breeds[row['breed']], self.users[row['owner']],
+                *(0 for _ in aggregates.AGGREGATE_FIELDS),
+            )
+
+        return self.prepare(rows, convert)
+
+    def prepare_ratings(self, rows):
+        self.resolve_users(row.get('username') for _, row in rows)
+        kitten_ids = set(
+            models.Kitten.objects
+            .filter(id__in={int(row['kitten_id']) for _, row in rows if str(row.get('kitten_id', '')).isdigit()})
+            .values_list('id', flat=True)
+        )
+
+        seen = set()
+
+        def convert(row):
+            kitten_id, rating = int(row['kitten_id']), int(row['rating'])
+            if kitten_id not in kitten_ids:
+                raise RowError(f"неизвестный котёнок {kitten_id}")
+            user_id = self.users.get(row['username'])
+            if user_id is None:
+                raise RowError(f"неизвестный пользователь '{row['username']}'")
+            if rating not in aggregates.RATING_VALUES:
+                raise RowError("оценка должна быть в пределах от 1 до 5")
+            if (kitten_id, user_id) in seen:
+                raise RowError(f"повторная оценка котёнка {kitten_id} пользователем '{row['username']}'")
+            seen.add((kitten_id, user_id))
+            return (kitten_id, user_id, rating)
+
+        return self.prepare(rows, convert)
+
+    def resolve_users(self, usernames):
+        unknown = {username for username in usernames if username and isinstance(username, str)} - set(self.users)
+        if unknown:
+            found = dict(User.objects.filter(username__in=unknown).values_list('username', 'id'))
+            self.users.update({username: found.get(username) for username in unknown})
+
+    # Запись пачки
+
+    def model_for(self, kind):
+        return {'breeds': models.Breed, 'kittens': models.Kitten, 'ratings': models.Rating}[kind]
+
+    def column_names(self, kind):
+        model = self.model_for(kind)
+        fields = {'kitten_id': 'kitten', 'username': 'user', 'breed': 'breed', 'owner': 'owner'}
+        return [model._meta.get_field(fields.get(column, column)).column for column in COLUMNS[kind]]
+
+    def copy_sql(self, kind, table=None):
+        columns = ', '.join(self.column_names(kind))
+        return f"COPY {table or self.model_for(kind)._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    def copy_buffer(self, values):
+        """
+        CSV для COPY. Все значения в кавычках: в формате CSV PostgreSQL читает
+        пустое значение без кавычек как NULL, а пустое описание - это ''.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(values)
+        buffer.seek(0)
+        return buffer
+
+    def copy_rows(self, kind, values):
+        """PostgreSQL: COPY FROM STDIN в формате CSV. Возвращает записанные строки."""
+        if not values:
+            return values
+        with connection.cursor() as cursor:
+            if kind != 'ratings':
+                cursor.copy_expert(self.copy_sql(kind), self.copy_buffer(values))
+                return values
+
+            cursor.execute(CREATE_RATINGS_STAGING_SQL)
+            cursor.copy_expert(self.copy_sql(kind, RATINGS_STAGING_TABLE), self.copy_buffer(values))
+            cursor.execute(INSERT_RATINGS_SQL.format(rating=models.Rating._meta.db_table, staging=RATINGS_STAGING_TABLE))
+            return cursor.fetchall()
+
+    def create_rows(self, kind, values):
+        """Остальные СУБД: bulk_create. Возвращает записанные строки."""
+        model = self.model_for(kind)
+        if kind == 'ratings':
+            values = self.new_ratings(values)
+        attnames = [model._meta.get_field(column).attname for column in self.column_names(kind)]
+        model.objects.bulk_create(
+            [model(**dict(zip(attnames, row))) for row in values],
+            batch_size=self.batch_size,
+            # Оценки, добавленные параллельно после new_ratings(), пропускаются
+            ignore_conflicts=kind == 'ratings',
+        )
+        return values
+
+    def new_ratings(self, values):
+        existing = set(
+            models.Rating.objects
+            .filter(kitten_id__in={kitten_id for kitten_id, _, _ in values})
+            .filter(user_id__in={user_id for _, user_id, _ in values})
+            .values_list('kitten_id', 'user_id')
+        )
+        for kitten_id, user_id, _ in values:
+            if (kitten_id, user_id) in existing:
+                self.stderr.write(f"Оценка котёнка {kitten_id} пользователем {user_id} уже есть, пропущена")
+        return [row for row in values if row[:2] not in existing]
+
+    def after_batch(self, kind, values):
+        if kind == 'breeds':
+            self.breeds.update(models.Breed.objects.filter(name__in=[name for name, in values]).values_list('name', 'id'))
+            cache.bump_breed_list_version()
+        elif kind == 'ratings':
+            # COPY и bulk_create не вызывают сигналы - агрегаты котят обновляются здесь же, в транзакции пачки
+            aggregates.apply_rating_changes((kitten_id, None, rating) for kitten_id, _, rating in values)
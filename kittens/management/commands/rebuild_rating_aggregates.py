@@ -0,0 +1,44 @@
+"""Пересчет агрегатов оценок котят по таблице Rating"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from kittens import aggregates
+from kittens import models
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает rating_count, rating_sum и гистограмму оценок котят по таблице Rating."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Только проверить расхождения, ничего не изменяя. Завершается с ошибкой, если они найдены.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Размер пачки для bulk_update.")
+
+    def handle(self, *args, check=False, batch_size=1000, **options):
+        with transaction.atomic():
+            drifted = []
+            for kitten in aggregates.drifted_kittens().iterator(chunk_size=batch_size):
+                self.stdout.write(
+                    f"Котёнок {kitten.id}: "
+                    + ", ".join(
+                        f"{field} {getattr(kitten, field)} -> {getattr(kitten, f'actual_{field}')}"
+                        for field in aggregates.AGGREGATE_FIELDS
+                        if getattr(kitten, field) != getattr(kitten, f'actual_{field}')
+                    )
+                )
+                for field in aggregates.AGGREGATE_FIELDS:
+                    setattr(kitten, field, getattr(kitten, f'actual_{field}'))
+                drifted.append(kitten)
+
+            if not check and drifted:
+                models.Kitten.objects.bulk_update(drifted, aggregates.AGGREGATE_FIELDS, batch_size=batch_size)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Расхождений не найдено."))
+        elif check:
+            raise CommandError(f"Найдено расхождений: {len(drifted)}.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Исправлено котят: {len(drifted)}."))
@@ -0,0 +1,21 @@
+"""Пересчет рейтинга котят для /api/leaderboard"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from kittens import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает байесовский рейтинг котят и атомарно подменяет таблицу LeaderboardEntry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=None, help="Количество мест в каждом рейтинге.")
+        parser.add_argument('--prior-weight', type=float, default=None, help="Вес априорной средней оценки.")
+
+    def handle(self, *args, size=None, prior_weight=None, **options):
+        started = time.perf_counter()
+        count = leaderboard.recompute(size=size, prior_weight=prior_weight)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Записано строк рейтинга: {count} за {elapsed:.2f} с."))
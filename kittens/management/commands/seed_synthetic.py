@@ -0,0 +1,112 @@
+"""Генерация синтетических данных для бенчмарков"""
+
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from kittens import aggregates
+from kittens import models
+
+
+User = get_user_model()
+
+COLORS = ['Белый', 'Черный', 'Рыжий', 'Серый', 'Кремовый', 'Голубой', 'Черепаховый', 'Табби']
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает синтетические породы, пользователей, котят и оценки. Количество оценок "
+        "на котёнка распределено по закону Ципфа: немногие котята собирают большую часть оценок. "
+        "Все пользователи получают пароль 'password'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--breeds', type=int, default=50)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--kittens', type=int, default=20000)
+        parser.add_argument('--ratings', type=int, default=200000)
+        parser.add_argument('--zipf', type=float, default=1.1, help="Показатель распределения Ципфа.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            breeds = models.Breed.objects.bulk_create(
+                [models.Breed(name=f"Порода {i}") for i in range(options['breeds'])], batch_size=batch_size
+            )
+            password = make_password('password')
+            prefix = f"synthetic-{int(time.time())}"
+            users = User.objects.bulk_create(
+                [User(username=f"{prefix}-{i}", password=password) for i in range(options['users'])],
+                batch_size=batch_size,
+            )
+            breed_ids = np.array([breed.id for breed in breeds])
+            user_ids = np.array([user.id for user in users])
+            self.stdout.write(f"Породы: {len(breeds)}, пользователи: {len(users)}")
+
+            # Популярность пород тоже неравномерна
+            kitten_count = options['kittens']
+            breed_weights = 1 / np.arange(1, len(breed_ids) + 1) ** 0.8
+            kitten_breeds = rng.choice(breed_ids, size=kitten_count, p=breed_weights / breed_weights.sum())
+            kitten_owners = rng.choice(user_ids, size=kitten_count)
+            kitten_ages = rng.integers(1, 120, size=kitten_count)
+            kitten_colors = rng.integers(0, len(COLORS), size=kitten_count)
+
+            # Котёнок с рангом r получает долю оценок, пропорциональную 1 / r^s
+            kitten_weights = 1 / np.arange(1, kitten_count + 1) ** options['zipf']
+            rated = rng.permutation(kitten_count)[
+                rng.choice(kitten_count, size=options['ratings'], p=kitten_weights / kitten_weights.sum())
+            ]
+            judges = rng.choice(user_ids, size=options['ratings'])
+            # Одна оценка на пару (котёнок, пользователь)
+            _, unique = np.unique(rated * (user_ids.max() + 1) + judges, return_index=True)
+            rated, judges = rated[unique], judges[unique]
+            quality = rng.normal(3.5, 0.8, size=kitten_count)
+            values = np.clip(np.rint(quality[rated] + rng.normal(0, 0.7, len(rated))), 1, 5).astype(int)
+
+            # Агрегаты оценок считаются сразу, чтобы не пересчитывать их по таблице Rating
+            totals = {
+                'rating_count': np.bincount(rated, minlength=kitten_count),
+                'rating_sum': np.bincount(rated, weights=values, minlength=kitten_count).astype(int),
+            }
+            for value, field in aggregates.HISTOGRAM_FIELDS.items():
+                totals[field] = np.bincount(rated[values == value], minlength=kitten_count)
+
+            kittens = models.Kitten.objects.bulk_create(
+                [
+                    models.Kitten(
+                        name=f"Котёнок {i}",
+                        color=COLORS[kitten_colors[i]],
+                        age_in_months=int(kitten_ages[i]),
+                        description=f"Синтетический котёнок номер {i}. " * 4,
+                        breed_id=int(kitten_breeds[i]),
+                        owner_id=int(kitten_owners[i]),
+                        **{field: int(total[i]) for field, total in totals.items()},
+                    )
+                    for i in range(kitten_count)
+                ],
+                batch_size=batch_size,
+            )
+            kitten_ids = np.array([kitten.id for kitten in kittens])
+            self.stdout.write(f"Котята: {len(kittens)}")
+
+            models.Rating.objects.bulk_create(
+                [
+                    models.Rating(kitten_id=kitten_id, user_id=user_id, rating=value)
+                    for kitten_id, user_id, value in zip(kitten_ids[rated].tolist(), judges.tolist(), values.tolist())
+                ],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Оценки: {len(rated)}")
+
+        call_command('recompute_leaderboard', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - started:.1f} с."))
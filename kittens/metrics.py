@@ -0,0 +1,243 @@
+"""Метрики Prometheus
+
+Каждый процесс копит значения в памяти (`registry`); запись замера - это
+несколько операций со словарями под блокировкой процесса, которую не делят
+между собой разные воркеры. Если задана настройка `METRICS_DIR`, процесс
+сохраняет свое состояние в файл `<pid>-<id>.json` этого каталога не чаще
+раза в `METRICS_FLUSH_INTERVAL` секунд, а также сразу, как только в нем не
+остается запросов в обработке (`request_finished()`; запись выполняет
+фоновый поток), чтобы файл простаивающего воркера не оставался с
+незавершенным запросом и неполными счетчиками. `/metrics` суммирует файлы
+всех процессов. Счетчики завершившихся процессов продолжают учитываться,
+а gauge-метрики - только у живых процессов.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.http import HttpResponse
+
+from kittens.conf import kitten_setting
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Имя метрики -> (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'kittens_http_requests_total': ('counter', "Количество обработанных запросов", None),
+    'kittens_http_request_duration_seconds': ('histogram', "Время обработки запроса", LATENCY_BUCKETS),
+    'kittens_http_response_size_bytes': ('histogram', "Размер тела ответа", SIZE_BUCKETS),
+    'kittens_http_request_db_queries': ('histogram', "Количество SQL-запросов на запрос", QUERY_BUCKETS),
+    'kittens_http_requests_in_progress': ('gauge', "Запросы, обрабатываемые в данный момент", None),
+    'kittens_hashing_pending': ('gauge', "Задачи хеширования паролей в пуле процессов, включая выполняемые", None),
+    'kittens_hashing_rejected_total': ('counter', "Задачи хеширования, отклоненные из-за заполненной очереди", None),
+    'kittens_hashing_duration_seconds': ('histogram', "Время хеширования пароля с ожиданием в очереди", LATENCY_BUCKETS),
+    'kittens_rating_queue_accepted_total': ('counter', "Оценки, принятые в очередь отложенной записи", None),
+    'kittens_rating_queue_flushed_total': ('counter', "Строки очереди оценок, перенесенные в таблицу оценок или отброшенные", None),
+    'kittens_rating_queue_flush_lag_seconds': ('histogram', "Время от приема старейшей оценки пачки до ее записи", LAG_BUCKETS),
+    'kittens_rating_queue_flush_duration_seconds': ('histogram', "Время переноса одной пачки очереди оценок", LATENCY_BUCKETS),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+IN_PROGRESS = 'kittens_http_requests_in_progress'
+
+
+class Registry:
+    """Значения метрик одного процесса. Ключ значения - (имя метрики, кортеж пар меток)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.file_name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.values = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+        self.flush_requested = threading.Event()
+        self.writer = None
+
+    def check_fork(self):
+        # После fork дочерний процесс начинает с пустыми значениями и собственным файлом
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self.check_fork()
+            self.values[key] = self.values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(labels.items()))
+        with self.lock:
+            self.check_fork()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Некумулятивные счетчики корзин (последняя - +Inf), сумма и количество
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0, 0]
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            self.check_fork()
+            return {
+                'pid': self.pid,
+                'values': [[name, list(labels), value] for (name, labels), value in self.values.items()],
+                'histograms': [
+                    [name, list(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self.histograms.items()
+                ],
+            }
+
+    def request_finished(self):
+        """Просит фоновый поток сохранить состояние, если в процессе не осталось запросов в обработке."""
+        if not kitten_setting('METRICS_DIR'):
+            return
+        with self.lock:
+            self.check_fork()
+            if any(value for (name, _), value in self.values.items() if name == IN_PROGRESS):
+                return
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self.run_writer, name='kittens-metrics-writer', daemon=True)
+                self.writer.start()
+            self.flush_requested.set()
+
+    def run_writer(self):
+        flush_requested = self.flush_requested
+        while True:
+            flush_requested.wait()
+            flush_requested.clear()
+            directory = kitten_setting('METRICS_DIR')
+            if directory:
+                self.flush(directory)
+
+    def maybe_flush(self):
+        directory = kitten_setting('METRICS_DIR')
+        if directory and time.monotonic() - self.flushed_at >= kitten_setting('METRICS_FLUSH_INTERVAL'):
+            self.flush(directory)
+
+    def flush(self, directory):
+        self.flushed_at = time.monotonic()
+        snapshot = self.snapshot()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        tmp_path = f'{path}.tmp'
+        # Файл пишут и потоки запросов, и поток записи
+        with self.file_lock:
+            with open(tmp_path, 'w') as file:
+                json.dump(snapshot, file)
+            os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """Состояния всех процессов: из каталога METRICS_DIR или только текущего процесса."""
+    directory = kitten_setting('METRICS_DIR')
+    if not directory:
+        return [registry.snapshot()]
+
+    registry.flush(directory)
+    snapshots = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            # Файл удален или еще не записан другим процессом
+            continue
+    return snapshots
+
+
+def merge(snapshots):
+    values, histograms = {}, {}
+    for snapshot in snapshots:
+        alive = snapshot['pid'] == os.getpid() or is_alive(snapshot['pid'])
+        for name, labels, value in snapshot['values']:
+            if METRICS[name][0] == 'gauge' and not alive:
+                continue
+            key = (name, tuple(map(tuple, labels)))
+            values[key] = values.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+    return values, histograms
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(snapshots):
+    """Текстовый формат Prometheus."""
+    values, histograms = merge(snapshots)
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_number(value)}')
+            continue
+
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                bucket_labels = (*labels, ('le', format_number(bound) if bound != '+Inf' else bound))
+                lines.append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_number(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics - метрики всех процессов в текстовом формате Prometheus."""
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,188 @@
+"""Middleware приложения kittens
+
+Middleware поддерживают и синхронный, и асинхронный режим, чтобы под ASGI
+запрос к асинхронному представлению не переключался в поток ради middleware.
+"""
+
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.urls import Resolver404, resolve
+
+from kittens import metrics
+from kittens import routers
+from kittens import timing
+from kittens.conf import kitten_setting
+
+
+logger = logging.getLogger('kittens.timing')
+
+
+class SyncAsyncMiddleware:
+    """
+    Основа middleware, работающего в обоих режимах. Наследники реализуют
+    `handle(request)` как генератор: код до `yield` выполняется
+    до представления, `yield` возвращает ответ, код после - обрабатывает его.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        handler = self.handle(request)
+        next(handler)
+        try:
+            response = self.get_response(request)
+        except BaseException as exc:
+            handler.throw(exc)
+            raise
+        return self.finish(handler, response)
+
+    async def __acall__(self, request):
+        handler = self.handle(request)
+        next(handler)
+        try:
+            response = await self.get_response(request)
+        except BaseException as exc:
+            handler.throw(exc)
+            raise
+        return self.finish(handler, response)
+
+    def finish(self, handler, response):
+        try:
+            handler.send(response)
+        except StopIteration:
+            return response
+        raise RuntimeError("handle() должен выполнить yield один раз")
+
+    def handle(self, request):
+        raise NotImplementedError
+
+
+class ServerTimingMiddleware(SyncAsyncMiddleware):
+    """
+    Разбивка времени обработки запроса по этапам.
+
+    Для доли запросов `SERVER_TIMING_SAMPLE_RATE` замеряются аутентификация
+    (`auth`), SQL-запросы (`db`, а также их количество), сериализация
+    (`serialize`, включая запросы, выполненные при обращении к `.data`) и
+    рендеринг JSON (`render`). Результат добавляется в заголовок
+    `Server-Timing` и пишется в лог `kittens.timing` одной JSON-строкой.
+
+    Для потоковых ответов учитывается только время до начала передачи тела.
+    """
+    def handle(self, request):
+        sample_rate = kitten_setting('SERVER_TIMING_SAMPLE_RATE')
+        if not sample_rate or random.random() >= sample_rate:
+            yield
+            return
+
+        timings, token = timing.start()
+        try:
+            with timing.observe_queries(timings.record_query):
+                response = yield
+        finally:
+            timing.finish(token)
+
+        response['Server-Timing'] = timings.server_timing()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **timings.as_dict(),
+        }))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, seconds):
+        self.count += 1
+
+
+def resolve_view(request):
+    """Класс DRF-представления запроса, для функций - сама функция, None, если адрес не найден."""
+    try:
+        func = resolve(request.path_info).func
+    except Resolver404:
+        return None
+    return getattr(func, 'view_class', func)
+
+
+def view_name(request):
+    """Имя класса DRF-представления (`KittenListAPIView`), для функций - имя функции."""
+    view = resolve_view(request)
+    return view.__name__ if view is not None else 'unknown'
+
+
+class MetricsMiddleware(SyncAsyncMiddleware):
+    """
+    Метрики запросов для /metrics: количество, время, размер ответа и число
+    SQL-запросов с метками класса представления и кода ответа, а также
+    количество запросов в обработке.
+    """
+    def handle(self, request):
+        started = time.perf_counter()
+        view = view_name(request)
+        counter = QueryCounter()
+        metrics.registry.inc('kittens_http_requests_in_progress', {'view': view})
+        try:
+            try:
+                with timing.observe_queries(counter):
+                    response = yield
+            finally:
+                metrics.registry.inc('kittens_http_requests_in_progress', {'view': view}, -1)
+
+            labels = {'view': view, 'method': request.method, 'status': str(response.status_code)}
+            metrics.registry.inc('kittens_http_requests_total', labels)
+            metrics.registry.observe('kittens_http_request_duration_seconds', labels, time.perf_counter() - started)
+            metrics.registry.observe('kittens_http_request_db_queries', labels, counter.count)
+            if not response.streaming:
+                metrics.registry.observe('kittens_http_response_size_bytes', labels, len(response.content))
+        finally:
+            # Простаивающий воркер больше не пишет метрики по интервалу - сохраняем итог запроса
+            metrics.registry.request_finished()
+
+
+class ReplicaMiddleware(SyncAsyncMiddleware):
+    """
+    Отправляет чтение запросов, которые только читают, на реплики БД
+    (kittens/routers.py). Такими считаются методы GET, HEAD и OPTIONS или
+    методы из атрибута `replica_methods` представления.
+
+    После успешного запроса, который мог записать в БД (остальные методы или
+    запись через ORM), клиенту на `REPLICA_PIN_SECONDS` секунд ставится
+    cookie, и его запросы на это время читают из `default`. Метод
+    учитывается отдельно, потому что часть записей выполняется сырым SQL
+    (kittens/ratings.py) в обход роутера.
+    """
+    def handle(self, request):
+        if not kitten_setting('REPLICAS'):
+            yield
+            return
+
+        view = resolve_view(request)
+        read_only = request.method.lower() in getattr(view, 'replica_methods', routers.READ_METHODS)
+        use_replica = read_only and routers.PIN_COOKIE not in request.COOKIES
+
+        state, token = routers.start(use_replica)
+        try:
+            response = yield
+        finally:
+            routers.finish(token)
+
+        pin_seconds = kitten_setting('REPLICA_PIN_SECONDS')
+        if (state.wrote or not read_only) and response.status_code < 400 and pin_seconds:
+            response.set_cookie(routers.PIN_COOKIE, '1', max_age=pin_seconds, httponly=True, samesite='Lax')
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='kitten',
+            name='breed',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='kittens.breed', verbose_name='Порода'),
+        ),
+        migrations.AlterField(
+            model_name='kitten',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Владелец'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='kitten',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='kittens.kitten', verbose_name='Котёнок'),
+        ),
+        migrations.AlterField(
+            model_name='rating',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['breed', 'id'], name='kitten_breed_id_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Kitten = apps.get_model('kittens', 'Kitten')
+    Rating = apps.get_model('kittens', 'Rating')
+    db_alias = schema_editor.connection.alias
+
+    def total(aggregate, **filters):
+        ratings = (
+            Rating.objects.using(db_alias)
+            .filter(kitten=OuterRef('pk'), **filters)
+            .order_by()
+            .values('kitten')
+            .annotate(total=aggregate)
+            .values('total')
+        )
+        return Coalesce(Subquery(ratings), Value(0))
+
+    updates = {
+        'rating_count': total(Count('id')),
+        'rating_sum': total(Sum('rating')),
+    }
+    for value in range(1, 6):
+        updates[f'rating_{value}_count'] = total(Count('id'), rating=value)
+    Kitten.objects.using(db_alias).filter(id__in=Rating.objects.using(db_alias).values('kitten')).update(**updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0002_kitten_breed_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
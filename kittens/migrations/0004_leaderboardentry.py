@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0003_kitten_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Байесовская оценка')),
+                ('rating_count', models.PositiveIntegerField(verbose_name='Количество оценок')),
+                ('rating_average', models.FloatField(verbose_name='Средняя оценка')),
+                ('breed', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='kittens.breed', verbose_name='Порода')),
+                ('kitten', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='kittens.kitten', verbose_name='Котёнок')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['breed', 'position'], name='leaderboard_breed_pos_idx')],
+            },
+        ),
+    ]
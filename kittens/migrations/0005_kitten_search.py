@@ -0,0 +1,146 @@
+# Полнотекстовый поиск по котятам (kittens/search.py)
+#
+# PostgreSQL: столбец search_vector (tsvector) с GIN-индексом, который заполняет
+# триггер по имени, цвету, описанию и названию породы, и trigram-индексы pg_trgm
+# для поиска с опечатками по именам котят и названиям пород.
+# SQLite: FTS5-таблица kittens_kitten_search (rowid = id котёнка), которую
+# поддерживают триггеры на kittens_kitten и kittens_breed.
+# Изменения делаются SQL-триггерами, поэтому индекс обновляется и при
+# bulk_create, update() и COPY.
+
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE kittens_kitten ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION kittens_kitten_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(
+                (SELECT name FROM kittens_breed WHERE id = NEW.breed_id), ''
+            )), 'B') ||
+            setweight(to_tsvector('russian', coalesce(NEW.color, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_vector
+    BEFORE INSERT OR UPDATE OF name, color, description, breed_id ON kittens_kitten
+    FOR EACH ROW EXECUTE FUNCTION kittens_kitten_search_vector()
+    """,
+    """
+    CREATE FUNCTION kittens_breed_search_vector() RETURNS trigger AS $$
+    BEGIN
+        -- Пересчитывает векторы котят переименованной породы через триггер kittens_kitten
+        UPDATE kittens_kitten SET breed_id = breed_id WHERE breed_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER kittens_breed_search_vector
+    AFTER UPDATE OF name ON kittens_breed
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION kittens_breed_search_vector()
+    """,
+    "UPDATE kittens_kitten SET breed_id = breed_id",
+    "CREATE INDEX kitten_search_vector_idx ON kittens_kitten USING gin (search_vector)",
+    "CREATE INDEX kitten_name_trgm_idx ON kittens_kitten USING gin (name gin_trgm_ops)",
+    "CREATE INDEX breed_name_trgm_idx ON kittens_breed USING gin (name gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS breed_name_trgm_idx",
+    "DROP INDEX IF EXISTS kitten_name_trgm_idx",
+    "DROP TRIGGER IF EXISTS kittens_breed_search_vector ON kittens_breed",
+    "DROP FUNCTION IF EXISTS kittens_breed_search_vector()",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_vector ON kittens_kitten",
+    "DROP FUNCTION IF EXISTS kittens_kitten_search_vector()",
+    "ALTER TABLE kittens_kitten DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE kittens_kitten_search USING fts5(
+        name, color, description, breed, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_insert AFTER INSERT ON kittens_kitten BEGIN
+        INSERT INTO kittens_kitten_search (rowid, name, color, description, breed)
+        VALUES (new.id, new.name, new.color, new.description,
+                (SELECT name FROM kittens_breed WHERE id = new.breed_id));
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_update
+    AFTER UPDATE OF name, color, description, breed_id ON kittens_kitten BEGIN
+        UPDATE kittens_kitten_search
+        SET name = new.name, color = new.color, description = new.description,
+            breed = (SELECT name FROM kittens_breed WHERE id = new.breed_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_delete AFTER DELETE ON kittens_kitten BEGIN
+        DELETE FROM kittens_kitten_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_breed_search_update AFTER UPDATE OF name ON kittens_breed BEGIN
+        UPDATE kittens_kitten_search SET breed = new.name
+        WHERE rowid IN (SELECT id FROM kittens_kitten WHERE breed_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO kittens_kitten_search (rowid, name, color, description, breed)
+    SELECT kitten.id, kitten.name, kitten.color, kitten.description, breed.name
+    FROM kittens_kitten kitten LEFT JOIN kittens_breed breed ON breed.id = kitten.breed_id
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS kittens_breed_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_delete",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_insert",
+    "DROP TABLE IF EXISTS kittens_kitten_search",
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def run_statements(schema_editor, direction):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        # На остальных СУБД поиск работает без индекса (см. kittens/search.py)
+        return
+    for sql in statements[direction]:
+        schema_editor.execute(sql, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, 0)
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0004_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:12
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+# SQLite пересоздает kittens_kitten при добавлении вычисляемого столбца;
+# триггеры поискового индекса (см. 0005_kitten_search) на время этого удаляются.
+# Определения скопированы сюда, чтобы миграция не зависела от кода приложения.
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER kittens_kitten_search_insert AFTER INSERT ON kittens_kitten BEGIN
+        INSERT INTO kittens_kitten_search (rowid, name, color, description, breed)
+        VALUES (new.id, new.name, new.color, new.description,
+                (SELECT name FROM kittens_breed WHERE id = new.breed_id));
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_update
+    AFTER UPDATE OF name, color, description, breed_id ON kittens_kitten BEGIN
+        UPDATE kittens_kitten_search
+        SET name = new.name, color = new.color, description = new.description,
+            breed = (SELECT name FROM kittens_breed WHERE id = new.breed_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_delete AFTER DELETE ON kittens_kitten BEGIN
+        DELETE FROM kittens_kitten_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_breed_search_update AFTER UPDATE OF name ON kittens_breed BEGIN
+        UPDATE kittens_kitten_search SET breed = new.name
+        WHERE rowid IN (SELECT id FROM kittens_kitten WHERE breed_id = new.id);
+    END
+    """,
+]
+
+SQLITE_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS kittens_breed_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_delete",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_insert",
+]
+
+
+def run_sqlite_statements(schema_editor, statements):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in statements:
+        schema_editor.execute(sql, params=None)
+
+
+def drop_search_triggers(apps, schema_editor):
+    run_sqlite_statements(schema_editor, SQLITE_DROP_TRIGGERS)
+
+
+def create_search_triggers(apps, schema_editor):
+    run_sqlite_statements(schema_editor, SQLITE_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0005_kitten_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, create_search_triggers),
+        migrations.AddField(
+            model_name='kitten',
+            name='rating_average',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(rating_count=0, then=models.Value(0.0)), default=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('rating_sum', models.FloatField()), '/', models.F('rating_count'))), output_field=models.FloatField(), verbose_name='Средняя оценка'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['name', 'id'], name='kitten_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['age_in_months', 'id'], name='kitten_age_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['rating_average', 'id'], name='kitten_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['breed', 'name', 'id'], name='kitten_breed_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['breed', 'age_in_months', 'id'], name='kitten_breed_age_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['breed', 'rating_average', 'id'], name='kitten_breed_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['color', 'id'], name='kitten_color_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['color', 'name', 'id'], name='kitten_color_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['color', 'age_in_months', 'id'], name='kitten_color_age_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['color', 'rating_average', 'id'], name='kitten_color_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['owner', 'id'], name='kitten_owner_id_idx'),
+        ),
+    ]
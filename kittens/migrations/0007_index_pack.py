@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0006_kitten_catalog_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='kitten',
+            index=models.Index(fields=['breed', 'color', 'id'], name='kitten_breed_color_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['kitten', 'rating'], name='rating_kitten_value_idx'),
+        ),
+    ]
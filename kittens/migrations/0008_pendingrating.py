@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0007_index_pack'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kitten_id', models.BigIntegerField(verbose_name='Котёнок')),
+                ('user_id', models.BigIntegerField(verbose_name='Пользователь')),
+                ('rating', models.PositiveSmallIntegerField(verbose_name='Рейтинг')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Принята')),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Триггеры поискового индекса SQLite создаются заново, чтобы у всех БД они
+# совпадали независимо от того, какой редакцией 0005_kitten_search и
+# 0006_kitten_catalog_indexes они были созданы. Определения скопированы сюда,
+# чтобы миграция не зависела от кода приложения.
+
+from django.db import migrations
+
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER kittens_kitten_search_insert AFTER INSERT ON kittens_kitten BEGIN
+        INSERT INTO kittens_kitten_search (rowid, name, color, description, breed)
+        VALUES (new.id, new.name, new.color, new.description,
+                (SELECT name FROM kittens_breed WHERE id = new.breed_id));
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_update
+    AFTER UPDATE OF name, color, description, breed_id ON kittens_kitten BEGIN
+        UPDATE kittens_kitten_search
+        SET name = new.name, color = new.color, description = new.description,
+            breed = (SELECT name FROM kittens_breed WHERE id = new.breed_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_kitten_search_delete AFTER DELETE ON kittens_kitten BEGIN
+        DELETE FROM kittens_kitten_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER kittens_breed_search_update AFTER UPDATE OF name ON kittens_breed BEGIN
+        UPDATE kittens_kitten_search SET breed = new.name
+        WHERE rowid IN (SELECT id FROM kittens_kitten WHERE breed_id = new.id);
+    END
+    """,
+]
+
+SQLITE_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS kittens_breed_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_delete",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_update",
+    "DROP TRIGGER IF EXISTS kittens_kitten_search_insert",
+]
+
+
+def recreate_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [*SQLITE_DROP_TRIGGERS, *SQLITE_TRIGGERS]:
+        schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0008_pendingrating'),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+    ]
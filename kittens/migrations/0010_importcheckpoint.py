@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kittens', '0009_kitten_search_triggers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True, verbose_name='Абсолютный путь к файлу')),
+                ('kind', models.CharField(max_length=16, verbose_name='Что загружается')),
+                ('rows', models.PositiveBigIntegerField(verbose_name='Загружено строк')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+            ],
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 
 
@@ -17,9 +18,51 @@ class Kitten(models.Model):
     breed = models.ForeignKey(Breed, on_delete=models.CASCADE, verbose_name="Порода")
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Владелец")
 
+    # Агрегаты оценок, поддерживаются инкрементально (см. kittens/aggregates.py)
+    rating_count = models.PositiveIntegerField("Количество оценок", default=0, editable=False)
+    rating_sum = models.PositiveIntegerField("Сумма оценок", default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField("Количество оценок 1", default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField("Количество оценок 2", default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField("Количество оценок 3", default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField("Количество оценок 4", default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField("Количество оценок 5", default=0, editable=False)
+    # Вычисляется и хранится самой БД, поэтому по нему можно строить индексы
+    rating_average = models.GeneratedField(
+        expression=models.Case(
+            models.When(rating_count=0, then=models.Value(0.0)),
+            default=Cast('rating_sum', models.FloatField()) / models.F('rating_count'),
+        ),
+        output_field=models.FloatField(),
+        db_persist=True,
+        verbose_name="Средняя оценка",
+    )
+
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            # Курсорная пагинация котят внутри породы: WHERE breed_id = ? AND id > ? ORDER BY id
+            models.Index(fields=['breed', 'id'], name='kitten_breed_id_idx'),
+            # Каталог /api/kittens (kittens/catalog.py): для каждой сортировки - индекс
+            # без фильтра и с фильтром по равенству породы или цвета. Фильтры по
+            # диапазону возраста и рейтинга используют индекс сортировки по тому же полю.
+            models.Index(fields=['name', 'id'], name='kitten_name_id_idx'),
+            models.Index(fields=['age_in_months', 'id'], name='kitten_age_id_idx'),
+            models.Index(fields=['rating_average', 'id'], name='kitten_rating_id_idx'),
+            models.Index(fields=['breed', 'name', 'id'], name='kitten_breed_name_id_idx'),
+            models.Index(fields=['breed', 'age_in_months', 'id'], name='kitten_breed_age_id_idx'),
+            models.Index(fields=['breed', 'rating_average', 'id'], name='kitten_breed_rating_id_idx'),
+            models.Index(fields=['color', 'id'], name='kitten_color_id_idx'),
+            models.Index(fields=['color', 'name', 'id'], name='kitten_color_name_id_idx'),
+            models.Index(fields=['color', 'age_in_months', 'id'], name='kitten_color_age_id_idx'),
+            models.Index(fields=['color', 'rating_average', 'id'], name='kitten_color_rating_id_idx'),
+            # У одного владельца немного котят, их сортировка по другим полям обходится без индекса
+            models.Index(fields=['owner', 'id'], name='kitten_owner_id_idx'),
+            # Покрывающий индекс фасетов каталога: GROUP BY breed_id, color и COUNT(id) без чтения таблицы
+            models.Index(fields=['breed', 'color', 'id'], name='kitten_breed_color_id_idx'),
+        ]
+
 
 class Rating(models.Model):
     kitten = models.ForeignKey(Kitten, on_delete=models.CASCADE, verbose_name="Котёнок")
@@ -29,8 +72,81 @@ class Rating(models.Model):
     def __str__(self):
         return f"Rating {self.rating} for {self.kitten.name} by {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Оценка и котёнок, сохраненные в БД, нужны для пересчета агрегатов при изменении
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_kitten_id = instance.__dict__.get('kitten_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Агрегаты котёнка обновляются в post_save, поэтому запись оценки и
+        # обновление агрегатов должны попасть в одну транзакцию
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     class Meta:
         unique_together = ('kitten', 'user')
+        indexes = [
+            # Покрывающий индекс агрегатов котёнка (kittens/aggregates.py): COUNT и SUM оценок по kitten_id
+            models.Index(fields=['kitten', 'rating'], name='rating_kitten_value_idx'),
+        ]
         constraints = [
             models.CheckConstraint(check=models.Q(rating__gte=1, rating__lte=5), name='rating_range')
         ]
+
+
+class PendingRating(models.Model):
+    """
+    Оценка, принятая в режиме отложенной записи (`RATING_QUEUE`) и еще не
+    перенесенная в `Rating` (см. kittens/rating_queue.py).
+
+    Внешних ключей нет, чтобы запись в очередь была одной вставкой без
+    проверок; оценки удаленных котят и пользователей отбрасываются при переносе.
+    """
+    kitten_id = models.BigIntegerField("Котёнок")
+    user_id = models.BigIntegerField("Пользователь")
+    rating = models.PositiveSmallIntegerField("Рейтинг")
+    created_at = models.DateTimeField("Принята", auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending rating {self.rating} for {self.kitten_id} by {self.user_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Контрольная точка команды `import_catalog`: сколько строк файла уже
+    загружено. Обновляется в транзакции каждой пачки, поэтому всегда
+    соответствует зафиксированным данным.
+    """
+    path = models.CharField("Абсолютный путь к файлу", max_length=1024, unique=True)
+    kind = models.CharField("Что загружается", max_length=16)
+    rows = models.PositiveBigIntegerField("Загружено строк")
+    updated_at = models.DateTimeField("Обновлена", auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.path}: {self.rows}"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Предрассчитанная строка рейтинга котят.
+
+    Таблица целиком пересоздается командой `recompute_leaderboard`.
+    Строки с `breed=None` - общий рейтинг, остальные - рейтинг внутри породы.
+    """
+    breed = models.ForeignKey(Breed, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Порода")
+    position = models.PositiveIntegerField("Место")
+    kitten = models.ForeignKey(Kitten, on_delete=models.CASCADE, verbose_name="Котёнок")
+    score = models.FloatField("Байесовская оценка")
+    rating_count = models.PositiveIntegerField("Количество оценок")
+    rating_average = models.FloatField("Средняя оценка")
+
+    def __str__(self):
+        return f"{self.position}. {self.kitten_id} ({self.score:.3f})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['breed', 'position'], name='leaderboard_breed_pos_idx'),
+        ]
@@ -0,0 +1,152 @@
+"""Курсорная (keyset) пагинация
+
+Страница выбирается условием по ключу сортировки последней отданной строки
+(`WHERE id > :last_id ORDER BY id LIMIT n`), поэтому запрос не использует
+`OFFSET` и `COUNT(*)`, а его стоимость не зависит от глубины страницы.
+Курсор непрозрачен для клиента: это base64 от JSON-списка значений ключа.
+"""
+
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from kittens.conf import kitten_setting
+
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Тип поля модели (`get_internal_type()`) -> допустимые типы значения курсора
+CURSOR_VALUE_TYPES = {
+    'AutoField': int,
+    'BigAutoField': int,
+    'SmallAutoField': int,
+    'IntegerField': int,
+    'BigIntegerField': int,
+    'SmallIntegerField': int,
+    'PositiveIntegerField': int,
+    'PositiveBigIntegerField': int,
+    'PositiveSmallIntegerField': int,
+    'FloatField': (int, float),
+    'CharField': str,
+    'TextField': str,
+}
+
+
+class InvalidPageParameter(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'invalid_page_parameter'
+
+    def __init__(self, message):
+        super().__init__({"error": message})
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidPageParameter("Некорректный параметр 'cursor'")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidPageParameter("Некорректный параметр 'cursor'")
+    return values
+
+
+def get_page_size(request):
+    page_size = request.query_params.get('page_size')
+    if page_size is None:
+        return kitten_setting('PAGE_SIZE')
+
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise InvalidPageParameter("Некорректный параметр 'page_size'")
+
+    if page_size < 1:
+        raise InvalidPageParameter("Некорректный параметр 'page_size'")
+    return min(page_size, kitten_setting('MAX_PAGE_SIZE'))
+
+
+class KeysetPaginator:
+    """
+    Пагинация по уникальному ключу сортировки.
+
+    `ordering` - поля сортировки, последнее из них должно быть уникальным
+    (обычно `id`). Префикс `-` означает сортировку по убыванию; направление
+    задается первым полем и должно совпадать для всех полей, чтобы запрос
+    обслуживался одним проходом по составному индексу.
+
+    Использование:
+    ```
+    paginator = KeysetPaginator(request)
+    rows = list(paginator.page_queryset(queryset))
+    page, next_cursor = paginator.split(rows)
+    ```
+    """
+    def __init__(self, request, ordering=('id',)):
+        self.ordering = tuple(ordering)
+        self.descending = self.ordering[0].startswith('-')
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.page_size = get_page_size(request)
+
+        cursor = request.query_params.get('cursor')
+        self.position = decode_cursor(cursor, len(self.fields)) if cursor else None
+
+    @property
+    def is_first_page(self):
+        return self.position is None
+
+    def _after_position(self):
+        """
+        Условие "строго после курсора" вида
+        `f1 >= v1 AND (f1 > v1 OR (f2 >= v2 AND (f2 > v2 OR ...)))`.
+        Внешнее условие `f1 >= v1` задает начало диапазона индекса.
+        """
+        gt, gte = ('lt', 'lte') if self.descending else ('gt', 'gte')
+        condition = Q(**{f'{self.fields[-1]}__{gt}': self.position[-1]})
+        for field, value in zip(reversed(self.fields[:-1]), reversed(self.position[:-1])):
+            condition = Q(**{f'{field}__{gte}': value}) & (Q(**{f'{field}__{gt}': value}) | condition)
+        return condition
+
+    def check_position(self, model):
+        """Проверяет, что значения курсора подходят к типам полей сортировки `model`."""
+        for field, value in zip(self.fields, self.position):
+            types = CURSOR_VALUE_TYPES.get(model._meta.get_field(field).get_internal_type())
+            if types is None:
+                raise ValueError(f"Поле {field} не поддерживается курсорной пагинацией")
+            if isinstance(value, bool) or not isinstance(value, types):
+                raise InvalidPageParameter("Некорректный параметр 'cursor'")
+
+    def page_queryset(self, queryset):
+        """Queryset одной страницы; берется на одну строку больше, чтобы узнать, есть ли следующая."""
+        if self.position is not None:
+            self.check_position(queryset.model)
+            queryset = queryset.filter(self._after_position())
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def split(self, rows):
+        """Возвращает строки страницы и курсор следующей страницы (или None)."""
+        rows = list(rows)
+        if len(rows) <= self.page_size:
+            return rows, None
+
+        rows = rows[:self.page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            values = [last[field] for field in self.fields]
+        else:
+            values = [getattr(last, field) for field in self.fields]
+        return rows, encode_cursor(values)
+
+
+def paginated_headers(next_cursor):
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
@@ -0,0 +1,164 @@
+"""Отложенная запись оценок
+
+В режиме `RATING_QUEUE` запрос /api/ratekitten только проверяет оценку и
+существование котёнка, добавляет строку в таблицу-очередь `PendingRating`
+(одна вставка в автокоммите, без блокировок и пересчета агрегатов) и
+отвечает 202. Перенос очереди в `Rating` (`flush()`) выполняет один
+процесс - команда `flush_ratings`, запущенная рядом с веб-процессами (или,
+для развертывания из одного процесса, его фоновый поток:
+`RATING_QUEUE_FLUSH_THREAD`). Строки очереди читаются пачками по
+возрастанию id, для каждой пары (котёнок, пользователь) остается последняя
+оценка, и пачка записывается `ratings.upsert_ratings` вместе с агрегатами
+котят.
+
+Согласованность:
+- ответ 202 означает только, что оценка принята в очередь; она не
+  считается сохраненной, пока не перенесена: до этого ее нет в агрегатах,
+  рейтинге и выборках оценок, а котёнок или пользователь может быть удален.
+  Отставание видно в метрике `kittens_rating_queue_flush_lag_seconds`;
+- оценки одной пары применяются в порядке приема: побеждает последняя
+  принятая, в том числе если она попала в следующую пачку. Поэтому пачки
+  переносятся строго по одной: пачка блокирует свои строки (`SELECT ...
+  FOR UPDATE`), а `SKIP LOCKED` не используется - параллельные пачки
+  могли бы применить старую оценку пары после новой. Если переносчиков
+  все же несколько, на PostgreSQL лишние пропускают проход (advisory-
+  блокировка `FLUSH_LOCK_ID`), а не ждут блокировок строк;
+- оценки котят и пользователей, удаленных до переноса, отбрасываются.
+
+Пачка оценок (/api/ratekitten/batch) по-прежнему записывается сразу:
+она уже выполняется одной транзакцией.
+"""
+
+import logging
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from kittens import metrics
+from kittens import models
+from kittens import ratings
+from kittens.conf import kitten_setting
+
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки PostgreSQL, которую держит текущий перенос
+FLUSH_LOCK_ID = 0x6b697474656e73
+
+
+def enabled():
+    return bool(kitten_setting('RATING_QUEUE'))
+
+
+def enqueue(kitten_id, user_id, value):
+    models.PendingRating.objects.create(kitten_id=kitten_id, user_id=user_id, rating=value)
+    metrics.registry.inc('kittens_rating_queue_accepted_total', {})
+    ensure_flusher()
+
+
+def acquire_flush_lock():
+    """Берет блокировку переноса до конца транзакции; False, если перенос уже идет в другом процессе."""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [FLUSH_LOCK_ID])
+        return cursor.fetchone()[0]
+
+
+def flush(batch_size=None):
+    """
+    Переносит не больше `batch_size` старейших строк очереди в таблицу оценок.
+
+    Возвращает пару (обработано строк очереди, записано оценок); (0, 0), если
+    очередь пуста или ее сейчас переносит другой процесс.
+    """
+    batch_size = batch_size or kitten_setting('RATING_QUEUE_BATCH_SIZE')
+    started = time.perf_counter()
+    with transaction.atomic():
+        if not acquire_flush_lock():
+            return 0, 0
+        rows = list(
+            models.PendingRating.objects
+            .select_for_update()
+            .order_by('id')
+            .values_list('id', 'kitten_id', 'user_id', 'rating', 'created_at')[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+
+        user_ids = set(
+            get_user_model().objects
+            .filter(id__in={user_id for _, _, user_id, _, _ in rows})
+            .values_list('id', flat=True)
+        )
+        # Строки идут по возрастанию id, поэтому upsert_ratings оставит последнюю оценку пары
+        items = [(kitten_id, user_id, value) for _, kitten_id, user_id, value, _ in rows if user_id in user_ids]
+        results = ratings.upsert_ratings(items) if items else {}
+        models.PendingRating.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+    written = sum(created is not None for created in results.values())
+    outcomes = {
+        'applied': written,
+        # Более поздняя оценка той же пары в этой же пачке
+        'superseded': len(items) - len(results),
+        # Котёнок или пользователь удален
+        'dropped': len(rows) - len(items) + len(results) - written,
+    }
+    for result, count in outcomes.items():
+        if count:
+            metrics.registry.inc('kittens_rating_queue_flushed_total', {'result': result}, count)
+    metrics.registry.observe(
+        'kittens_rating_queue_flush_lag_seconds', {},
+        (timezone.now() - min(row[4] for row in rows)).total_seconds(),
+    )
+    metrics.registry.observe('kittens_rating_queue_flush_duration_seconds', {}, time.perf_counter() - started)
+    return len(rows), written
+
+
+def flush_all(batch_size=None):
+    """Переносит очередь целиком. Возвращает (обработано строк очереди, записано оценок)."""
+    batch_size = batch_size or kitten_setting('RATING_QUEUE_BATCH_SIZE')
+    processed = written = 0
+    while True:
+        rows, batch_written = flush(batch_size)
+        processed += rows
+        written += batch_written
+        if rows < batch_size:
+            return processed, written
+
+
+# Фоновый перенос
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def ensure_flusher():
+    """
+    Запускает поток переноса очереди в этом процессе, если он включен и еще не работает.
+
+    Поток предназначен для развертывания из одного процесса; при нескольких
+    веб-процессах очередь переносит команда `flush_ratings`.
+    """
+    global _flusher
+    if not kitten_setting('RATING_QUEUE_FLUSH_THREAD'):
+        return
+    with _flusher_lock:
+        # После fork поток родителя в дочернем процессе не работает
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(target=_run_flusher, name='kittens-rating-flusher', daemon=True)
+        _flusher.start()
+
+
+def _run_flusher():
+    while True:
+        time.sleep(kitten_setting('RATING_QUEUE_FLUSH_INTERVAL'))
+        try:
+            flush_all()
+        except Exception:
+            logger.exception("Не удалось перенести очередь оценок")
+            connection.close()
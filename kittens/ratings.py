@@ -0,0 +1,224 @@
+"""Запись оценок котят
+
+На PostgreSQL прежние значения оценок читаются под блокировкой строк
+(`SELECT ... FOR UPDATE`), а затем оценки записываются одним оператором
+`INSERT ... ON CONFLICT (kitten_id, user_id) DO UPDATE ... RETURNING`,
+который сообщает, была ли оценка создана. Прежнее значение нельзя взять
+подзапросом в RETURNING: он видит снимок начала оператора, и после
+ожидания параллельной транзакции вернул бы значение до ее изменения, а
+агрегаты котёнка сдвинулись бы неверно. На остальных СУБД используется
+переносимый вариант на ORM с той же блокировкой строк.
+"""
+
+from django.db import IntegrityError, connection, transaction
+
+from kittens import aggregates
+from kittens import models
+
+
+RATING_RANGE = range(1, 6)
+
+
+def validate_rating_item(item):
+    """
+    Проверяет элемент пакета оценок `{"kitten_id": ..., "rating_value": ...}`.
+
+    Возвращает пару `(kitten_id, rating_value)` или бросает ValueError с текстом ошибки.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Ожидается объект с параметрами 'kitten_id' и 'rating_value'")
+
+    kitten_id = item.get('kitten_id')
+    rating_value = item.get('rating_value')
+    if not kitten_id:
+        raise ValueError("Необходим параметр 'kitten_id'")
+    if not rating_value:
+        raise ValueError("Необходим параметр 'rating_value'")
+    if not isinstance(kitten_id, int) or isinstance(kitten_id, bool):
+        raise ValueError("Некорректный параметр 'kitten_id'")
+    if not isinstance(rating_value, int) or isinstance(rating_value, bool) or rating_value not in RATING_RANGE:
+        raise ValueError("Оценка должна быть в пределах от 1 до 5")
+    return kitten_id, rating_value
+
+
+# Отдельный оператор в транзакции записи: после ожидания блокировки он
+# читает последнее зафиксированное значение строки
+LOCK_RATINGS_SQL = """
+    SELECT kitten_id, user_id, rating FROM {rating}
+    WHERE (kitten_id, user_id) IN ({pairs})
+    ORDER BY id
+    FOR UPDATE
+"""
+
+UPSERT_RATING_SQL = """
+    INSERT INTO {rating} (kitten_id, user_id, rating)
+    SELECT %s, %s, %s
+    WHERE EXISTS (SELECT 1 FROM {kitten} WHERE id = %s)
+    ON CONFLICT (kitten_id, user_id) DO UPDATE SET rating = EXCLUDED.rating
+    RETURNING (xmax = 0) AS created
+"""
+
+BULK_UPSERT_RATINGS_SQL = """
+    INSERT INTO {rating} (kitten_id, user_id, rating)
+    VALUES {values}
+    ON CONFLICT (kitten_id, user_id) DO UPDATE SET rating = EXCLUDED.rating
+    RETURNING kitten_id, user_id, (xmax = 0) AS created
+"""
+
+
+def lock_previous_ratings(cursor, pairs):
+    """Блокирует существующие оценки пар (котёнок, пользователь) и возвращает их значения."""
+    sql = LOCK_RATINGS_SQL.format(rating=models.Rating._meta.db_table, pairs=', '.join(['(%s, %s)'] * len(pairs)))
+    cursor.execute(sql, [param for pair in pairs for param in pair])
+    return {(kitten_id, user_id): rating for kitten_id, user_id, rating in cursor.fetchall()}
+
+
+def _upsert_rating_postgresql(kitten_id, user_id, value):
+    sql = UPSERT_RATING_SQL.format(rating=models.Rating._meta.db_table, kitten=models.Kitten._meta.db_table)
+    with connection.cursor() as cursor:
+        previous = lock_previous_ratings(cursor, [(kitten_id, user_id)]).get((kitten_id, user_id))
+        cursor.execute(sql, [kitten_id, user_id, value, kitten_id])
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    created, = row
+    if not created and previous is None:
+        # Строку вставила параллельная транзакция после блокировки,
+        # прежнее значение неизвестно - агрегаты котёнка пересчитываются целиком
+        aggregates.refresh_kitten_aggregates(kitten_id)
+    else:
+        aggregates.apply_rating_change(kitten_id, previous, value)
+    return created
+
+
+def _upsert_rating_fallback(kitten_id, user_id, value):
+    if not models.Kitten.objects.filter(id=kitten_id).exists():
+        return None
+
+    for _ in range(2):
+        rating = models.Rating.objects.select_for_update().filter(kitten_id=kitten_id, user_id=user_id).first()
+        if rating is not None:
+            rating.rating = value
+            rating.save(update_fields=['rating'])
+            return False
+        try:
+            with transaction.atomic():
+                models.Rating.objects.create(kitten_id=kitten_id, user_id=user_id, rating=value)
+            return True
+        except IntegrityError:
+            # Параллельный запрос успел создать оценку - обновляем ее
+            continue
+    raise IntegrityError("Не удалось записать оценку")
+
+
+def upsert_rating(kitten_id, user_id, value):
+    """
+    Создает или обновляет оценку пользователя и агрегаты котёнка в одной транзакции.
+
+    Возвращает True, если оценка создана, False, если обновлена,
+    и None, если котёнка не существует.
+    """
+    upsert = _upsert_rating_postgresql if connection.vendor == 'postgresql' else _upsert_rating_fallback
+    try:
+        with transaction.atomic():
+            return upsert(kitten_id, user_id, value)
+    except IntegrityError:
+        if models.Kitten.objects.filter(id=kitten_id).exists():
+            raise
+        # Котёнка удалили параллельно с записью оценки
+        return None
+
+
+def items_by_key(items):
+    return {(kitten_id, user_id): value for kitten_id, user_id, value in items}
+
+
+def _bulk_upsert_postgresql(items, batch_size):
+    values = items_by_key(items)
+    results = {}
+    changes = []
+    refresh = set()
+    table = models.Rating._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            previous_ratings = lock_previous_ratings(cursor, [(kitten_id, user_id) for kitten_id, user_id, _ in batch])
+            sql = BULK_UPSERT_RATINGS_SQL.format(rating=table, values=', '.join(['(%s, %s, %s)'] * len(batch)))
+            cursor.execute(sql, [param for item in batch for param in item])
+            for kitten_id, user_id, created in cursor.fetchall():
+                results[kitten_id, user_id] = created
+                previous = previous_ratings.get((kitten_id, user_id))
+                if not created and previous is None:
+                    # См. _upsert_rating_postgresql
+                    refresh.add(kitten_id)
+                else:
+                    changes.append((kitten_id, previous, values[kitten_id, user_id]))
+
+    aggregates.apply_rating_changes(change for change in changes if change[0] not in refresh)
+    for kitten_id in refresh:
+        aggregates.refresh_kitten_aggregates(kitten_id)
+    return results
+
+
+def _bulk_upsert_fallback(items, batch_size):
+    kitten_ids = {kitten_id for kitten_id, _, _ in items}
+    user_ids = {user_id for _, user_id, _ in items}
+    previous = {
+        (kitten_id, user_id): rating
+        for kitten_id, user_id, rating in models.Rating.objects.select_for_update()
+        .filter(kitten_id__in=kitten_ids, user_id__in=user_ids)
+        .values_list('kitten_id', 'user_id', 'rating')
+    }
+
+    models.Rating.objects.bulk_create(
+        [models.Rating(kitten_id=kitten_id, user_id=user_id, rating=value) for kitten_id, user_id, value in items],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['kitten', 'user'],
+        update_fields=['rating'],
+    )
+    aggregates.apply_rating_changes(
+        (kitten_id, previous.get((kitten_id, user_id)), value) for kitten_id, user_id, value in items
+    )
+    return {(kitten_id, user_id): (kitten_id, user_id) not in previous for kitten_id, user_id, _ in items}
+
+
+def upsert_ratings(items, batch_size=1000):
+    """
+    Создает или обновляет пачку оценок одной транзакцией.
+
+    `items` - список кортежей `(kitten_id, user_id, rating)`. Если одна пара
+    (котёнок, пользователь) встречается несколько раз, побеждает последняя.
+    Существование котят проверяется одним запросом `id__in` в транзакции
+    записи; строки котят блокируются (`FOR NO KEY UPDATE`, как и при
+    обновлении их агрегатов), поэтому удалить их до фиксации нельзя.
+
+    Возвращает словарь `{(kitten_id, user_id): created}`, где created - True
+    для новой оценки, False для обновленной и None, если котёнка не существует.
+    """
+    latest = items_by_key(items)
+    upsert = _bulk_upsert_postgresql if connection.vendor == 'postgresql' else _bulk_upsert_fallback
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing_kittens = set(
+                    models.Kitten.objects.select_for_update(no_key=True)
+                    .filter(id__in={kitten_id for kitten_id, _ in latest})
+                    .order_by('id')
+                    .values_list('id', flat=True)
+                )
+                results = {key: None for key in latest}
+                to_write = [
+                    (kitten_id, user_id, value)
+                    for (kitten_id, user_id), value in latest.items() if kitten_id in existing_kittens
+                ]
+                if to_write:
+                    results.update(upsert(to_write, batch_size))
+            return results
+        except IntegrityError:
+            # СУБД без блокировки строк (SQLite проверяет внешние ключи при фиксации):
+            # котёнка удалили между проверкой и записью - проверяем пачку заново
+            if attempt:
+                raise
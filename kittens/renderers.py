@@ -0,0 +1,36 @@
+"""Рендереры ответов"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from kittens import timing
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON: один JSON-объект на строку.
+
+    Потоковые ответы формируют строки сами, рендерер используется для
+    обычных ответов этих же представлений (например, ошибок).
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return ndjson_line(data)
+
+
+def ndjson_line(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode() + b'\n'
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, время работы которого попадает в этап `render` заголовка Server-Timing."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing.timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,127 @@
+"""Чтение с реплик БД
+
+`ReplicaRouter` направляет чтение моделей приложения kittens на одну из
+реплик из настройки `REPLICAS`, если запрос помечен как читающий
+(`ReplicaMiddleware`: GET/HEAD/OPTIONS или методы из `replica_methods`
+представления). Запись и все запросы вне такого контекста (команды,
+фоновые потоки) идут в `default`.
+
+Согласованность:
+- после первой записи в рамках запроса все его чтения идут в `default`,
+  чтобы запрос видел собственные изменения;
+- после запроса с записью клиент получает cookie `PIN_COOKIE` на
+  `REPLICA_PIN_SECONDS` секунд, и на это время его запросы читают из
+  `default`, пока реплики догоняют основную БД;
+- реплика, отставание которой больше `REPLICA_MAX_LAG` секунд (или которая
+  недоступна), исключается; отставание проверяется не чаще раза в
+  `REPLICA_LAG_CHECK_INTERVAL` секунд. Если подходящих реплик нет, чтение
+  идет в `default`.
+
+Пользователи (`auth`) всегда читаются из `default`: только что
+зарегистрированный пользователь должен сразу проходить аутентификацию.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.db import DatabaseError, connections
+
+from kittens.conf import kitten_setting
+
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'kittens_primary'
+
+# Методы, которые по умолчанию только читают
+READ_METHODS = ('get', 'head', 'options')
+
+# Приложения, модели которых можно читать с реплик
+REPLICA_APPS = ('kittens',)
+
+
+class RouteState:
+    """Маршрут БД текущего запроса."""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('kittens_db_route', default=None)
+
+
+def start(use_replica):
+    state = RouteState(use_replica)
+    return state, _state.set(state)
+
+
+def finish(token):
+    _state.reset(token)
+
+
+# Отставание реплик
+
+_lag_checks = {}
+_lag_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def is_fresh(alias):
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < kitten_setting('REPLICA_LAG_CHECK_INTERVAL'):
+        return checked[1]
+
+    try:
+        fresh = replica_lag(alias) <= kitten_setting('REPLICA_MAX_LAG')
+    except DatabaseError:
+        logger.warning("Реплика %s недоступна", alias, exc_info=True)
+        fresh = False
+    with _lag_lock:
+        _lag_checks[alias] = (now, fresh)
+    return fresh
+
+
+def fresh_replicas():
+    return [alias for alias in kitten_setting('REPLICAS') if is_fresh(alias)]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        replicas = fresh_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и default
+        databases = {'default', *kitten_setting('REPLICAS')}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,128 @@
+"""Полнотекстовый поиск по котятам
+
+Совпадения ищутся по имени, цвету, описанию котёнка и названию его породы
+в индексе, который поддерживают триггеры БД (миграция 0005_kitten_search):
+
+- PostgreSQL: столбец `search_vector` (tsvector, словарь `russian`) с
+  GIN-индексом. Запрос разбирается `websearch_to_tsquery`, к рангу
+  `ts_rank_cd` добавляется триграммное сходство имени (`pg_trgm`), а имена
+  и названия пород, похожие на запрос с опечаткой (оператор `%`), тоже
+  считаются совпадением.
+- SQLite: FTS5-таблица `kittens_kitten_search`. Каждое слово запроса
+  ищется как префикс, ранг - `bm25` с весами полей.
+- Остальные СУБД: `icontains` без индекса и без ранжирования.
+
+Результаты отсортированы по убыванию релевантности (`score`), при равной
+релевантности - по убыванию id; страницы выбираются курсором по паре
+(score, id), как в `kittens.pagination.KeysetPaginator`.
+"""
+
+import re
+
+from django.db import connections, router
+from django.db.models import Q, Value, FloatField
+
+from kittens import models
+
+
+ORDERING = ('-score', '-id')
+
+# Веса полей name, color, description, breed в bm25 (SQLite)
+BM25_WEIGHTS = (10.0, 2.0, 1.0, 5.0)
+
+COLUMNS = ('id', 'name', 'breed', 'owner', 'score')
+
+# Каждый вид совпадения - отдельная ветвь UNION со своим индексом (GIN tsvector, trigram по имени
+# котёнка, trigram по названию породы и (breed_id)). В одном WHERE через OR условие с подзапросом
+# по породам не дает планировщику объединить индексы через BitmapOr, и он читает таблицу целиком.
+POSTGRESQL_QUERY = """
+    WITH matched AS (
+        SELECT id FROM kittens_kitten WHERE search_vector @@ websearch_to_tsquery('russian', %s)
+        UNION
+        SELECT id FROM kittens_kitten WHERE name %% %s
+        UNION
+        SELECT kitten.id FROM kittens_breed breed
+        JOIN kittens_kitten kitten ON kitten.breed_id = breed.id
+        WHERE breed.name %% %s
+    )
+    SELECT id, name, breed_id, owner_id, score FROM (
+        SELECT kitten.id, kitten.name, kitten.breed_id, kitten.owner_id,
+               ts_rank_cd(kitten.search_vector, websearch_to_tsquery('russian', %s))
+               + similarity(kitten.name, %s) AS score
+        FROM matched
+        JOIN kittens_kitten kitten ON kitten.id = matched.id
+    ) ranked
+    {after}
+    ORDER BY score DESC, id DESC
+    LIMIT %s
+"""
+
+SQLITE_QUERY = """
+    SELECT id, name, breed_id, owner_id, score FROM (
+        SELECT kitten.id, kitten.name, kitten.breed_id, kitten.owner_id,
+               -bm25(kittens_kitten_search, %s, %s, %s, %s) AS score
+        FROM kittens_kitten_search
+        JOIN kittens_kitten kitten ON kitten.id = kittens_kitten_search.rowid
+        WHERE kittens_kitten_search MATCH %s
+    ) ranked
+    {after}
+    ORDER BY score DESC, id DESC
+    LIMIT %s
+"""
+
+AFTER_POSITION = "WHERE score <= %s AND (score < %s OR id < %s)"
+
+
+def fts5_query(q):
+    """Запрос FTS5: все слова из `q`, каждое как префикс (`"кот"* "бел"*`)."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', q))
+
+
+def _execute(alias, sql, params, position, limit):
+    if position is None:
+        sql = sql.format(after='')
+    else:
+        sql = sql.format(after=AFTER_POSITION)
+        score, kitten_id = position
+        params = [*params, score, score, kitten_id]
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def _fallback(q, position, limit):
+    condition = Q()
+    for field in ('name', 'color', 'description', 'breed__name'):
+        condition |= Q(**{f'{field}__icontains': q})
+    queryset = models.Kitten.objects.filter(condition)
+    if position is not None:
+        queryset = queryset.filter(id__lt=position[1])
+    return list(
+        queryset
+        .annotate(score=Value(0.0, output_field=FloatField()))
+        .order_by('-id')
+        .values('id', 'name', 'breed', 'owner', 'score')[:limit]
+    )
+
+
+def search(q, position=None, limit=100):
+    """
+    Котята, подходящие под запрос `q`, в порядке убывания релевантности.
+
+    `position` - (score, id) последней строки предыдущей страницы или None.
+    Возвращает не больше `limit` словарей с ключами id, name, breed, owner, score.
+    """
+    # Чтение может идти с реплики (kittens/routers.py)
+    alias = router.db_for_read(models.Kitten)
+    vendor = connections[alias].vendor
+    if vendor == 'postgresql':
+        return _execute(alias, POSTGRESQL_QUERY, [q] * 5, position, limit)
+
+    if vendor == 'sqlite':
+        match = fts5_query(q)
+        if not match:
+            return []
+        return _execute(alias, SQLITE_QUERY, [*BM25_WEIGHTS, match], position, limit)
+
+    return _fallback(q, position, limit)
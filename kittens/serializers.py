@@ -1,33 +1,211 @@
 """Сериализаторы"""
 
+import functools
+
 from rest_framework import serializers
+from rest_framework.serializers import LIST_SERIALIZER_KWARGS, LIST_SERIALIZER_KWARGS_REMOVE
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from kittens import aggregates
 from kittens import models
+from kittens.authentication import UserRefreshToken
+from kittens import timing
 from django.contrib.auth import get_user_model
 
 
 User = get_user_model()
 
 
-class BreedSerializer(serializers.ModelSerializer):
+class TimedDataMixin:
+    """Время построения `.data` попадает в этап `serialize` заголовка Server-Timing."""
+
+    @property
+    def data(self):
+        with timing.timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class DynamicFieldsMixin:
+    """
+    Выбор полей ответа параметром запроса `?fields=id,name`.
+
+    Сериализатор принимает `fields` - список полей, которые останутся в ответе
+    (None - все поля). `only_fields()` возвращает поля модели для
+    `QuerySet.only()`, чтобы из БД читались только нужные столбцы.
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    @functools.cache
+    def field_sources(cls):
+        """Поле сериализатора -> путь к полю модели (`breed_name` -> `breed__name`)."""
+        return {name: field.source.replace('.', '__') for name, field in cls().fields.items()}
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Поля из параметра `fields` или None, если он не передан."""
+        value = request.query_params.get('fields')
+        if value is None:
+            return None
+
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in cls.field_sources()]
+        if unknown or not names:
+            raise serializers.ValidationError({"error": f"Некорректный параметр 'fields': {', '.join(unknown)}"})
+        return names
+
+    @classmethod
+    def only_fields(cls, fields=None, extra=()):
+        """
+        Поля модели для `only()`: источники полей `fields` (или всех полей) и
+        `extra` - поля, нужные представлению, например ключ сортировки курсора.
+        """
+        sources = cls.field_sources()
+        names = sources if fields is None else fields
+        return list(dict.fromkeys([*(sources[name] for name in names), *(name.lstrip('-') for name in extra)]))
+
+    @staticmethod
+    def related(only_fields):
+        """Связи, которые нужно загрузить через `select_related` для полей `only_fields`."""
+        return list(dict.fromkeys(path.split('__')[0] for path in only_fields if '__' in path))
+
+
+class TimedModelSerializer(TimedDataMixin, serializers.ModelSerializer):
+    """Базовый сериализатор моделей; списки (`many=True`) по умолчанию строятся `TimedListSerializer`."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # Как BaseSerializer.many_init, но без `Meta.list_serializer_class` берется TimedListSerializer
+        list_kwargs = {}
+        for key in LIST_SERIALIZER_KWARGS_REMOVE:
+            value = kwargs.pop(key, None)
+            if value is not None:
+                list_kwargs[key] = value
+        list_kwargs['child'] = cls(*args, **kwargs)
+        list_kwargs.update({key: value for key, value in kwargs.items() if key in LIST_SERIALIZER_KWARGS})
+        list_serializer_class = getattr(getattr(cls, 'Meta', None), 'list_serializer_class', TimedListSerializer)
+        return list_serializer_class(*args, **list_kwargs)
+
+
+class BreedSerializer(TimedModelSerializer):
     class Meta:
         model = models.Breed
         fields = ['id', 'name']
 
 
-class KittenSerializer(serializers.ModelSerializer):
+class KittenSerializer(DynamicFieldsMixin, TimedModelSerializer):
     class Meta:
         model = models.Kitten
         fields = ['id', 'name', 'breed', 'owner']
 
 
-class DetailedKittenSerializer(serializers.ModelSerializer):
+class CatalogKittenSerializer(DynamicFieldsMixin, TimedModelSerializer):
+    class Meta:
+        model = models.Kitten
+        fields = ['id', 'name', 'color', 'age_in_months', 'breed', 'owner', 'rating_count', 'rating_average']
+
+
+class DetailedKittenSerializer(DynamicFieldsMixin, TimedModelSerializer):
     class Meta:
         model = models.Kitten
         fields = '__all__'
         extra_kwargs = {'owner': {'required': False}}
 
 
-class UserSerializer(serializers.ModelSerializer):
+class BatchKittenDetailSerializer(DetailedKittenSerializer):
+    """Подробности котёнка с названием породы и именем владельца (нужен `select_related('breed', 'owner')`)."""
+    breed_name = serializers.CharField(source='breed.name', read_only=True)
+    owner_username = serializers.CharField(source='owner.username', read_only=True)
+
+
+class OwnerKittenSerializer(TimedModelSerializer):
+    """
+    Котёнок владельца с агрегатами оценок из предрассчитанных столбцов
+    (kittens/aggregates.py); нужен `select_related('breed')`.
+    """
+    breed_name = serializers.CharField(source='breed.name', read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Kitten
+        fields = [
+            'id', 'name', 'color', 'age_in_months', 'breed', 'breed_name',
+            'rating_count', 'rating_average', 'rating_histogram',
+        ]
+
+    # Столбцы модели для `only()`
+    model_fields = (
+        'id', 'name', 'color', 'age_in_months', 'breed__name',
+        'rating_count', 'rating_average', *aggregates.HISTOGRAM_FIELDS.values(),
+    )
+
+    def get_rating_histogram(self, kitten):
+        return {value: getattr(kitten, field) for value, field in aggregates.HISTOGRAM_FIELDS.items()}
+
+
+class KittenBulkListSerializer(TimedListSerializer):
+    """
+    Список котят для пакетных операций.
+
+    Породы всех элементов проверяются одним запросом `id__in`, а создание
+    выполняется одним `bulk_create`. Ошибки возвращаются по каждому элементу.
+    """
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({"error": "Ожидается список котят"})
+
+        validated, errors = [], []
+        for item in data:
+            try:
+                validated.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                validated.append(None)
+                errors.append(exc.detail)
+
+        breed_ids = {attrs['breed_id'] for attrs in validated if attrs and 'breed_id' in attrs}
+        existing = set(models.Breed.objects.filter(id__in=breed_ids).values_list('id', flat=True))
+        does_not_exist = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        for index, attrs in enumerate(validated):
+            if attrs and 'breed_id' in attrs and attrs['breed_id'] not in existing:
+                errors[index] = {'breed': [does_not_exist.format(pk_value=attrs['breed_id'])]}
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def create(self, validated_data):
+        return models.Kitten.objects.bulk_create([models.Kitten(**attrs) for attrs in validated_data])
+
+
+class KittenBulkSerializer(DetailedKittenSerializer):
+    # Существование пород проверяет KittenBulkListSerializer одним запросом на весь список
+    breed = serializers.IntegerField(source='breed_id')
+
+    class Meta(DetailedKittenSerializer.Meta):
+        list_serializer_class = KittenBulkListSerializer
+
+
+class LeaderboardEntrySerializer(TimedModelSerializer):
+    name = serializers.CharField(source='kitten.name')
+
+    class Meta:
+        model = models.LeaderboardEntry
+        fields = ['position', 'kitten', 'name', 'breed', 'score', 'rating_count', 'rating_average']
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = UserRefreshToken
+
+
+class UserSerializer(TimedModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'password')
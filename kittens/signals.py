@@ -0,0 +1,73 @@
+"""Обработчики сигналов моделей"""
+
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from kittens import aggregates
+from kittens import authentication
+from kittens import cache
+from kittens import models
+from kittens import snapshot
+from kittens import timing
+
+
+@receiver(post_save, sender=models.Rating)
+def rating_saved(sender, instance, created, using, **kwargs):
+    old = None if created else getattr(instance, '_loaded_rating', None)
+    old_kitten_id = None if created else getattr(instance, '_loaded_kitten_id', None)
+    if old is None and not created:
+        # Оценка не была загружена из БД (например, сохранена по известному pk) -
+        # прежнее значение неизвестно, агрегаты котёнка пересчитываются целиком
+        aggregates.refresh_kitten_aggregates(instance.kitten_id, using=using)
+    elif old_kitten_id is not None and old_kitten_id != instance.kitten_id:
+        # Оценку перенесли на другого котёнка: у прежнего она убывает, у нового появляется
+        aggregates.apply_rating_changes(
+            [(old_kitten_id, old, None), (instance.kitten_id, None, instance.rating)], using=using,
+        )
+    else:
+        aggregates.apply_rating_change(instance.kitten_id, old, instance.rating, using=using)
+    instance._loaded_rating = instance.rating
+    instance._loaded_kitten_id = instance.kitten_id
+
+
+@receiver(post_delete, sender=models.Rating)
+def rating_deleted(sender, instance, using, origin=None, **kwargs):
+    # При удалении самого котёнка его агрегаты обновлять незачем
+    if isinstance(origin, models.Kitten):
+        return
+    if isinstance(origin, QuerySet) and origin.model is models.Kitten:
+        return
+
+    old = getattr(instance, '_loaded_rating', instance.rating)
+    kitten_id = getattr(instance, '_loaded_kitten_id', None) or instance.kitten_id
+    aggregates.apply_rating_change(kitten_id, old, None, using=using)
+
+
+@receiver(post_save, sender=models.Breed)
+@receiver(post_delete, sender=models.Breed)
+def breed_changed(sender, **kwargs):
+    cache.bump_breed_list_version()
+
+
+@receiver(post_save, sender=models.Kitten)
+@receiver(post_delete, sender=models.Kitten)
+def kitten_changed(sender, instance, **kwargs):
+    snapshot.schedule_rebuild(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, **kwargs):
+    authentication.remember_user(instance)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    authentication.forget_user(instance.pk)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    timing.install_execute_wrapper(connection)
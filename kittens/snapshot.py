@@ -0,0 +1,379 @@
+"""Снимок каталога для /api/kittenlist
+
+Страницы списка котят с параметрами по умолчанию (без `fields`, размер
+страницы `PAGE_SIZE`) заранее сериализуются в JSON и сохраняются в каталоге
+`SNAPSHOT_DIR` в двух вариантах: как есть и сжатыми gzip. Представление
+отдает готовые байты нужного варианта по `Accept-Encoding`, не обращаясь
+к БД и не сериализуя данные заново.
+
+Структура каталога:
+- `<версия>/<n>.json`, `<версия>/<n>.json.gz` - n-я страница;
+- `<версия>/manifest.json` - курсор -> номер страницы, курсоры следующих
+  страниц и id последнего котёнка каждой страницы;
+- `current.json` - текущая версия; подменяется атомарно после сборки;
+- `dirty.json` - наименьший id измененного котёнка с последней сборки.
+
+Изменение котят (сигналы и пакетные операции вызывают `schedule_rebuild()`)
+только записывает после фиксации транзакции его id в `dirty.json`. Страницы
+снимка, которые могут содержать этого котёнка (последний id страницы не
+меньше отмеченного, а также последняя страница), с этого момента не
+отдаются: запросы к ним выполняются по БД, пока снимок не пересобран.
+
+Снимок пересобирает один процесс на сервере - держатель блокировки
+`.leader.lock`: фоновый поток веб-процесса (`SNAPSHOT_BUILDER_THREAD`) или
+команда `build_catalog_snapshot --watch`. Раз в `SNAPSHOT_DEBOUNCE` секунд
+он проверяет `dirty.json` и собирает новую версию: страницы до измененной
+переносятся из предыдущей версии жесткими ссылками, заново читаются из БД
+и сериализуются только страницы начиная с нее.
+"""
+
+import fcntl
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection, transaction
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from kittens import models
+from kittens import serializers
+from kittens.conf import kitten_setting
+from kittens.pagination import encode_cursor, paginated_headers
+
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'current.json'
+MANIFEST_FILE = 'manifest.json'
+DIRTY_FILE = 'dirty.json'
+LOCK_FILE = '.lock'
+DIRTY_LOCK_FILE = '.dirty.lock'
+LEADER_LOCK_FILE = '.leader.lock'
+
+Snapshot = namedtuple('Snapshot', ['version', 'path', 'page_size', 'pages', 'next', 'last_ids'])
+SnapshotPage = namedtuple('SnapshotPage', ['body', 'encoding', 'next_cursor'])
+
+
+def enabled():
+    return bool(kitten_setting('SNAPSHOT_DIR'))
+
+
+# Сборка
+
+def write_file(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(path):
+    with open(path, 'w') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def build_lock(directory):
+    return file_lock(os.path.join(directory, LOCK_FILE))
+
+
+def write_page(path, index, raw):
+    write_file(os.path.join(path, f'{index}.json'), raw)
+    write_file(os.path.join(path, f'{index}.json.gz'), gzip.compress(raw, mtime=0))
+
+
+def link_page(source, path, index):
+    for name in (f'{index}.json', f'{index}.json.gz'):
+        try:
+            os.link(os.path.join(source, name), os.path.join(path, name))
+        except OSError:
+            shutil.copyfile(os.path.join(source, name), os.path.join(path, name))
+
+
+def build(full=False):
+    """
+    Собирает новый снимок и делает его текущим. Возвращает (версия, количество страниц).
+
+    Без `full` страницы, в которых нет котят с id из `dirty.json`, переносятся
+    из текущей версии; если изменений не было, новая версия не собирается.
+    """
+    directory = kitten_setting('SNAPSHOT_DIR')
+    page_size = kitten_setting('PAGE_SIZE')
+    os.makedirs(directory, exist_ok=True)
+
+    with build_lock(directory):
+        dirty = read_dirty(directory)
+        previous = read_current_version(directory)
+        manifest = read_manifest(directory, previous) if previous else None
+        if full or manifest is None or manifest['page_size'] != page_size:
+            keep = 0
+        elif dirty is None:
+            return previous, len(manifest['next'])
+        else:
+            # Последняя страница пересобирается всегда: в нее попадают новые котята
+            keep = 0
+            while keep < len(manifest['next']) - 1 and manifest['last_ids'][keep] < dirty['from']:
+                keep += 1
+
+        version = str(time.time_ns())
+        path = os.path.join(directory, version)
+        os.makedirs(path)
+
+        # Курсор '' - первая страница
+        pages, next_cursors, last_ids = {'': 0}, [], []
+        for index in range(keep):
+            link_page(os.path.join(directory, previous), path, index)
+            pages[manifest['next'][index]] = index + 1
+            next_cursors.append(manifest['next'][index])
+            last_ids.append(manifest['last_ids'][index])
+
+        renderer = JSONRenderer()
+        serializer_class = serializers.KittenSerializer
+        queryset = models.Kitten.objects.only(*serializer_class.only_fields()).order_by('id')
+        if keep:
+            queryset = queryset.filter(id__gt=last_ids[-1])
+        kittens = queryset.iterator(chunk_size=max(page_size, 2000))
+        for index, chunk in enumerate(iter(lambda: list(islice(kittens, page_size)), []), start=keep):
+            write_page(path, index, renderer.render(serializer_class(chunk, many=True).data))
+            cursor = encode_cursor([chunk[-1].id])
+            pages[cursor] = index + 1
+            next_cursors.append(cursor)
+            last_ids.append(chunk[-1].id)
+
+        if next_cursors:
+            # У последней страницы нет следующей
+            del pages[next_cursors[-1]]
+            next_cursors[-1] = None
+        else:
+            write_page(path, 0, renderer.render([]))
+            next_cursors.append(None)
+            last_ids.append(None)
+
+        manifest = {
+            'version': version, 'page_size': page_size,
+            'pages': pages, 'next': next_cursors, 'last_ids': last_ids,
+        }
+        write_file(os.path.join(path, MANIFEST_FILE), json.dumps(manifest).encode())
+        write_file(os.path.join(directory, CURRENT_FILE), json.dumps({'version': version}).encode())
+        clear_dirty(directory, dirty)
+
+        # Предыдущая версия остается для запросов, которые уже прочитали ее манифест
+        for name in os.listdir(directory):
+            if name not in (version, previous) and os.path.isdir(os.path.join(directory, name)):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    return version, len(next_cursors)
+
+
+def read_current_version(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as file:
+            return json.load(file)['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_manifest(directory, version):
+    try:
+        with open(os.path.join(directory, str(version), MANIFEST_FILE)) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    # Манифест версии без last_ids собирается заново целиком
+    return manifest if 'last_ids' in manifest else None
+
+
+# Изменения
+
+def read_dirty(directory):
+    """Отметка изменений: {'from': наименьший измененный id, 'generation': номер отметки} или None."""
+    try:
+        with open(os.path.join(directory, DIRTY_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def mark_changed(kitten_id=None):
+    """Отмечает устаревшими страницы снимка начиная с котёнка `kitten_id` (None - все страницы)."""
+    directory = kitten_setting('SNAPSHOT_DIR')
+    os.makedirs(directory, exist_ok=True)
+    start = kitten_id if kitten_id is not None else 0
+    with file_lock(os.path.join(directory, DIRTY_LOCK_FILE)):
+        dirty = read_dirty(directory)
+        if dirty is not None:
+            start = min(start, dirty['from'])
+        generation = dirty['generation'] + 1 if dirty is not None else 1
+        write_file(os.path.join(directory, DIRTY_FILE), json.dumps({'from': start, 'generation': generation}).encode())
+    ensure_builder()
+
+
+def clear_dirty(directory, dirty):
+    """Снимает отметку, по которой собрана версия, если после начала сборки изменений не было."""
+    with file_lock(os.path.join(directory, DIRTY_LOCK_FILE)):
+        if dirty is not None and read_dirty(directory) == dirty:
+            os.remove(os.path.join(directory, DIRTY_FILE))
+
+
+def schedule_rebuild(kitten_id=None):
+    """Отмечает снимок устаревшим начиная с котёнка `kitten_id` после фиксации текущей транзакции."""
+    if enabled():
+        transaction.on_commit(lambda: mark_changed(kitten_id))
+
+
+# Фоновая пересборка
+
+_builder = None
+_builder_lock = threading.Lock()
+
+
+def ensure_builder():
+    """Запускает поток сборщика в этом процессе, если он включен и еще не работает."""
+    global _builder
+    if not kitten_setting('SNAPSHOT_BUILDER_THREAD'):
+        return
+    with _builder_lock:
+        # После fork поток родителя в дочернем процессе не работает
+        if _builder is not None and _builder.is_alive():
+            return
+        _builder = threading.Thread(target=run_builder, name='kittens-snapshot-builder', daemon=True)
+        _builder.start()
+
+
+def run_builder():
+    """
+    Цикл сборщика снимка. Сначала ждет блокировку лидера: пока ее держит
+    другой процесс, этот только ждет. Став лидером, раз в `SNAPSHOT_DEBOUNCE`
+    секунд пересобирает снимок, если есть изменения.
+    """
+    directory = kitten_setting('SNAPSHOT_DIR')
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(os.path.join(directory, LEADER_LOCK_FILE)):
+        while True:
+            time.sleep(kitten_setting('SNAPSHOT_DEBOUNCE'))
+            if read_dirty(directory) is None:
+                continue
+            try:
+                build()
+            except Exception:
+                logger.exception("Не удалось пересобрать снимок каталога")
+            finally:
+                connection.close()
+
+
+# Чтение
+
+_snapshot = None
+_snapshot_key = None
+
+
+def current():
+    """Текущий снимок; манифест перечитывается, только когда изменился `current.json`."""
+    global _snapshot, _snapshot_key
+    directory = kitten_setting('SNAPSHOT_DIR')
+    if not directory:
+        return None
+    try:
+        stat = os.stat(os.path.join(directory, CURRENT_FILE))
+    except OSError:
+        return None
+
+    key = (directory, stat.st_ino, stat.st_mtime_ns)
+    if key != _snapshot_key:
+        version = read_current_version(directory)
+        manifest = read_manifest(directory, version)
+        if manifest is None:
+            return None
+        _snapshot = Snapshot(
+            version, os.path.join(directory, str(version)),
+            manifest['page_size'], manifest['pages'], manifest['next'], manifest['last_ids'],
+        )
+        _snapshot_key = key
+    return _snapshot
+
+
+_dirty = None
+_dirty_key = None
+
+
+def changed_from():
+    """Наименьший id котёнка, измененного после сборки снимка, или None; файл перечитывается, только когда изменился."""
+    global _dirty, _dirty_key
+    directory = kitten_setting('SNAPSHOT_DIR')
+    try:
+        stat = os.stat(os.path.join(directory, DIRTY_FILE))
+    except OSError:
+        return None
+
+    key = (directory, stat.st_ino, stat.st_mtime_ns)
+    if key != _dirty_key:
+        dirty = read_dirty(directory)
+        _dirty = dirty['from'] if dirty is not None else 0
+        _dirty_key = key
+    return _dirty
+
+
+def accepts_gzip(accept_encoding):
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        if coding.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def find_page(request):
+    """Страница снимка для запроса к /api/kittenlist или None, если запрос нужно выполнить по БД."""
+    params = request.query_params
+    if 'fields' in params:
+        return None
+
+    snapshot = current()
+    if snapshot is None or snapshot.page_size != kitten_setting('PAGE_SIZE'):
+        return None
+    if params.get('page_size', str(snapshot.page_size)) != str(snapshot.page_size):
+        return None
+
+    index = snapshot.pages.get(params.get('cursor', ''))
+    if index is None:
+        return None
+    changed = changed_from()
+    if changed is not None and (snapshot.next[index] is None or snapshot.last_ids[index] >= changed):
+        # Страница могла измениться после сборки снимка
+        return None
+
+    encoding = 'gzip' if accepts_gzip(request.headers.get('Accept-Encoding', '')) else None
+    file_name = f'{index}.json.gz' if encoding else f'{index}.json'
+    try:
+        with open(os.path.join(snapshot.path, file_name), 'rb') as file:
+            body = file.read()
+    except OSError:
+        # Версия удалена новой сборкой
+        return None
+    return SnapshotPage(body, encoding, snapshot.next[index])
+
+
+def page_response(page):
+    response = HttpResponse(page.body, content_type='application/json', headers=paginated_headers(page.next_cursor))
+    if page.encoding:
+        response['Content-Encoding'] = page.encoding
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -1,9 +1,43 @@
+import gzip
+import json
+import os
+import re
+import time
+import traceback
 import pytest
+import numpy as np
+from io import StringIO
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings as django_settings
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework.test import APIClient
 from kittens.models import Breed
-from kittens.models import Kitten, Breed, Rating
+from kittens.models import Kitten, Breed, ImportCheckpoint, PendingRating, Rating
+from kittens import aggregates
+from kittens import authentication
+from kittens import benchmarks
+from kittens import cache
+from kittens import hashing
+from kittens import leaderboard
+from kittens import metrics
+from kittens import rating_queue
+from kittens import ratings
+from kittens import routers
+from kittens import search
+from kittens import snapshot
+from kittens import urls
+from kittens.management.commands import import_catalog
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from kittens.authentication import UserRefreshToken
+from kittens.conf import kitten_setting
+from kittens.pagination import encode_cursor
 
 
 User = get_user_model()
@@ -105,6 +139,71 @@ def test_kitten_detail_not_found():
     assert response.data["message"] == "Котёнок не найден."
 
 
+@pytest.mark.django_db
+def test_kitten_detail_batch(django_assert_num_queries):
+    siamese = Breed.objects.create(name="Siamese")
+    persian = Breed.objects.create(name="Persian")
+    user = User.objects.create_user(username="testuser", password="password")
+    first = Kitten.objects.create(name="Kitty1", breed=siamese, age_in_months=2, owner=user, color="red", description="description")
+    second = Kitten.objects.create(name="Kitty2", breed=persian, age_in_months=3, owner=user, color="white", description="description")
+
+    client = APIClient()
+    with django_assert_num_queries(1):
+        response = client.post('/api/kittendetail', data={'kitten_ids': [second.id, 999, first.id, second.id]}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [kitten['id'] for kitten in response.data['results']] == [second.id, first.id]
+    assert response.data['results'][0]['breed_name'] == "Persian"
+    assert response.data['results'][0]['owner_username'] == "testuser"
+    assert response.data['results'][1]['color'] == "red"
+    assert response.data['missing'] == [999]
+
+
+@pytest.mark.django_db
+def test_kitten_detail_batch_validation(settings):
+    settings.KITTENS = {**settings.KITTENS, 'KITTEN_DETAIL_BATCH_MAX_SIZE': 2}
+    client = APIClient()
+
+    response = client.post('/api/kittendetail', data={'kitten_ids': [1, 2, 3]}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.post('/api/kittendetail', data={'kitten_ids': ["1"]}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.post('/api/kittendetail', data={'kitten_ids': []}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {'results': [], 'missing': []}
+
+
+@pytest.mark.django_db
+def test_sparse_fieldsets(django_assert_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty1", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    client = APIClient()
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/kittenlist?fields=id,name')
+    assert response.data == [{'id': kitten.id, 'name': "Kitty1"}]
+    assert len(queries) == 1
+    assert 'description' not in queries[0]['sql']
+
+    with django_assert_num_queries(1):
+        response = client.post('/api/kittendetail?fields=name,color', data={'kitten_id': kitten.id}, format='json')
+    assert response.data == {'name': "Kitty1", 'color': "red"}
+
+    with django_assert_num_queries(1):
+        response = client.post('/api/kittendetail?fields=name,breed_name', data={'kitten_ids': [kitten.id]}, format='json')
+    assert response.data['results'] == [{'name': "Kitty1", 'breed_name': "Siamese"}]
+
+    response = client.get('/api/kittens?fields=name,rating_average&ordering=-age')
+    assert response.data['results'] == [{'name': "Kitty1", 'rating_average': 0.0}]
+
+    response = client.get('/api/kittenlist?fields=name,weight')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data['error'] == "Некорректный параметр 'fields': weight"
+
+
 @pytest.mark.django_db
 def test_create_kitten_success():
     breed = Breed.objects.create(name="Siamese")
@@ -437,4 +536,1550 @@ def test_rate_kitten_kitten_not_found():
 
     # Проверка ответа на отсутствие котенка
     assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.data["detail"] == "No Kitten matches the given query."
\ No newline at end of file
+    assert response.data["detail"] == "No Kitten matches the given query."
+
+@pytest.mark.django_db
+def test_kitten_list_cursor_pagination():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    for i in range(5):
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    names = []
+    response = client.get('/api/kittenlist', {'page_size': 2})
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) <= 2
+        names.extend(kitten['name'] for kitten in response.data)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        response = client.get('/api/kittenlist', {'page_size': 2, 'cursor': cursor})
+
+    assert names == [f"Kitty{i}" for i in range(5)]
+
+
+@pytest.mark.django_db
+def test_kitten_list_page_size_limit(settings):
+    settings.KITTENS = {'MAX_PAGE_SIZE': 3}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    for i in range(5):
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    response = client.get('/api/kittenlist', {'page_size': 1000})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data) == 3
+    assert 'X-Next-Cursor' in response.headers
+
+
+@pytest.mark.django_db
+def test_kitten_list_invalid_cursor():
+    client = APIClient()
+    response = client.get('/api/kittenlist', {'cursor': 'not-a-cursor'})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["error"] == "Некорректный параметр 'cursor'"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path, params, values', [
+    ('/api/kittenlist', {}, ["abc"]),
+    ('/api/kittenlist', {}, [None]),
+    ('/api/kittenlist', {}, [[1]]),
+    ('/api/kittenlist', {}, [{"a": 1}]),
+    ('/api/kittenlist', {}, [1.5]),
+    ('/api/kittenlist', {}, [True]),
+    ('/api/kittens', {'ordering': 'name'}, [1, 1]),
+    ('/api/kittens', {'ordering': 'name'}, ["Кот", "1"]),
+    ('/api/kittens', {'ordering': '-rating'}, ["abc", 1]),
+    ('/api/kittens', {'ordering': '-rating'}, [None, 1]),
+    ('/api/my/kittens', {}, [{"a": 1}]),
+])
+def test_cursor_value_types(path, params, values):
+    user = User.objects.create_user(username="testuser", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.get(path, {**params, 'cursor': encode_cursor(values)})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["error"] == "Некорректный параметр 'cursor'"
+
+
+@pytest.mark.django_db
+def test_kitten_list_snapshot(settings, tmp_path, django_assert_num_queries, django_capture_on_commit_callbacks):
+    settings.KITTENS = {**settings.KITTENS, 'SNAPSHOT_DIR': str(tmp_path), 'SNAPSHOT_BUILDER_THREAD': False, 'PAGE_SIZE': 2}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    with django_capture_on_commit_callbacks(execute=True):
+        kittens = [
+            Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+            for i in range(5)
+        ]
+    snapshot.build()
+
+    client = APIClient()
+    pages, cursors, cursor = [], [None], None
+    while True:
+        with django_assert_num_queries(0):
+            response = client.get('/api/kittenlist', {'cursor': cursor} if cursor else {}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert response['Content-Encoding'] == 'gzip'
+        pages.append(json.loads(gzip.decompress(response.content)))
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+        cursors.append(cursor)
+    assert [[kitten['id'] for kitten in page] for page in pages] == [
+        [kittens[0].id, kittens[1].id], [kittens[2].id, kittens[3].id], [kittens[4].id]
+    ]
+
+    # Без gzip отдается несжатый вариант; ответ совпадает с ответом по БД
+    response = client.get('/api/kittenlist')
+    assert 'Content-Encoding' not in response
+    live = client.get('/api/kittenlist', {'fields': 'id,name,breed,owner'})
+    assert response.content == live.content
+    assert response['X-Next-Cursor'] == live['X-Next-Cursor']
+
+    def get_page(index):
+        return client.get('/api/kittenlist', {'cursor': cursors[index]} if cursors[index] else {})
+
+    # Изменение только отмечает снимок: страницы до измененного котёнка отдаются из снимка,
+    # остальные - по БД до пересборки
+    with django_capture_on_commit_callbacks(execute=True):
+        kittens[2].name = "Renamed"
+        kittens[2].save()
+    with django_assert_num_queries(0):
+        get_page(0)
+    for index in (1, 2):
+        with django_assert_num_queries(1):
+            response = get_page(index)
+    assert get_page(1).data[0]['name'] == "Renamed"
+
+    # Сборка переносит неизмененную страницу из предыдущей версии и пересобирает остальные
+    previous = snapshot.current()
+    version, page_count = snapshot.build()
+    assert page_count == 3
+    assert os.path.samefile(os.path.join(previous.path, '0.json'), tmp_path / version / '0.json')
+    assert not os.path.samefile(os.path.join(previous.path, '1.json'), tmp_path / version / '1.json')
+    with django_assert_num_queries(0):
+        assert json.loads(get_page(1).content)[0]['name'] == "Renamed"
+    # Без изменений новая версия не собирается
+    assert snapshot.build() == (version, 3)
+
+    # Новый котёнок попадает на последнюю страницу
+    with django_capture_on_commit_callbacks(execute=True):
+        Kitten.objects.create(name="Newcomer", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    with django_assert_num_queries(0):
+        get_page(1)
+    assert [kitten['name'] for kitten in get_page(2).data] == ["Kitty4", "Newcomer"]
+    snapshot.build()
+    with django_assert_num_queries(0):
+        assert [kitten['name'] for kitten in json.loads(get_page(2).content)] == ["Kitty4", "Newcomer"]
+
+    # Прочие параметры обслуживаются по БД
+    with django_assert_num_queries(1):
+        response = client.get('/api/kittenlist', {'page_size': 3})
+    assert len(response.data) == 3
+
+
+@pytest.mark.django_db
+def test_build_catalog_snapshot_command(settings, tmp_path):
+    settings.KITTENS = {**settings.KITTENS, 'SNAPSHOT_DIR': str(tmp_path)}
+    out = StringIO()
+    call_command('build_catalog_snapshot', stdout=out)
+    call_command('build_catalog_snapshot', stdout=out)
+    call_command('build_catalog_snapshot', stdout=out)
+
+    # Остаются текущая и предыдущая версии
+    assert len([path for path in tmp_path.iterdir() if path.is_dir()]) == 2
+    response = APIClient().get('/api/kittenlist')
+    assert response.content == b'[]'
+
+
+@pytest.mark.django_db
+def test_my_kittens(django_assert_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    other_user = User.objects.create_user(username="otheruser", password="password")
+    kittens = [
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(3)
+    ]
+    Kitten.objects.create(name="Other", breed=breed, age_in_months=2, owner=other_user, color="red", description="description")
+    Rating.objects.create(kitten=kittens[0], user=user, rating=5)
+    Rating.objects.create(kitten=kittens[0], user=other_user, rating=4)
+
+    client = APIClient()
+    assert client.get('/api/my/kittens').status_code == status.HTTP_401_UNAUTHORIZED
+
+    client.force_authenticate(user=user)
+    with django_assert_num_queries(1):
+        response = client.get('/api/my/kittens', {'page_size': 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data[0] == {
+        'id': kittens[0].id, 'name': "Kitty0", 'color': "red", 'age_in_months': 2,
+        'breed': breed.id, 'breed_name': "Siamese",
+        'rating_count': 2, 'rating_average': 4.5, 'rating_histogram': {1: 0, 2: 0, 3: 0, 4: 1, 5: 1},
+    }
+    assert response.data[1]['rating_count'] == 0
+
+    response = client.get('/api/my/kittens', {'page_size': 2, 'cursor': response['X-Next-Cursor']})
+    assert [kitten['id'] for kitten in response.data] == [kittens[2].id]
+    assert 'X-Next-Cursor' not in response
+
+
+@pytest.mark.django_db
+def test_rating_queue(settings):
+    settings.KITTENS = {**settings.KITTENS, 'RATING_QUEUE': True}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    other_user = User.objects.create_user(username="otheruser", password="password")
+    kitten = Kitten.objects.create(name="Fluffy", age_in_months=2, owner=user, color="white", breed=breed)
+    doomed = Kitten.objects.create(name="Doomed", age_in_months=2, owner=user, color="white", breed=breed)
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    for kitten_id, value in ((kitten.id, 5), (kitten.id, 2), (doomed.id, 4)):
+        response = client.post('/api/ratekitten', data={'kitten_id': kitten_id, 'rating_value': value}, format='json')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["message"] == "Оценка принята в очередь и будет учтена после обработки."
+    response = client.post('/api/ratekitten', data={'kitten_id': 9999, 'rating_value': 5}, format='json')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    client.force_authenticate(user=other_user)
+    client.post('/api/ratekitten', data={'kitten_id': kitten.id, 'rating_value': 4}, format='json')
+
+    # До переноса оценки не видны
+    assert not Rating.objects.exists()
+    doomed.delete()
+
+    # Вторая оценка пользователя попадает в следующую пачку и все равно побеждает
+    assert rating_queue.flush(batch_size=1) == (1, 1)
+    assert rating_queue.flush_all() == (3, 2)
+    assert not PendingRating.objects.exists()
+    assert dict(Rating.objects.values_list('user__username', 'rating')) == {"testuser": 2, "otheruser": 4}
+    kitten.refresh_from_db()
+    assert (kitten.rating_count, kitten.rating_sum) == (2, 6)
+
+    text = client.get('/metrics').content.decode()
+    assert metric_value(text, 'kittens_rating_queue_flushed_total{result="applied"}') >= 3
+    assert metric_value(text, 'kittens_rating_queue_flushed_total{result="dropped"}') >= 1
+    assert metric_value(text, 'kittens_rating_queue_flush_lag_seconds_count') >= 2
+
+
+@pytest.mark.django_db
+def test_flush_ratings_command(settings):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Fluffy", age_in_months=2, owner=user, color="white", breed=breed)
+    PendingRating.objects.create(kitten_id=kitten.id, user_id=user.id, rating=3)
+    PendingRating.objects.create(kitten_id=kitten.id, user_id=user.id, rating=5)
+
+    out = StringIO()
+    call_command('flush_ratings', '--once', stdout=out)
+    assert "Строк очереди: 2, записано оценок: 1" in out.getvalue()
+    assert Rating.objects.get().rating == 5
+
+
+def test_flush_ratings_command_survives_errors(monkeypatch):
+    class Stop(BaseException):
+        pass
+
+    results = [DatabaseError("deadlock detected"), (2, 1), Stop()]
+
+    def flush_all(batch_size=None):
+        result = results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    monkeypatch.setattr(rating_queue, 'flush_all', flush_all)
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+    out = StringIO()
+    with pytest.raises(Stop):
+        call_command('flush_ratings', stdout=out)
+
+    assert "Строк очереди: 2, записано оценок: 1" in out.getvalue()
+    assert not results
+
+
+def test_replica_router(settings, monkeypatch):
+    settings.KITTENS = {**settings.KITTENS, 'REPLICAS': ['replica'], 'REPLICA_LAG_CHECK_INTERVAL': 0}
+    lags = {'replica': 0.0}
+
+    def replica_lag(alias):
+        if lags[alias] is None:
+            raise DatabaseError("connection refused")
+        return lags[alias]
+
+    monkeypatch.setattr(routers, 'replica_lag', replica_lag)
+    router = routers.ReplicaRouter()
+
+    # Вне запроса (команды, фоновые потоки) чтение идет в default
+    assert router.db_for_read(Kitten) is None
+
+    state, token = routers.start(use_replica=True)
+    try:
+        assert router.db_for_read(Kitten) == 'replica'
+        assert router.db_for_read(User) is None
+
+        # Отстающая или недоступная реплика не используется
+        lags['replica'] = 60.0
+        assert router.db_for_read(Kitten) is None
+        lags['replica'] = None
+        assert router.db_for_read(Kitten) is None
+        lags['replica'] = 0.0
+        assert router.db_for_read(Kitten) == 'replica'
+
+        # После записи запрос читает собственные изменения из default
+        assert router.db_for_write(Rating) is None
+        assert state.wrote
+        assert router.db_for_read(Kitten) is None
+    finally:
+        routers.finish(token)
+
+
+@pytest.mark.django_db
+def test_replica_pin_cookie(settings):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Fluffy", age_in_months=2, owner=user, color="white", breed=breed)
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    # Без реплик cookie не ставится
+    settings.KITTENS = {**settings.KITTENS, 'REPLICAS': []}
+    client.post('/api/ratekitten', data={'kitten_id': kitten.id, 'rating_value': 5}, format='json')
+    assert routers.PIN_COOKIE not in client.cookies
+
+    # Реплики 'replica' нет в DATABASES: любое чтение с нее завершилось бы ошибкой
+    settings.KITTENS = {**settings.KITTENS, 'REPLICAS': ['replica']}
+    response = client.post('/api/ratekitten', data={'kitten_id': kitten.id, 'rating_value': 0}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert routers.PIN_COOKIE not in client.cookies
+
+    response = client.post('/api/ratekitten', data={'kitten_id': kitten.id, 'rating_value': 4}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert client.cookies[routers.PIN_COOKIE]['max-age'] == kitten_setting('REPLICA_PIN_SECONDS')
+
+    # С cookie клиент читает из default
+    response = client.get('/api/kittenlist')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data[0]['name'] == "Fluffy"
+
+
+# Отдельная БД-реплика (не MIRROR) есть только в settings.replica
+SEPARATE_REPLICA = (
+    'replica' in django_settings.DATABASES
+    and not django_settings.DATABASES['replica'].get('TEST', {}).get('MIRROR')
+)
+
+
+@pytest.mark.skipif(not SEPARATE_REPLICA, reason="нужна отдельная БД 'replica' (--ds=settings.replica)")
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_replica_routing(settings):
+    settings.KITTENS = {**settings.KITTENS, 'REPLICAS': ['replica'], 'REPLICA_LAG_CHECK_INTERVAL': 0}
+    # В реплике то же, что в default, но со старым именем котенка
+    for alias, name in (('default', "Fresh"), ('replica', "Stale")):
+        breed = Breed.objects.using(alias).create(name="Siamese")
+        user = User.objects.db_manager(alias).create_user(username="testuser", password="password")
+        kitten = Kitten.objects.using(alias).create(name=name, age_in_months=2, owner=user, color="white", breed=breed)
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    assert client.get('/api/kittenlist').data[0]['name'] == "Stale"
+    response = client.post('/api/kittendetail', data={'kitten_id': kitten.id}, format='json')
+    assert response.data['name'] == "Stale"
+
+    # Оценка записывается в default, после нее клиент читает из default
+    response = client.post('/api/ratekitten', data={'kitten_id': kitten.id, 'rating_value': 5}, format='json')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert Rating.objects.using('default').count() == 1
+    assert Rating.objects.using('replica').count() == 0
+    assert client.get('/api/kittenlist').data[0]['name'] == "Fresh"
+
+    # После истечения cookie чтение снова идет с реплики
+    del client.cookies[routers.PIN_COOKIE]
+    assert client.get('/api/kittenlist').data[0]['name'] == "Stale"
+
+
+@pytest.mark.django_db
+def test_kitten_by_breed_cursor_pagination():
+    breed = Breed.objects.create(name="Siamese")
+    other_breed = Breed.objects.create(name="Persian")
+    user = User.objects.create_user(username="testuser", password="password")
+    for i in range(3):
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        Kitten.objects.create(name=f"Other{i}", breed=other_breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    response = client.post('/api/kittenbybreed?page_size=2', data={'breed_id': breed.id}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [kitten['name'] for kitten in response.data] == ["Kitty0", "Kitty1"]
+
+    cursor = response.headers['X-Next-Cursor']
+    response = client.post(f'/api/kittenbybreed?page_size=2&cursor={cursor}', data={'breed_id': breed.id}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [kitten['name'] for kitten in response.data] == ["Kitty2"]
+    assert 'X-Next-Cursor' not in response.headers
+
+
+@pytest.mark.django_db
+def test_rating_aggregates_follow_ratings():
+    breed = Breed.objects.create(name="Siamese")
+    owner = User.objects.create_user(username="owner", password="password")
+    judge = User.objects.create_user(username="judge", password="password")
+    kitten = Kitten.objects.create(name="Fluffy", age_in_months=2, owner=owner, color="white", breed=breed)
+
+    client = APIClient()
+    client.force_authenticate(user=owner)
+    client.post('/api/ratekitten', data={"kitten_id": kitten.id, "rating_value": 5}, format='json')
+    client.force_authenticate(user=judge)
+    client.post('/api/ratekitten', data={"kitten_id": kitten.id, "rating_value": 3}, format='json')
+    client.post('/api/ratekitten', data={"kitten_id": kitten.id, "rating_value": 4}, format='json')
+
+    kitten.refresh_from_db()
+    assert kitten.rating_count == 2
+    assert kitten.rating_sum == 9
+    assert (kitten.rating_3_count, kitten.rating_4_count, kitten.rating_5_count) == (0, 1, 1)
+
+    judge.delete()
+
+    kitten.refresh_from_db()
+    assert kitten.rating_count == 1
+    assert kitten.rating_sum == 5
+    assert kitten.rating_4_count == 0
+
+    response = client.post('/api/kittendetail', data={'kitten_id': kitten.id}, format='json')
+    assert response.data['rating_count'] == 1
+    assert response.data['rating_5_count'] == 1
+
+
+@pytest.mark.django_db
+def test_rating_aggregates_follow_moved_rating():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="owner", password="password")
+    first = Kitten.objects.create(name="First", age_in_months=2, owner=user, color="white", breed=breed)
+    second = Kitten.objects.create(name="Second", age_in_months=2, owner=user, color="white", breed=breed)
+    Rating.objects.create(kitten=first, user=user, rating=4)
+
+    rating = Rating.objects.get()
+    rating.kitten = second
+    rating.rating = 2
+    rating.save()
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.rating_count, first.rating_sum, first.rating_4_count) == (0, 0, 0)
+    assert (second.rating_count, second.rating_sum, second.rating_2_count) == (1, 2, 1)
+    assert not aggregates.drifted_kittens().exists()
+
+
+@pytest.mark.django_db
+def test_rating_aggregates_are_read_only():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty1", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.put('/api/kittenmanage', data={"kitten_id": kitten.id, "rating_count": 100}, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['rating_count'] == 0
+
+
+@pytest.mark.django_db
+def test_rebuild_rating_aggregates_command():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty1", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    Rating.objects.create(kitten=kitten, user=user, rating=2)
+    Kitten.objects.filter(id=kitten.id).update(rating_count=7, rating_2_count=0)
+
+    with pytest.raises(CommandError):
+        call_command('rebuild_rating_aggregates', '--check', stdout=StringIO())
+
+    call_command('rebuild_rating_aggregates', stdout=StringIO())
+
+    kitten.refresh_from_db()
+    assert kitten.rating_count == 1
+    assert kitten.rating_2_count == 1
+    call_command('rebuild_rating_aggregates', '--check', stdout=StringIO())
+
+
+def test_leaderboard_scores_are_bayesian():
+    kitten_ids = np.array([1, 1, 1, 1, 2, 3, 3])
+    values = np.array([5, 5, 5, 5, 5, 1, 2])
+
+    ids, counts, averages, scores = leaderboard.compute_scores(kitten_ids, values, prior_weight=2)
+
+    assert ids.tolist() == [1, 2, 3]
+    assert counts.tolist() == [4, 1, 2]
+    assert averages.tolist() == [5.0, 5.0, 1.5]
+    # Одна пятерка весит меньше, чем четыре
+    assert scores[0] > scores[1] > scores[2]
+
+
+@pytest.mark.django_db
+def test_leaderboard_overall_and_by_breed():
+    siamese = Breed.objects.create(name="Siamese")
+    persian = Breed.objects.create(name="Persian")
+    owner = User.objects.create_user(username="owner", password="password")
+    judges = [User.objects.create_user(username=f"judge{i}", password="password") for i in range(3)]
+    best = Kitten.objects.create(name="Best", age_in_months=2, owner=owner, color="white", breed=siamese)
+    lucky = Kitten.objects.create(name="Lucky", age_in_months=2, owner=owner, color="white", breed=siamese)
+    fluffy = Kitten.objects.create(name="Fluffy", age_in_months=2, owner=owner, color="white", breed=persian)
+    for judge in judges:
+        Rating.objects.create(kitten=best, user=judge, rating=5)
+        Rating.objects.create(kitten=fluffy, user=judge, rating=3)
+    Rating.objects.create(kitten=lucky, user=judges[0], rating=5)
+
+    call_command('recompute_leaderboard', stdout=StringIO())
+
+    client = APIClient()
+    response = client.get('/api/leaderboard')
+    assert response.status_code == status.HTTP_200_OK
+    assert [entry['name'] for entry in response.data] == ["Best", "Lucky", "Fluffy"]
+    assert response.data[0]['position'] == 1
+    assert response.data[0]['rating_count'] == 3
+
+    response = client.get('/api/leaderboard', {'breed_id': persian.id})
+    assert [(entry['position'], entry['name']) for entry in response.data] == [(1, "Fluffy")]
+
+    response = client.get('/api/leaderboard', {'limit': 1})
+    assert [entry['name'] for entry in response.data] == ["Best"]
+
+
+@pytest.mark.django_db
+def test_rate_kitten_batch():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kittens = [
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(3)
+    ]
+    Rating.objects.create(kitten=kittens[1], user=user, rating=1)
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    payload = [
+        {"kitten_id": kittens[0].id, "rating_value": 5},
+        {"kitten_id": kittens[1].id, "rating_value": 4},
+        {"kitten_id": 9999, "rating_value": 3},
+        {"kitten_id": kittens[2].id, "rating_value": 10},
+        {"rating_value": 2},
+        {"kitten_id": kittens[2].id, "rating_value": True},
+    ]
+    response = client.post('/api/ratekitten/batch', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item['status'] for item in response.data] == ["created", "updated", "error", "error", "error", "error"]
+    assert response.data[2]['error'] == "Котёнок не найден."
+    assert response.data[3]['error'] == "Оценка должна быть в пределах от 1 до 5"
+    assert response.data[4]['error'] == "Необходим параметр 'kitten_id'"
+    # true в JSON - не оценка 1
+    assert response.data[5]['error'] == "Оценка должна быть в пределах от 1 до 5"
+
+    assert Rating.objects.get(kitten=kittens[0], user=user).rating == 5
+    assert Rating.objects.get(kitten=kittens[1], user=user).rating == 4
+    assert not Rating.objects.filter(kitten=kittens[2]).exists()
+
+    kittens[1].refresh_from_db()
+    assert (kittens[1].rating_count, kittens[1].rating_sum) == (1, 4)
+    assert (kittens[1].rating_1_count, kittens[1].rating_4_count) == (0, 1)
+
+
+@pytest.mark.django_db
+def test_rate_kitten_batch_constant_queries(django_assert_max_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kittens = Kitten.objects.bulk_create([
+        Kitten(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(200)
+    ])
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    payload = [{"kitten_id": kitten.id, "rating_value": 1 + kitten.id % 5} for kitten in kittens]
+    with django_assert_max_num_queries(6):
+        response = client.post('/api/ratekitten/batch', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert Rating.objects.count() == 200
+    assert sum(Kitten.objects.values_list('rating_count', flat=True)) == 200
+
+
+@pytest.mark.django_db
+def test_rate_kitten_batch_rechecks_kittens_after_integrity_error(monkeypatch):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kittens = [
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(2)
+    ]
+
+    upsert = ratings._bulk_upsert_fallback
+    calls = []
+
+    def deleted_during_write(items, batch_size):
+        # Котёнка удалили параллельно после проверки (на SQLite нарушение внешнего ключа
+        # обнаруживается при фиксации): транзакция откатывается, и пачка проверяется заново
+        calls.append(items)
+        if len(calls) == 1:
+            raise IntegrityError("FOREIGN KEY constraint failed")
+        return upsert(items, batch_size)
+
+    monkeypatch.setattr(ratings, '_bulk_upsert_fallback', deleted_during_write)
+    client = APIClient()
+    client.force_authenticate(user=user)
+    payload = [{"kitten_id": kitten.id, "rating_value": 5} for kitten in kittens]
+    response = client.post('/api/ratekitten/batch', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item['status'] for item in response.data] == ["created", "created"]
+    assert len(calls) == 2
+    assert Rating.objects.count() == 2
+
+
+def test_rating_upsert_reads_previous_values_under_lock():
+    # Подзапрос в RETURNING видит снимок начала оператора и после ожидания
+    # параллельной транзакции вернул бы устаревшую оценку
+    assert 'previous' not in ratings.UPSERT_RATING_SQL
+    assert 'previous' not in ratings.BULK_UPSERT_RATINGS_SQL
+    assert 'FOR UPDATE' in ratings.LOCK_RATINGS_SQL
+
+    class Cursor:
+        def execute(self, sql, params):
+            self.sql, self.params = sql, params
+
+        def fetchall(self):
+            return [(1, 2, 3)]
+
+    cursor = Cursor()
+    assert ratings.lock_previous_ratings(cursor, [(1, 2), (4, 5)]) == {(1, 2): 3}
+    assert 'IN ((%s, %s), (%s, %s))' in cursor.sql
+    assert cursor.params == [1, 2, 4, 5]
+
+
+@pytest.mark.django_db
+def test_rate_kitten_batch_requires_list():
+    user = User.objects.create_user(username="testuser", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.post('/api/ratekitten/batch', data={"kitten_id": 1, "rating_value": 5}, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["error"] == "Ожидается список оценок"
+
+
+@pytest.mark.django_db
+def test_bulk_create_kittens(django_assert_max_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    payload = [
+        {"name": f"Kitty{i}", "breed": breed.id, "age_in_months": 2, "color": "red", "description": "Cute kitten"}
+        for i in range(50)
+    ]
+    with django_assert_max_num_queries(5):
+        response = client.post('/api/kittenmanage', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(response.data) == 50
+    assert response.data[0]['owner'] == user.id
+    assert Kitten.objects.filter(owner=user).count() == 50
+
+
+@pytest.mark.django_db
+def test_bulk_create_kittens_reports_errors_per_item():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    payload = [
+        {"name": "Kitty1", "breed": breed.id, "age_in_months": 2, "color": "red", "description": "Cute kitten"},
+        {"name": "", "breed": breed.id, "age_in_months": 2, "color": "red", "description": "Cute kitten"},
+        {"name": "Kitty3", "breed": breed.id + 100, "age_in_months": 2, "color": "red", "description": "Cute kitten"},
+    ]
+    response = client.post('/api/kittenmanage', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data[0] == {}
+    assert 'name' in response.data[1]
+    assert 'breed' in response.data[2]
+    assert Kitten.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_bulk_update_kittens(django_assert_max_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kittens = Kitten.objects.bulk_create([
+        Kitten(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(30)
+    ])
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    payload = [{"kitten_id": kitten.id, "name": f"Updated{kitten.id}", "age_in_months": 5} for kitten in kittens]
+    with django_assert_max_num_queries(6):
+        response = client.put('/api/kittenmanage', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data[0]['name'] == f"Updated{kittens[0].id}"
+    assert set(Kitten.objects.values_list('age_in_months', flat=True)) == {5}
+
+
+@pytest.mark.django_db
+def test_bulk_update_kittens_is_owner_scoped():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    stranger = User.objects.create_user(username="stranger", password="password")
+    own = Kitten.objects.create(name="Own", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    foreign = Kitten.objects.create(name="Foreign", breed=breed, age_in_months=2, owner=stranger, color="red", description="description")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    payload = [{"kitten_id": own.id, "name": "Changed"}, {"kitten_id": foreign.id, "name": "Changed"}]
+    response = client.put('/api/kittenmanage', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data[0] == {}
+    assert response.data[1] == {"kitten_id": ["Котёнок не найден."]}
+    assert set(Kitten.objects.values_list('name', flat=True)) == {"Own", "Foreign"}
+
+
+@pytest.mark.django_db
+def test_bulk_manage_kittens_validates_kitten_ids():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    payload = [
+        {"kitten_id": kitten.id, "name": "First"},
+        {"kitten_id": kitten.id, "name": "Second"},
+        {"kitten_id": str(kitten.id), "name": "Third"},
+        {"kitten_id": True, "name": "Fourth"},
+    ]
+    response = client.put('/api/kittenmanage', data=payload, format='json')
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data[0] == {}
+    assert response.data[1] == {"kitten_id": ["Котёнок указан в пакете несколько раз."]}
+    assert response.data[2] == {"kitten_id": ["Некорректный параметр 'kitten_id'"]}
+    assert response.data[3] == {"kitten_id": ["Некорректный параметр 'kitten_id'"]}
+    kitten.refresh_from_db()
+    assert kitten.name == "Kitty"
+
+    response = client.delete('/api/kittenmanage', data=[{"kitten_id": kitten.id}, {"kitten_id": kitten.id}], format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Kitten.objects.filter(id=kitten.id).exists()
+
+    for method in (client.post, client.put, client.delete):
+        response = method('/api/kittenmanage', data=[], format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["error"] == "Ожидается непустой список котят"
+
+
+@pytest.mark.django_db
+def test_bulk_delete_kittens(django_assert_max_num_queries):
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kittens = Kitten.objects.bulk_create([
+        Kitten(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(30)
+    ])
+    for kitten in kittens[:10]:
+        Rating.objects.create(kitten=kitten, user=user, rating=4)
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    with django_assert_max_num_queries(10):
+        response = client.delete('/api/kittenmanage', data=[{"kitten_id": kitten.id} for kitten in kittens[:20]], format='json')
+
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert Kitten.objects.count() == 10
+    assert Rating.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_breed_list_etag(django_assert_num_queries):
+    Breed.objects.create(name="Siamese")
+
+    client = APIClient()
+    response = client.get('/api/breedlist')
+    etag = response.headers['ETag']
+
+    with django_assert_num_queries(0):
+        response = client.get('/api/breedlist')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['ETag'] == etag
+
+        response = client.get('/api/breedlist', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    Breed.objects.create(name="Persian")
+
+    response = client.get('/api/breedlist', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['ETag'] != etag
+    assert [breed['name'] for breed in response.data] == ["Siamese", "Persian"]
+
+
+@pytest.mark.django_db
+def test_kitten_catalog_filters_and_facets(django_assert_num_queries):
+    siamese = Breed.objects.create(name="Siamese")
+    persian = Breed.objects.create(name="Persian")
+    sphynx = Breed.objects.create(name="Sphynx")
+    owner = User.objects.create_user(username="owner", password="password")
+    other = User.objects.create_user(username="other", password="password")
+    kittens = {
+        name: Kitten.objects.create(name=name, breed=breed, age_in_months=age, owner=user, color=color, description="description")
+        for name, breed, age, user, color in [
+            ("Alpha", siamese, 2, owner, "white"),
+            ("Bravo", siamese, 10, owner, "black"),
+            ("Charlie", persian, 5, other, "white"),
+            ("Delta", persian, 30, owner, "white"),
+            ("Echo", sphynx, 4, owner, "white"),
+        ]
+    }
+    Rating.objects.create(kitten=kittens["Alpha"], user=other, rating=3)
+    Rating.objects.create(kitten=kittens["Charlie"], user=owner, rating=5)
+    Rating.objects.create(kitten=kittens["Charlie"], user=other, rating=4)
+
+    client = APIClient()
+    with django_assert_num_queries(2):
+        response = client.get('/api/kittens', {'breed': f'{siamese.id},{persian.id}', 'age_max': 12, 'ordering': '-rating'})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [kitten['name'] for kitten in response.data['results']] == ["Charlie", "Alpha", "Bravo"]
+    assert response.data['results'][0]['rating_average'] == 4.5
+    assert response.data['facets'] == {
+        'breed': [{'id': siamese.id, 'count': 2}, {'id': persian.id, 'count': 1}],
+        'color': [{'value': "white", 'count': 2}, {'value': "black", 'count': 1}],
+    }
+
+    response = client.get('/api/kittens', {'color': "white", 'owner': owner.id, 'age_min': 3, 'ordering': 'name'})
+    assert [kitten['name'] for kitten in response.data['results']] == ["Delta", "Echo"]
+
+    response = client.get('/api/kittens', {'min_rating': 4})
+    assert [kitten['name'] for kitten in response.data['results']] == ["Charlie"]
+
+    response = client.get('/api/kittens', {'ordering': 'weight'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.get('/api/kittens', {'breed': 'abc'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_kitten_catalog_cursor_pagination():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    Kitten.objects.bulk_create([
+        Kitten(name=f"Kitty{i % 3}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(7)
+    ])
+
+    client = APIClient()
+    seen, cursor, facets = [], None, []
+    while True:
+        params = {'ordering': '-name', 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+        response = client.get('/api/kittens', params)
+        seen.extend((kitten['name'], kitten['id']) for kitten in response.data['results'])
+        facets.append(response.data['facets'])
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+
+    assert seen == sorted(Kitten.objects.values_list('name', 'id'), reverse=True)
+    assert facets[0] == {'breed': [{'id': breed.id, 'count': 7}], 'color': [{'value': "red", 'count': 7}]}
+    assert facets[1:] == [None] * 3
+
+
+@pytest.mark.django_db
+def test_kitten_export_streams_ndjson():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    for i in range(3):
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    response = client.get('/api/kittens/export')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    # Под WSGI строки отдаются синхронным генератором
+    assert not response.is_async
+    assert response['Content-Type'] == 'application/x-ndjson'
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    kittens = [json.loads(line) for line in lines]
+    assert [kitten['name'] for kitten in kittens] == ["Kitty0", "Kitty1", "Kitty2"]
+    assert kittens[0]['breed_name'] == "Siamese"
+    assert kittens[0]['owner_username'] == "testuser"
+    assert kittens[0]['description'] == "description"
+
+
+@pytest.mark.django_db
+def test_kitten_export_streams_under_asgi(settings):
+    settings.KITTENS = {**settings.KITTENS, 'EXPORT_CHUNK_SIZE': 2}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    for i in range(3):
+        Kitten.objects.create(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    async def export():
+        response = await AsyncClient().get('/api/kittens/export')
+        return response, [chunk async for chunk in response.streaming_content]
+
+    response, chunks = async_to_sync(export)()
+
+    # Асинхронный итератор отдается Django без предварительного сбора в список
+    assert response.is_async
+    assert [len(chunk.splitlines()) for chunk in chunks] == [2, 1]
+    assert [json.loads(line)['name'] for line in b''.join(chunks).splitlines()] == ["Kitty0", "Kitty1", "Kitty2"]
+
+
+@pytest.mark.django_db
+def test_kitten_search():
+    siamese = Breed.objects.create(name="Сиамская")
+    persian = Breed.objects.create(name="Персидская")
+    user = User.objects.create_user(username="testuser", password="password")
+    ginger = Kitten.objects.create(name="Рыжик", breed=persian, age_in_months=2, owner=user, color="Рыжий", description="Спокойный")
+    described = Kitten.objects.create(name="Барсик", breed=persian, age_in_months=2, owner=user, color="Белый", description="Рыжеватый хвост")
+    siamese_kitten = Kitten.objects.create(name="Мурка", breed=siamese, age_in_months=2, owner=user, color="Белый", description="Игривая")
+
+    client = APIClient()
+    response = client.get('/api/kittens/search', {'q': "рыж"})
+
+    assert response.status_code == status.HTTP_200_OK
+    # Совпадение в имени весит больше, чем в описании
+    assert [kitten['id'] for kitten in response.data] == [ginger.id, described.id]
+    assert set(response.data[0]) == {'id', 'name', 'breed', 'owner', 'score'}
+
+    response = client.get('/api/kittens/search', {'q': "сиамская"})
+    assert [kitten['id'] for kitten in response.data] == [siamese_kitten.id]
+
+    response = client.get('/api/kittens/search', {'q': "белый игривая"})
+    assert [kitten['id'] for kitten in response.data] == [siamese_kitten.id]
+
+    response = client.get('/api/kittens/search', {'q': "  "})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_kitten_search_index_follows_writes():
+    breed = Breed.objects.create(name="Сиамская")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Мурка", breed=breed, age_in_months=2, owner=user, color="Белый", description="Игривая")
+    client = APIClient()
+
+    def found(q):
+        return [kitten['id'] for kitten in client.get('/api/kittens/search', {'q': q}).data]
+
+    Kitten.objects.filter(id=kitten.id).update(name="Снежок")
+    assert found("мурка") == []
+    assert found("снежок") == [kitten.id]
+
+    breed.name = "Бирманская"
+    breed.save()
+    assert found("сиамская") == []
+    assert found("бирманская") == [kitten.id]
+
+    kitten.delete()
+    assert found("снежок") == []
+
+
+@pytest.mark.django_db
+def test_kitten_search_cursor_pagination():
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    Kitten.objects.bulk_create([
+        Kitten(name=f"Kitty{i}", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+        for i in range(5)
+    ])
+
+    client = APIClient()
+    seen, cursor = [], None
+    while True:
+        params = {'q': "siamese", 'page_size': 2, **({'cursor': cursor} if cursor else {})}
+        response = client.get('/api/kittens/search', params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(kitten['id'] for kitten in response.data)
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+
+    assert seen == sorted(Kitten.objects.values_list('id', flat=True), reverse=True)
+
+
+@pytest.mark.django_db
+def test_import_catalog(tmp_path):
+    User.objects.create_user(username="owner", password="password")
+    User.objects.create_user(username="judge", password="password")
+
+    breeds = tmp_path / "breeds.csv"
+    breeds.write_text("name\nSiamese\nPersian\n", encoding='utf-8')
+    call_command('import_catalog', 'breeds', str(breeds), stdout=StringIO())
+
+    kittens = tmp_path / "kittens.ndjson"
+    kittens.write_text("\n".join(json.dumps(row) for row in [
+        {"name": "Kitty1", "color": "red", "age_in_months": 2, "description": "", "breed": "Siamese", "owner": "owner"},
+        {"name": "Kitty2", "color": "red", "age_in_months": 3, "description": "", "breed": "Persian", "owner": "owner"},
+        {"name": "Lost", "color": "red", "age_in_months": 3, "description": "", "breed": "Sphynx", "owner": "owner"},
+    ]), encoding='utf-8')
+    call_command('import_catalog', 'kittens', str(kittens), '--batch-size', '2', stdout=StringIO(), stderr=StringIO())
+
+    assert sorted(Kitten.objects.values_list('name', 'breed__name')) == [("Kitty1", "Siamese"), ("Kitty2", "Persian")]
+
+    kitten = Kitten.objects.get(name="Kitty1")
+    ratings = tmp_path / "ratings.csv"
+    ratings.write_text(f"kitten_id,username,rating\n{kitten.id},owner,5\n{kitten.id},judge,3\n", encoding='utf-8')
+    call_command('import_catalog', 'ratings', str(ratings), stdout=StringIO())
+
+    kitten.refresh_from_db()
+    assert (kitten.rating_count, kitten.rating_sum) == (2, 8)
+    assert not ImportCheckpoint.objects.exists()
+
+    # Повторные оценки - уже загруженные и внутри файла - пропускаются, не прерывая пачку
+    other = Kitten.objects.get(name="Kitty2")
+    ratings.write_text(
+        f"kitten_id,username,rating\n{kitten.id},owner,1\n{other.id},judge,4\n{other.id},judge,2\n", encoding='utf-8'
+    )
+    out = StringIO()
+    call_command('import_catalog', 'ratings', str(ratings), stdout=out, stderr=StringIO())
+    assert "загружено 1, пропущено 2 строк" in out.getvalue()
+    kitten.refresh_from_db()
+    other.refresh_from_db()
+    assert (kitten.rating_count, kitten.rating_sum) == (2, 8)
+    assert (other.rating_count, other.rating_sum) == (1, 4)
+
+
+def test_import_catalog_copy_sql():
+    command = import_catalog.Command()
+    assert command.copy_sql('kittens') == (
+        "COPY kittens_kitten (name, color, age_in_months, description, breed_id, owner_id, "
+        "rating_count, rating_sum, rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count) "
+        "FROM STDIN WITH (FORMAT csv)"
+    )
+    assert command.copy_sql('ratings', import_catalog.RATINGS_STAGING_TABLE) == (
+        "COPY import_ratings (kitten_id, user_id, rating) FROM STDIN WITH (FORMAT csv)"
+    )
+    assert 'ON CONFLICT (kitten_id, user_id) DO NOTHING' in import_catalog.INSERT_RATINGS_SQL
+
+    # Пустое описание передается как '' в кавычках, а не как NULL
+    row = ("Kitty", "red", 2, "", 1, 1, *(0 for _ in range(7)))
+    assert command.copy_buffer([row]).getvalue() == '"Kitty","red","2","","1","1","0","0","0","0","0","0","0"\r\n'
+
+
+@pytest.mark.django_db
+def test_import_catalog_resumes_from_checkpoint(tmp_path):
+    breeds = tmp_path / "breeds.csv"
+    breeds.write_text("name\nSiamese\nPersian\nSphynx\n", encoding='utf-8')
+    ImportCheckpoint.objects.create(path=str(breeds), kind='breeds', rows=2)
+
+    with pytest.raises(CommandError):
+        call_command('import_catalog', 'kittens', str(breeds), stdout=StringIO())
+    call_command('import_catalog', 'breeds', str(breeds), stdout=StringIO())
+
+    assert list(Breed.objects.values_list('name', flat=True)) == ["Sphynx"]
+    assert not ImportCheckpoint.objects.exists()
+
+
+@pytest.mark.django_db
+def test_import_catalog_checkpoint_commits_with_batch(tmp_path, monkeypatch):
+    User.objects.create_user(username="owner", password="password")
+    Breed.objects.create(name="Siamese")
+    kittens = tmp_path / "kittens.ndjson"
+    kittens.write_text("\n".join(
+        json.dumps({"name": f"Kitty{i}", "color": "red", "age_in_months": 2, "breed": "Siamese", "owner": "owner"})
+        for i in range(3)
+    ), encoding='utf-8')
+
+    after_batch = import_catalog.Command.after_batch
+    calls = []
+
+    def crash_on_second_batch(self, kind, values):
+        calls.append(kind)
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        after_batch(self, kind, values)
+
+    monkeypatch.setattr(import_catalog.Command, 'after_batch', crash_on_second_batch)
+    with pytest.raises(RuntimeError):
+        call_command('import_catalog', 'kittens', str(kittens), '--batch-size', '1', stdout=StringIO())
+    # Контрольная точка зафиксирована вместе с первой пачкой, вторая откатилась целиком
+    assert Kitten.objects.count() == 1
+    assert ImportCheckpoint.objects.get().rows == 1
+
+    monkeypatch.setattr(import_catalog.Command, 'after_batch', after_batch)
+    call_command('import_catalog', 'kittens', str(kittens), '--batch-size', '1', stdout=StringIO())
+    assert sorted(Kitten.objects.values_list('name', flat=True)) == ["Kitty0", "Kitty1", "Kitty2"]
+
+
+@pytest.mark.django_db
+def test_import_catalog_skips_malformed_lines(tmp_path):
+    User.objects.create_user(username="owner", password="password")
+    Breed.objects.create(name="Siamese")
+    kittens = tmp_path / "kittens.ndjson"
+    kittens.write_text("\n".join([
+        '{"name": "Broken",',
+        '[1]',
+        '"x"',
+        '{"name": "Kitty", "color": "red", "age_in_months": 2, "breed": ["Siamese"], "owner": "owner"}',
+        json.dumps({"name": "Kitty", "color": "red", "age_in_months": 2, "breed": "Siamese", "owner": "owner"}),
+    ]), encoding='utf-8')
+
+    out, err = StringIO(), StringIO()
+    call_command('import_catalog', 'kittens', str(kittens), stdout=out, stderr=err)
+
+    assert "загружено 1, пропущено 4 строк" in out.getvalue()
+    assert "Строка 1 пропущена: некорректный JSON" in err.getvalue()
+    assert "Строка 2 пропущена: ожидается объект" in err.getvalue()
+    assert "Строка 3 пропущена: ожидается объект" in err.getvalue()
+    assert list(Kitten.objects.values_list('name', flat=True)) == ["Kitty"]
+
+
+def test_benchmark_cases_cover_all_urls():
+    assert set(benchmarks.url_names()) == set(benchmarks.CASES)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_endpoints(tmp_path):
+    call_command(
+        'seed_synthetic', '--breeds', '3', '--users', '5', '--kittens', '30', '--ratings', '100', stdout=StringIO(),
+    )
+    output = tmp_path / "bench.json"
+    call_command(
+        'benchmark_endpoints', '--requests', '2', '--warmup', '0',
+        '--only', 'breedlist', 'kittenlist', 'ratekitten', '--output', str(output), stdout=StringIO(),
+    )
+
+    report = json.loads(output.read_text(encoding='utf-8'))
+    assert report['rows']['kittens'] == 30
+    assert set(report['results']) == {'breedlist', 'kittenlist', 'ratekitten'}
+    for result in report['results'].values():
+        assert result['requests'] == 2
+        assert set(result['status_codes']) <= {"200", "201"}
+
+
+class QueryRecorder:
+    """
+    Записывает SQL-запросы вместе со стеком вызова, в котором они выполнены.
+    Управляющие транзакциями команды (BEGIN, SAVEPOINT и т.п.) не учитываются:
+    в тестах внешний `atomic` превращается в точку сохранения.
+    """
+    TRANSACTION_COMMANDS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+    def __init__(self):
+        self.queries = []
+        self.params = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(self.TRANSACTION_COMMANDS):
+            stack = [frame for frame in traceback.extract_stack()[:-1] if 'site-packages' not in frame.filename]
+            self.queries.append((sql, ''.join(traceback.format_list(stack))))
+            # Для executemany план строится по первому набору параметров
+            self.params.append(next(iter(params), None) if many else params)
+        return execute(sql, params, many, context)
+
+    def report(self):
+        return "\n\n".join(
+            f"{number}. {sql}\n{stack}" for number, (sql, stack) in enumerate(self.queries, start=1)
+        )
+
+
+def query_budget_requests(user, rows):
+    """Запросы к представлениям kittens/views.py: имя URL -> список (метод, данные, нужна ли авторизация)."""
+    kitten_ids = list(Kitten.objects.filter(owner=user).order_by('id').values_list('id', flat=True))
+    breed_id = Breed.objects.order_by('id').values_list('id', flat=True).first()
+    batch = min(rows, 100)
+    disposable_ids = [
+        kitten.id for kitten in Kitten.objects.bulk_create([
+            Kitten(name="Удаляемый", color="Белый", age_in_months=2, owner=user, breed_id=breed_id)
+            for _ in range(batch + 1)
+        ])
+    ]
+
+    def new_kitten(number):
+        return {"name": f"Кот{number}", "color": "Белый", "age_in_months": 2, "description": "Описание", "breed": breed_id}
+
+    return {
+        'register': [('post', {"username": "newuser", "password": "password"}, False)],
+        'breedlist': [('get', None, False)],
+        'kittenlist': [('get', None, False)],
+        'kittenbybreed': [('post', {"breed_id": breed_id}, False)],
+        'kittencatalog': [
+            ('get', None, False),
+            ('get', {"breed": breed_id, "min_rating": 1, "ordering": "-rating"}, False),
+            ('get', {"color": "Белый", "age_min": 1, "ordering": "name"}, False),
+        ],
+        'kittenexport': [('get', None, False)],
+        'kittensearch': [('get', {"q": "Кот1"}, False)],
+        'kittendetail': [
+            ('post', {"kitten_id": kitten_ids[0]}, False),
+            ('post', {"kitten_ids": kitten_ids[:batch]}, False),
+        ],
+        'mykittens': [
+            ('get', None, True),
+            ('get', {"page_size": 10, "cursor": encode_cursor([kitten_ids[rows // 2]])}, True),
+        ],
+        'leaderboard': [('get', None, False)],
+        'kittenmanage': [
+            ('post', new_kitten(0), True),
+            ('post', [new_kitten(number) for number in range(batch)], True),
+            ('put', {"kitten_id": kitten_ids[0], "age_in_months": 3}, True),
+            ('put', [{"kitten_id": kitten_id, "age_in_months": 4} for kitten_id in kitten_ids[:batch]], True),
+            ('delete', {"kitten_id": disposable_ids[0]}, True),
+            ('delete', [{"kitten_id": kitten_id} for kitten_id in disposable_ids[1:]], True),
+        ],
+        'ratekitten': [
+            ('post', {"kitten_id": kitten_ids[0], "rating_value": 4}, True),
+            ('post', {"kitten_id": kitten_ids[0], "rating_value": 5}, True),
+        ],
+        'ratekittenbatch': [
+            ('post', [{"kitten_id": kitten_id, "rating_value": 3} for kitten_id in kitten_ids[:batch]], True),
+        ],
+    }
+
+
+def seed_query_scenarios(rows):
+    """Данные для сценариев query_budget_requests: `rows` пород, котят и оценок. Возвращает владельца котят."""
+    user = User.objects.create_user(username="owner", password="password")
+    breeds = Breed.objects.bulk_create([Breed(name=f"Порода{number}") for number in range(rows)])
+    kittens = Kitten.objects.bulk_create([
+        Kitten(name=f"Кот{number}", color="Белый", age_in_months=2, owner=user, breed=breeds[0])
+        for number in range(rows)
+    ])
+    Rating.objects.bulk_create([Rating(kitten=kitten, user=user, rating=5) for kitten in kittens])
+    Kitten.objects.update(rating_count=1, rating_sum=5, rating_5_count=1)
+    leaderboard.recompute()
+    cache.bump_breed_list_version()
+    return user
+
+
+def run_query_scenarios(user, rows):
+    """Выполняет сценарии query_budget_requests; для каждого запроса возвращает (описание, представление, QueryRecorder)."""
+    client = APIClient()
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    requests = query_budget_requests(user, rows)
+    assert set(requests) == {
+        pattern.name for pattern in urls.urlpatterns if pattern.callback.view_class.__module__ == 'kittens.views'
+    }
+
+    for name, calls in requests.items():
+        path = reverse(name)
+        view_class = resolve(path).func.view_class
+        for method, data, needs_auth in calls:
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                response = getattr(client, method)(path, data=data, format='json', **(auth if needs_auth else {}))
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+            assert response.status_code < 400, (name, method, response.status_code)
+            yield f"{method.upper()} {path}", view_class, recorder
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('rows', [1, 100, 10000])
+def test_query_budgets(rows):
+    user = seed_query_scenarios(rows)
+
+    failures = []
+    for request, view_class, recorder in run_query_scenarios(user, rows):
+        if len(recorder.queries) > view_class.query_budget:
+            failures.append(
+                f"{request}: {len(recorder.queries)} запросов при бюджете {view_class.query_budget} "
+                f"({rows} строк)\n{recorder.report()}"
+            )
+
+    assert not failures, "\n\n".join(failures)
+
+
+# Таблицы, которые растут вместе с каталогом: полный просмотр любой из них - регрессия плана
+LARGE_TABLES = {'kittens_kitten', 'kittens_rating', 'kittens_leaderboardentry', 'auth_user'}
+
+
+def postgresql_plan(sql, params):
+    """Строки плана EXPLAIN при `enable_seqscan = off`."""
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def sequential_scans(sql, params):
+    """
+    Большие таблицы, которые запрос читает целиком, по плану EXPLAIN.
+
+    SQLite: `SCAN <таблица>` без покрывающего индекса, кроме просмотра в порядке
+    индекса, который останавливает LIMIT (без сортировки во временном B-дереве).
+    PostgreSQL: узлы `Seq Scan` при `enable_seqscan = off`, то есть когда
+    подходящего индекса нет, а не когда планировщик предпочел полный просмотр
+    маленькой тестовой таблицы.
+    """
+    if connection.vendor == 'postgresql':
+        plan = postgresql_plan(sql, params)
+        return {match.group(1) for line in plan for match in re.finditer(r'Seq Scan on (\w+)', line)} & LARGE_TABLES
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        plan = [row[-1] for row in cursor.fetchall()]
+
+    bounded = re.search(r'\bLIMIT\b', sql) and not any('TEMP B-TREE' in line for line in plan)
+    scans = set()
+    for line in plan:
+        match = re.match(r'SCAN (\w+)(?: AS \w+)?( USING COVERING INDEX)?', line)
+        if match and not match.group(2) and not bounded:
+            scans.add(match.group(1))
+    return scans & LARGE_TABLES
+
+
+@pytest.mark.django_db
+def test_query_plans():
+    # Без ANALYZE планировщик SQLite считает таблицы большими и берет индекс, если он подходит
+    rows = 1000
+    user = seed_query_scenarios(rows)
+
+    failures = []
+    for request, view_class, recorder in run_query_scenarios(user, rows):
+        allowed = set(getattr(view_class, 'full_scans', ()))
+        for (sql, stack), params in zip(recorder.queries, recorder.params):
+            scans = sequential_scans(sql, params) - allowed
+            if scans:
+                failures.append(f"{request}: полный просмотр {', '.join(sorted(scans))}\n{sql}\n{stack}")
+
+    assert not failures, "\n\n".join(failures)
+
+    if connection.vendor == 'postgresql':
+        # Каждая ветвь поиска (слово, опечатка в имени, опечатка в породе) идет по своему индексу
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            search.search("Кот1")
+        plan = '\n'.join(postgresql_plan(recorder.queries[0][0], recorder.params[0]))
+        for index in ('kitten_search_vector_idx', 'kitten_name_trgm_idx', 'breed_name_trgm_idx'):
+            assert index in plan, plan
+        assert not re.search(r'Seq Scan on kittens_(kitten|breed)\b', plan), plan
+
+
+@pytest.mark.django_db
+def test_server_timing(settings, caplog):
+    settings.KITTENS = {**settings.KITTENS, 'SERVER_TIMING_SAMPLE_RATE': 1.0}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty1", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+
+    client = APIClient()
+    response = client.get('/api/kittenlist')
+
+    metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+    assert {'db', 'serialize', 'render', 'queries', 'total'} <= set(metrics)
+    assert metrics['queries'] == 'queries;desc="1"'
+
+    caplog.set_level('INFO', logger='kittens.timing')
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+    response = client.post('/api/ratekitten', data={"kitten_id": kitten.id, "rating_value": 5}, format='json', **auth)
+
+    assert 'auth;dur=' in response['Server-Timing']
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['path'] == '/api/ratekitten'
+    assert record['status'] == status.HTTP_201_CREATED
+    assert record['db_queries'] >= 1
+
+
+@pytest.mark.django_db
+def test_server_timing_disabled(settings):
+    settings.KITTENS = {**settings.KITTENS, 'SERVER_TIMING_SAMPLE_RATE': 0}
+
+    response = APIClient().get('/api/kittenlist')
+
+    assert 'Server-Timing' not in response
+
+
+def metric_value(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+@pytest.mark.django_db
+def test_metrics():
+    client = APIClient()
+    requests_total = 'kittens_http_requests_total{view="KittenListAPIView",method="GET",status="200"}'
+    before = metric_value(client.get('/metrics').content.decode(), requests_total)
+
+    client.get('/api/kittenlist')
+    client.get('/api/kittenlist')
+    response = client.get('/metrics')
+    text = response.content.decode()
+
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert metric_value(text, requests_total) == before + 2
+    assert '# TYPE kittens_http_request_duration_seconds histogram' in text
+    assert metric_value(
+        text, 'kittens_http_request_duration_seconds_count{view="KittenListAPIView",method="GET",status="200"}'
+    ) == before + 2
+    assert 'kittens_http_request_db_queries_bucket{view="KittenListAPIView",method="GET",status="200",le="1"}' in text
+    assert metric_value(text, 'kittens_http_requests_in_progress{view="KittenListAPIView"}') == 0
+
+
+@pytest.mark.django_db
+def test_metrics_merge_processes(settings, tmp_path):
+    settings.KITTENS = {**settings.KITTENS, 'METRICS_DIR': str(tmp_path)}
+    labels = [["view", "RateKittenAPIView"], ["method", "POST"], ["status", "201"]]
+    # Состояние другого, уже завершившегося процесса
+    (tmp_path / "999999999-test.json").write_text(json.dumps({
+        "pid": 999999999,
+        "values": [
+            ["kittens_http_requests_total", labels, 3],
+            ["kittens_http_requests_in_progress", [["view", "RateKittenAPIView"]], 1],
+        ],
+        "histograms": [],
+    }))
+
+    text = APIClient().get('/metrics').content.decode()
+
+    assert metric_value(text, 'kittens_http_requests_total{view="RateKittenAPIView",method="POST",status="201"}') >= 3
+    assert 'kittens_http_requests_in_progress{view="RateKittenAPIView"} 1' not in text
+    assert any(path.name.startswith(f"{os.getpid()}-") for path in tmp_path.iterdir())
+
+
+@pytest.mark.django_db
+def test_metrics_flushed_when_worker_idle(settings, tmp_path):
+    settings.KITTENS = {**settings.KITTENS, 'METRICS_DIR': str(tmp_path), 'METRICS_FLUSH_INTERVAL': 60}
+
+    def merged_from_files():
+        # /metrics другого воркера: только файлы каталога, без состояния этого процесса в памяти
+        snapshots = [json.loads(path.read_text()) for path in tmp_path.glob('*.json')]
+        return metrics.render(snapshots)
+
+    APIClient().get('/api/breedlist')
+    in_progress = 'kittens_http_requests_in_progress{view="BreedListAPIView"}'
+    total = 'kittens_http_requests_total{view="BreedListAPIView",method="GET",status="200"}'
+    for _ in range(100):
+        text = merged_from_files()
+        if in_progress in text and metric_value(text, in_progress) == 0:
+            break
+        time.sleep(0.01)
+    assert metric_value(text, in_progress) == 0
+    assert metric_value(text, total) >= 1
+
+
+@pytest.mark.django_db
+def test_async_views_under_asgi(settings):
+    settings.KITTENS = {**settings.KITTENS, 'SERVER_TIMING_SAMPLE_RATE': 1.0}
+    breed = Breed.objects.create(name="Siamese")
+    user = User.objects.create_user(username="testuser", password="password")
+    kitten = Kitten.objects.create(name="Kitty1", breed=breed, age_in_months=2, owner=user, color="red", description="description")
+    auth = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    async def requests():
+        client = AsyncClient()
+        return (
+            await client.get('/api/breedlist'),
+            await client.get('/api/kittenlist', headers=auth),
+            await client.post('/api/kittenbybreed', {"breed_id": breed.id}, content_type='application/json'),
+            await client.post('/api/kittendetail', {"kitten_id": kitten.id}, content_type='application/json'),
+            await client.post('/api/kittendetail', {"kitten_id": kitten.id + 1}, content_type='application/json'),
+        )
+
+    breeds, kittens, by_breed, detail, missing = async_to_sync(requests)()
+
+    assert breeds.json() == [{"id": breed.id, "name": "Siamese"}]
+    assert [item['id'] for item in kittens.json()] == [kitten.id]
+    assert [item['id'] for item in by_breed.json()] == [kitten.id]
+    assert detail.json()['name'] == "Kitty1"
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+    # Запросы асинхронной ORM и аутентификация попадают в замеры
+    assert 'queries;desc="1"' in kittens['Server-Timing']
+    assert 'auth;dur=' in kittens['Server-Timing']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_concurrency(tmp_path, live_server):
+    output = tmp_path / "concurrency.json"
+    call_command(
+        'benchmark_concurrency', '--server', f'live={live_server.url}', '--connections', '5', '--idle', '0.05',
+        '--url-name', 'breedlist', '--output', str(output), stdout=StringIO(),
+    )
+
+    results = json.loads(output.read_text(encoding='utf-8'))['results']
+    assert results['live']['status_codes'] == {"200": 5}
+    # Задержка включает простой посреди запроса
+    assert results['live']['p50_ms'] >= 50
+
+    with pytest.raises(CommandError):
+        call_command('benchmark_concurrency', '--server', live_server.url, stdout=StringIO())
+
+
+@pytest.mark.django_db
+def test_jwt_user_from_claims():
+    user = User.objects.create_user(username="testuser", password="password")
+    client = APIClient()
+    tokens = client.post('/api/token', data={"username": "testuser", "password": "password"}, format='json').data
+    auth = {'HTTP_AUTHORIZATION': f"Bearer {tokens['access']}"}
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        response = client.put('/api/kittenmanage', data=[], format='json', **auth)
+    # Аутентификация пройдена, пустой пакет отклоняется проверкой данных
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not any('auth_user' in sql for sql, _ in recorder.queries)
+
+    user.is_active = False
+    user.save()
+    response = client.put('/api/kittenmanage', data=[], format='json', **auth)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_jwt_claims_user():
+    user = User.objects.create_user(username="testuser", password="password")
+    token = UserRefreshToken.for_user(user).access_token
+    authentication.forget_user(user.pk)
+
+    claims_user = authentication.ClaimsJWTAuthentication().get_user(token)
+
+    assert (claims_user.pk, claims_user.username, claims_user.is_active) == (user.pk, "testuser", True)
+    assert claims_user.instance == user
+    assert authentication.user_states.get(user.pk) == (True, "testuser")
+
+
+@pytest.mark.django_db
+def test_hashing_pool_rejects_when_full(settings):
+    User.objects.create_user(username="testuser", password="password")
+    settings.KITTENS = {**settings.KITTENS, 'HASHING_MAX_PENDING': 0}
+    client = APIClient()
+
+    register = client.post('/api/register', data={"username": "newuser", "password": "password"}, format='json')
+    token = client.post('/api/token', data={"username": "testuser", "password": "password"}, format='json')
+
+    assert register.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert token.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert token['Retry-After'] == '1'
+    assert not User.objects.filter(username="newuser").exists()
+    assert 'kittens_hashing_rejected_total{operation="check_password"}' in client.get('/metrics').content.decode()
+
+
+@pytest.mark.django_db
+def test_hashing_pool_verifies_passwords():
+    user = User.objects.create_user(username="testuser", password="password")
+
+    assert hashing.check_password("password", user.password) == (True, False)
+    assert hashing.check_password("wrong", user.password) == (False, False)
+    assert hashing.check_password("secret", hashing.make_password("secret"))[0]
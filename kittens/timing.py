@@ -0,0 +1,114 @@
+"""Замеры времени обработки запроса
+
+Замеры текущего запроса хранятся в контекстной переменной. Если запрос не
+попал в выборку (`SERVER_TIMING_SAMPLE_RATE`), переменная пуста и `timed()`
+сводится к одной проверке, поэтому инструментированный код можно оставлять
+включенным в production.
+
+SQL-запросы замеряются оберткой `execute_wrapper`, которая ставится на каждое
+соединение с БД при его открытии и передает длительность запроса наблюдателям
+из контекстной переменной (`observe_queries()`). Контекстные переменные
+переходят в потоки `sync_to_async`, поэтому запросы асинхронной ORM
+учитываются так же, как синхронные.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+_current = ContextVar('kittens_request_timings', default=None)
+_query_observers = ContextVar('kittens_query_observers', default=())
+
+
+class RequestTimings:
+    """Суммарные длительности этапов одного запроса в секундах и количество SQL-запросов."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.queries = 0
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+
+    def record_query(self, seconds):
+        """Наблюдатель для `observe_queries()`."""
+        self.add('db', seconds)
+        self.queries += 1
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        """Длительности в миллисекундах для лога."""
+        result = {f'{name}_ms': round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+        result['db_queries'] = self.queries
+        result['total_ms'] = round(self.total() * 1000, 3)
+        return result
+
+    def server_timing(self):
+        """Значение заголовка `Server-Timing`."""
+        metrics = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.durations.items()]
+        metrics.append(f'queries;desc="{self.queries}"')
+        metrics.append(f'total;dur={self.total() * 1000:.3f}')
+        return ', '.join(metrics)
+
+
+def start():
+    """Начинает замеры запроса. Возвращает замеры и токен для `finish()`."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время выполнения блока к этапу `name`, если запрос попал в выборку."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def observe_queries(observer):
+    """В пределах блока вызывает `observer(seconds)` после каждого SQL-запроса."""
+    token = _query_observers.set((*_query_observers.get(), observer))
+    try:
+        yield
+    finally:
+        _query_observers.reset(token)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    observers = _query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for observer in observers:
+            observer(elapsed)
+
+
+def install_execute_wrapper(connection):
+    """Ставит `execute_wrapper` на соединение (вызывается по сигналу `connection_created`)."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
@@ -11,7 +11,13 @@ urlpatterns = [
     path('breedlist', view=views.BreedListAPIView.as_view(), name='breedlist'),
     path('kittenlist', view=views.KittenListAPIView.as_view(), name='kittenlist'),
     path('kittenbybreed', view=views.KittenByBreedListAPIView.as_view(), name='kittenbybreed'),
+    path('kittens', view=views.KittenCatalogAPIView.as_view(), name='kittencatalog'),
+    path('kittens/export', view=views.KittenExportAPIView.as_view(), name='kittenexport'),
+    path('kittens/search', view=views.KittenSearchAPIView.as_view(), name='kittensearch'),
     path('kittendetail', view=views.KittenDetailAPIView.as_view(), name='kittendetail'),
+    path('my/kittens', view=views.MyKittensAPIView.as_view(), name='mykittens'),
+    path('leaderboard', view=views.LeaderboardAPIView.as_view(), name='leaderboard'),
     path('kittenmanage', view=views.KittenManageAPIView.as_view(), name='kittenmanage'),
     path('ratekitten', view=views.RateKittenAPIView.as_view(), name='ratekitten'),
+    path('ratekitten/batch', view=views.RateKittenBatchAPIView.as_view(), name='ratekittenbatch'),
 ]
\ No newline at end of file
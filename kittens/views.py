@@ -1,17 +1,88 @@
+import inspect
+from itertools import islice
+
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from kittens import aggregates
+from kittens import cache
+from kittens import catalog
+from kittens import hashing
 from kittens import models
+from kittens import rating_queue
+from kittens import ratings
+from kittens import search
 from kittens import serializers
-from django.core.handlers.wsgi import WSGIRequest
+from kittens import snapshot
+from kittens.conf import kitten_setting
+from kittens.pagination import InvalidPageParameter, KeysetPaginator, paginated_headers
+from kittens.renderers import NDJSONRenderer, ndjson_line
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import make_password
-from rest_framework_simplejwt.tokens import RefreshToken
+from kittens.authentication import UserRefreshToken
+
+
+# `query_budget` - наибольшее количество SQL-запросов на один запрос к представлению
+# (включая аутентификацию, когда состояние пользователя уже есть в кэше kittens.authentication).
+# Оно не должно зависеть от количества строк в БД; бюджеты проверяются тестом test_query_budgets.
+# `full_scans` - большие таблицы, которые представление намеренно читает целиком; полный просмотр
+# любой другой большой таблицы в плане запроса (EXPLAIN) считается регрессией (test_query_plans).
+# `replica_methods` - методы, которые только читают и могут читать с реплик БД (kittens/routers.py);
+# по умолчанию GET, HEAD и OPTIONS.
 
 
-class BreedListAPIView(APIView):
+def is_wsgi_request(request):
+    """
+    Запрос пришел через WSGI. Синхронное представление под ASGI выполняется
+    в потоке sync_to_async без цикла событий, поэтому проверить режим можно
+    только по самому запросу: WSGI-обработчик переносит окружение WSGI
+    (`wsgi.version` и т.д., PEP 3333) в `request.META`, а в ASGI-запросе его нет.
+    """
+    return 'wsgi.version' in request.META
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView с асинхронными обработчиками (`async def get` и т.д.).
+
+    Под ASGI такие представления выполняются в цикле событий и обращаются
+    к БД через асинхронную ORM, не занимая поток на время ожидания. Проверки
+    DRF (`initial()`: аутентификация, права, ограничение частоты) синхронны
+    и могут обращаться к БД, поэтому выполняются через `sync_to_async`.
+    Под WSGI Django сам вызывает такие представления через `async_to_sync`.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class BreedListAPIView(AsyncAPIView):
     """
     Получение списка пород
 
@@ -45,26 +116,49 @@ class BreedListAPIView(APIView):
     Где:
         id - id породы
         name - название породы
+
+    Список кэшируется в памяти процесса до следующего изменения пород.
+    В ответе передается заголовок `ETag`; если клиент пришлет его в
+    `If-None-Match`, а список не изменился, вернется `304 Not Modified`.
     """
-    def get(self, request: WSGIRequest):
-        breeds = models.Breed.objects.all()
-        serializer = serializers.BreedSerializer(breeds, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    query_budget = 1
+
+    async def get(self, request):
+        breed_list = await cache.aget_breed_list()
+        headers = {'ETag': breed_list.etag}
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if breed_list.etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+        return Response(breed_list.data, status=status.HTTP_200_OK, headers=headers)
 
-class KittenListAPIView(APIView):
+
+class KittenListAPIView(AsyncAPIView):
     """
     Получение списка всех котят
 
     Методы
 
     ### GET
-    Создает новый ресурс.
+    Возвращает страницу списка котят, отсортированного по id.
+
+    Параметры запроса:
+    - `page_size` (int): размер страницы (Опционально, ограничен сверху настройкой `MAX_PAGE_SIZE`)
+    - `cursor` (str): курсор следующей страницы (Опционально)
+    - `fields` (str): поля ответа через запятую, например `id,name` (Опционально, по умолчанию все).
+      Из БД читаются только столбцы выбранных полей.
+
+    Если есть следующая страница, ее курсор возвращается в заголовке `X-Next-Cursor`.
+
+    Если задана настройка `SNAPSHOT_DIR`, страницы с параметрами по умолчанию
+    отдаются из заранее собранного снимка (kittens/snapshot.py) без обращения
+    к БД, сжатыми gzip, если клиент это поддерживает. После изменения котят
+    затронутые страницы отдаются по БД, пока снимок не пересобран в фоне.
 
-    
     Пример запроса:
     ```
-    GET /api/kittenlist
+    GET /api/kittenlist?page_size=2
     ```
 
     **Пример ответа:**
@@ -91,13 +185,25 @@ class KittenListAPIView(APIView):
         breed - id породы
         owner - id владельца
     """
-    def get(self, request):
-        kittens = models.Kitten.objects.all()
-        serializer = serializers.KittenSerializer(kittens, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    query_budget = 1
+
+    async def get(self, request):
+        # Чтение файлов снимка блокирует, поэтому выполняется вне цикла событий
+        page = await sync_to_async(snapshot.find_page)(request)
+        if page is not None:
+            return snapshot.page_response(page)
+
+        fields = serializers.KittenSerializer.requested_fields(request)
+        paginator = KeysetPaginator(request)
+        queryset = models.Kitten.objects.only(*serializers.KittenSerializer.only_fields(fields, paginator.fields))
+        kittens, next_cursor = paginator.split(
+            [kitten async for kitten in paginator.page_queryset(queryset)]
+        )
+        serializer = serializers.KittenSerializer(kittens, many=True, fields=fields)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers=paginated_headers(next_cursor))
     
 
-class KittenByBreedListAPIView(APIView):
+class KittenByBreedListAPIView(AsyncAPIView):
     """
     Получение списка котят определенной породы по фильтру
 
@@ -108,6 +214,13 @@ class KittenByBreedListAPIView(APIView):
     Параметры:
     - `breed_id` (int): id породы
 
+    Параметры запроса:
+    - `page_size` (int): размер страницы (Опционально)
+    - `cursor` (str): курсор следующей страницы из заголовка `X-Next-Cursor` (Опционально)
+    - `fields` (str): поля ответа через запятую (Опционально, по умолчанию все)
+
+    Котята внутри породы отсортированы по id, страница выбирается по индексу (breed_id, id).
+
     Пример запроса:
     ```
     POST /api/kittenbybreed
@@ -139,21 +252,252 @@ class KittenByBreedListAPIView(APIView):
         breed - id породы
         owner - id владельца
     """
-    def post(self, request):
+    query_budget = 1
+    replica_methods = ('post',)
+
+    async def post(self, request):
         breed_id = request.data.get('breed_id')
         if not breed_id:
             return Response({"error": "Необходим параметр 'breed_id'"}, status=status.HTTP_400_BAD_REQUEST)
 
-        kittens = models.Kitten.objects.filter(breed_id=breed_id)
+        fields = serializers.KittenSerializer.requested_fields(request)
+        paginator = KeysetPaginator(request)
+        queryset = (
+            models.Kitten.objects
+            .filter(breed_id=breed_id)
+            .only(*serializers.KittenSerializer.only_fields(fields, paginator.fields))
+        )
+        kittens, next_cursor = paginator.split(
+            [kitten async for kitten in paginator.page_queryset(queryset)]
+        )
 
-        if not kittens.exists():
+        if not kittens and paginator.is_first_page:
             return Response({"message": "Котята не найдены."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = serializers.KittenSerializer(kittens, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = serializers.KittenSerializer(kittens, many=True, fields=fields)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers=paginated_headers(next_cursor))
     
 
-class KittenDetailAPIView(APIView):
+class KittenCatalogAPIView(AsyncAPIView):
+    """
+    Каталог котят с фильтрами, сортировкой и фасетами
+
+    Методы
+
+    GET
+
+    Параметры запроса (все опциональны):
+    - `breed` (int): id породы; можно передать несколько через запятую или повторить параметр
+    - `color` (str): цвет; можно повторить параметр
+    - `age_min`, `age_max` (int): диапазон возраста в месяцах, включительно
+    - `owner` (int): id владельца
+    - `min_rating` (float): минимальная средняя оценка
+    - `ordering` (str): `id` (по умолчанию), `name`, `age` или `rating`, с префиксом `-` - по убыванию
+    - `page_size` (int): размер страницы
+    - `cursor` (str): курсор следующей страницы из заголовка `X-Next-Cursor`
+    - `fields` (str): поля котят в `results` через запятую
+
+    Фасеты - количество котят, подходящих под фильтры, по породам и цветам -
+    возвращаются только на первой странице, на следующих `facets` равно null.
+
+    Пример запроса:
+    ```
+    GET /api/kittens?breed=1,2&age_max=12&ordering=-rating&page_size=2
+    ```
+
+    Пример ответа:
+    ```
+    {
+        "results": [
+            {
+                "id": 4,
+                "name": "Кот5",
+                "color": "Белый",
+                "age_in_months": 3,
+                "breed": 1,
+                "owner": 1,
+                "rating_count": 12,
+                "rating_average": 4.75
+            },
+            {
+                "id": 1,
+                "name": "Кот1",
+                "color": "Черный",
+                "age_in_months": 10,
+                "breed": 2,
+                "owner": 1,
+                "rating_count": 2,
+                "rating_average": 4.5
+            }
+        ],
+        "facets": {
+            "breed": [{"id": 1, "count": 7}, {"id": 2, "count": 3}],
+            "color": [{"value": "Белый", "count": 6}, {"value": "Черный", "count": 4}]
+        }
+    }
+    ```
+    Где:
+        rating_count - количество оценок
+        rating_average - средняя оценка (0, если оценок нет)
+        facets.breed - количество котят по id породы
+        facets.color - количество котят по цвету
+    """
+    query_budget = 2
+
+    async def get(self, request):
+        query = catalog.CatalogQuery(request.query_params)
+        fields = serializers.CatalogKittenSerializer.requested_fields(request)
+        paginator = KeysetPaginator(request, ordering=query.ordering)
+        queryset = query.queryset().only(*serializers.CatalogKittenSerializer.only_fields(fields, paginator.fields))
+        kittens, next_cursor = paginator.split(
+            [kitten async for kitten in paginator.page_queryset(queryset)]
+        )
+
+        facets = None
+        if paginator.is_first_page:
+            facets = catalog.build_facets([row async for row in query.facets_queryset()])
+
+        serializer = serializers.CatalogKittenSerializer(kittens, many=True, fields=fields)
+        return Response(
+            {"results": serializer.data, "facets": facets},
+            status=status.HTTP_200_OK,
+            headers=paginated_headers(next_cursor),
+        )
+
+
+class KittenExportAPIView(APIView):
+    """
+    Потоковая выгрузка всего каталога котят
+
+    Методы
+
+    GET
+    Возвращает всех котят в формате NDJSON (`application/x-ndjson`): один
+    JSON-объект на строку, в порядке возрастания id. Строки читаются из
+    серверного курсора БД пачками и сразу отправляются клиенту, поэтому
+    память сервера не зависит от размера каталога.
+
+    Пример запроса:
+    ```
+    GET /api/kittens/export
+    ```
+
+    Пример ответа:
+    ```
+    {"id":1,"name":"Кот1","color":"Черный","age_in_months":10,"description":"Черный кот","breed":1,"owner":1,"rating_count":2,"rating_sum":9,...,"breed_name":"Порода1","owner_username":"user1"}
+    {"id":2,"name":"Кот2","color":"Белый","age_in_months":3,"description":"Белый кот","breed":2,"owner":1,"rating_count":0,"rating_sum":0,...,"breed_name":"Порода2","owner_username":"user1"}
+    ```
+    Где кроме полей котенка:
+        breed_name - название породы
+        owner_username - имя владельца
+    """
+    query_budget = 1
+    full_scans = ('kittens_kitten',)
+    renderer_classes = [NDJSONRenderer]
+
+    def get(self, request):
+        chunk_size = kitten_setting('EXPORT_CHUNK_SIZE')
+        kittens = (
+            models.Kitten.objects
+            .order_by('id')
+            .values(
+                'id', 'name', 'color', 'age_in_months', 'description', 'breed', 'owner',
+                *aggregates.AGGREGATE_FIELDS,
+                breed_name=F('breed__name'), owner_username=F('owner__username'),
+            )
+        )
+        # Синхронный итератор ответа под ASGI Django сначала собирает целиком (sync_to_async(list)),
+        # поэтому там строки отдаются асинхронным генератором
+        lines = self.lines if is_wsgi_request(request) else self.async_lines
+        return StreamingHttpResponse(lines(kittens, chunk_size), content_type=NDJSONRenderer.media_type)
+
+    @staticmethod
+    def lines(kittens, chunk_size):
+        rows = kittens.iterator(chunk_size=chunk_size)
+        for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+            yield b''.join(ndjson_line(kitten) for kitten in chunk)
+
+    @staticmethod
+    async def async_lines(kittens, chunk_size):
+        chunk = []
+        async for kitten in kittens.aiterator(chunk_size=chunk_size):
+            chunk.append(ndjson_line(kitten))
+            if len(chunk) == chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+        if chunk:
+            yield b''.join(chunk)
+
+
+class KittenSearchAPIView(AsyncAPIView):
+    """
+    Поиск котят
+
+    Методы
+
+    GET
+    Возвращает котят, у которых имя, цвет, описание или название породы
+    совпадают с запросом, в порядке убывания релевантности. Поиск идет по
+    полнотекстовому индексу БД (см. kittens/search.py).
+
+    Параметры запроса:
+    - `q` (str): поисковый запрос
+    - `page_size` (int): размер страницы (Опционально)
+    - `cursor` (str): курсор следующей страницы из заголовка `X-Next-Cursor` (Опционально)
+
+    Пример запроса:
+    ```
+    GET /api/kittens/search?q=рыжий
+    ```
+
+    Пример ответа:
+    ```
+    [
+        {
+            "id": 7,
+            "name": "Рыжик",
+            "breed": 1,
+            "owner": 1,
+            "score": 12.4
+        },
+        {
+            "id": 3,
+            "name": "Кот3",
+            "breed": 2,
+            "owner": 1,
+            "score": 1.8
+        }
+    ]
+    ```
+    Где:
+        id - id котенка
+        name - имя котенка
+        breed - id породы
+        owner - id владельца
+        score - релевантность
+    """
+    query_budget = 1
+
+    async def get(self, request):
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return Response({"error": "Необходим параметр 'q'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = KeysetPaginator(request, ordering=search.ORDERING)
+        position = paginator.position
+        if position is not None:
+            try:
+                position = (float(position[0]), int(position[1]))
+            except (TypeError, ValueError):
+                raise InvalidPageParameter("Некорректный параметр 'cursor'")
+
+        kittens, next_cursor = paginator.split(
+            await sync_to_async(search.search)(q, position, paginator.page_size + 1)
+        )
+        return Response(kittens, status=status.HTTP_200_OK, headers=paginated_headers(next_cursor))
+
+
+class KittenDetailAPIView(AsyncAPIView):
     """
     Получение подробной информации о котенке.
 
@@ -164,6 +508,10 @@ class KittenDetailAPIView(APIView):
     Параметры:
     - `kitten_id` (int): id котенка
 
+    Параметры запроса:
+    - `fields` (str): поля ответа через запятую (Опционально, по умолчанию все).
+      Из БД читаются только столбцы выбранных полей.
+
     Пример запроса:
     ```
     POST /api/kittendetail
@@ -192,21 +540,219 @@ class KittenDetailAPIView(APIView):
         description - описание котенка
         breed - id породы
         owner - id владельца
+
+    Пакетный запрос: если передан `kitten_ids` (список id, не больше настройки
+    `KITTEN_DETAIL_BATCH_MAX_SIZE`), все котята загружаются одним запросом
+    `id__in` вместе с породой и владельцем. Котята возвращаются в порядке
+    `kitten_ids`, а id, которых нет в БД, - в списке `missing`.
+    ```
+    POST /api/kittendetail
+    {
+        "kitten_ids": [1, 2, 9999]
+    }
+    ```
+    ```
+    {
+        "results": [
+            {"id": 1, "name": "Кот1", ..., "breed_name": "Порода1", "owner_username": "user1"},
+            {"id": 2, "name": "Кот2", ..., "breed_name": "Порода2", "owner_username": "user1"}
+        ],
+        "missing": [9999]
+    }
+    ```
     """
-    def post(self, request):
+    query_budget = 1
+    replica_methods = ('post',)
+
+    async def post(self, request):
+        if 'kitten_ids' in request.data:
+            return await self.post_many(request)
+
         kitten_id = request.data.get('kitten_id')
         if not kitten_id:
             return Response({"error": "Необходим параметр 'kitten_id'"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        kitten = models.Kitten.objects.filter(id=kitten_id)
-        if not kitten.exists():
+
+        fields = serializers.DetailedKittenSerializer.requested_fields(request)
+        only_fields = serializers.DetailedKittenSerializer.only_fields(fields)
+        kitten = await models.Kitten.objects.filter(id=kitten_id).only(*only_fields).afirst()
+        if kitten is None:
             return Response({"message": "Котёнок не найден."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = serializers.DetailedKittenSerializer(kitten.first())
+        serializer = serializers.DetailedKittenSerializer(kitten, fields=fields)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    async def post_many(self, request):
+        kitten_ids = request.data['kitten_ids']
+        if (
+            not isinstance(kitten_ids, list)
+            or not all(isinstance(kitten_id, int) and not isinstance(kitten_id, bool) for kitten_id in kitten_ids)
+        ):
+            return Response({"error": "Параметр 'kitten_ids' должен быть списком id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_size = kitten_setting('KITTEN_DETAIL_BATCH_MAX_SIZE')
+        if len(kitten_ids) > max_size:
+            return Response(
+                {"error": f"В пакете должно быть не больше {max_size} котят"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fields = serializers.BatchKittenDetailSerializer.requested_fields(request)
+        only_fields = serializers.BatchKittenDetailSerializer.only_fields(fields, extra=['id'])
+        queryset = (
+            models.Kitten.objects
+            .filter(id__in=kitten_ids)
+            .select_related(*serializers.BatchKittenDetailSerializer.related(only_fields))
+            .only(*only_fields)
+        )
+        kittens = {kitten.id: kitten async for kitten in queryset}
+        ordered_ids = list(dict.fromkeys(kitten_ids))
+        serializer = serializers.BatchKittenDetailSerializer(
+            [kittens[kitten_id] for kitten_id in ordered_ids if kitten_id in kittens], many=True, fields=fields
+        )
+        return Response(
+            {"results": serializer.data, "missing": [kitten_id for kitten_id in ordered_ids if kitten_id not in kittens]},
+            status=status.HTTP_200_OK,
+        )
+
+
+class MyKittensAPIView(AsyncAPIView):
+    """
+    Котята текущего пользователя с агрегатами оценок
+
+    Методы
+
+    GET
+
+    **Заголовки:**
+        - `Authorization` (string, обязательный): JWT токен в формате `Bearer <токен>`.
+
+    Параметры запроса:
+    - `page_size` (int): размер страницы (Опционально)
+    - `cursor` (str): курсор следующей страницы из заголовка `X-Next-Cursor` (Опционально)
+
+    Котята отсортированы по id, страница выбирается по индексу (owner_id, id)
+    одним запросом с JOIN породы. Агрегаты читаются из столбцов котёнка,
+    которые обновляются вместе с оценками, поэтому таблица оценок не читается.
+
+    Пример запроса:
+    ```
+    GET /api/my/kittens?page_size=1
+    ```
+
+    Пример ответа:
+    ```
+    [
+        {
+            "id": 1,
+            "name": "Кот1",
+            "color": "Черный",
+            "age_in_months": 10,
+            "breed": 1,
+            "breed_name": "Порода1",
+            "rating_count": 2,
+            "rating_average": 4.5,
+            "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+        }
+    ]
+    ```
+    Где:
+        rating_count - количество оценок
+        rating_average - средняя оценка (0, если оценок нет)
+        rating_histogram - количество оценок по значениям от 1 до 5
+    """
+    query_budget = 1
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        paginator = KeysetPaginator(request)
+        queryset = (
+            models.Kitten.objects
+            .filter(owner_id=request.user.pk)
+            .select_related('breed')
+            .only(*serializers.OwnerKittenSerializer.model_fields)
+        )
+        kittens, next_cursor = paginator.split(
+            [kitten async for kitten in paginator.page_queryset(queryset)]
+        )
+        serializer = serializers.OwnerKittenSerializer(kittens, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers=paginated_headers(next_cursor))
+
+
+class LeaderboardAPIView(APIView):
+    """
+    Рейтинг котят
+
+    Места рассчитываются по байесовской средней оценке и хранятся в
+    предрассчитанной таблице, которую обновляет команда `recompute_leaderboard`.
+
+    Методы
+
+    GET
+
+    Параметры запроса:
+    - `breed_id` (int): id породы (Опционально, без него возвращается общий рейтинг)
+    - `limit` (int): количество мест (Опционально, не больше настройки `LEADERBOARD_SIZE`)
+
+    Пример запроса:
+    ```
+    GET /api/leaderboard?breed_id=1&limit=2
+    ```
+
+    Пример ответа:
+    ```
+    [
+        {
+            "position": 1,
+            "kitten": 4,
+            "name": "Кот5",
+            "breed": 1,
+            "score": 4.61,
+            "rating_count": 120,
+            "rating_average": 4.7
+        },
+        {
+            "position": 2,
+            "kitten": 1,
+            "name": "Кот1",
+            "breed": 1,
+            "score": 4.2,
+            "rating_count": 3,
+            "rating_average": 5.0
+        }
+    ]
+    ```
+    Где:
+        position - место
+        kitten - id котенка
+        name - имя котенка
+        breed - id породы (null в общем рейтинге)
+        score - байесовская оценка
+        rating_count - количество оценок
+        rating_average - средняя оценка
+    """
+    query_budget = 1
+
+    def get(self, request):
+        size = kitten_setting('LEADERBOARD_SIZE')
+        try:
+            limit = min(int(request.query_params.get('limit', size)), size)
+            breed_id = request.query_params.get('breed_id')
+            breed_id = int(breed_id) if breed_id else None
+        except ValueError:
+            return Response({"error": "Некорректные параметры 'limit' или 'breed_id'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = (
+            models.LeaderboardEntry.objects
+            .filter(breed_id=breed_id, position__lte=limit)
+            .select_related('kitten')
+            .order_by('position')
+        )
+        serializer = serializers.LeaderboardEntrySerializer(entries, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class KittenManageAPIView(APIView):
+    query_budget = 5
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -252,10 +798,24 @@ class KittenManageAPIView(APIView):
             "owner": 2
         }
         ```
+
+        Пакетное создание: если передан список котят, все они создаются одним
+        `bulk_create` в одной транзакции. При ошибках не создается ни один котенок,
+        а в ответе 400 возвращается список ошибок по каждому элементу (`{}` для корректных).
+        ```
+        POST /api/kittenmanage
+        [
+            {"name": "Кот1", "color": "Белый", "age_in_months": 2, "description": "Первый", "breed": 1},
+            {"name": "Кот2", "color": "Серый", "age_in_months": 2, "description": "Второй", "breed": 1}
+        ]
+        ```
         """
+        if isinstance(request.data, list):
+            return self.post_many(request)
+
         serializer = serializers.DetailedKittenSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(owner=request.user)
+            serializer.save(owner_id=request.user.pk)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -304,12 +864,27 @@ class KittenManageAPIView(APIView):
             "owner": 2
         }
         ```
+
+        Пакетное изменение: если передан список объектов с `kitten_id`, котята
+        владельца выбираются одним запросом и сохраняются одним `bulk_update`
+        в одной транзакции. При ошибках ничего не изменяется, а в ответе 400
+        возвращается список ошибок по каждому элементу.
+        ```
+        PUT /api/kittenmanage
+        [
+            {"kitten_id": 12, "name": "Супер-кот"},
+            {"kitten_id": 13, "age_in_months": 3}
+        ]
+        ```
         """
+        if isinstance(request.data, list):
+            return self.put_many(request)
+
         kitten_id = request.data.get('kitten_id')
         if not kitten_id:
             return Response({"error": "Необходим параметр 'kitten_id'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        kitten = get_object_or_404(models.Kitten, id=kitten_id, owner=request.user)
+        kitten = get_object_or_404(models.Kitten, id=kitten_id, owner_id=request.user.pk)
         serializer = serializers.DetailedKittenSerializer(kitten, data=request.data, partial=True)
 
         if serializer.is_valid():
@@ -346,19 +921,134 @@ class KittenManageAPIView(APIView):
             "message": "Котёнок успешно удален."
         }
         ```
+
+        Пакетное удаление: если передан список объектов с `kitten_id`, котята
+        владельца удаляются одним `DELETE ... WHERE id IN (...) AND owner_id = ...`.
+        Если какой-то котенок не найден, ничего не удаляется, а в ответе 400
+        возвращается список ошибок по каждому элементу.
+        ```
+        DELETE /api/kittenmanage
+        [
+            {"kitten_id": 12},
+            {"kitten_id": 13}
+        ]
+        ```
         """
+        if isinstance(request.data, list):
+            return self.delete_many(request)
+
         kitten_id = request.data.get('kitten_id')
         if not kitten_id:
             return Response({"error": "Необходим параметр 'kitten_id'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        kitten = get_object_or_404(models.Kitten, id=kitten_id, owner=request.user)
+        kitten = get_object_or_404(models.Kitten, id=kitten_id, owner_id=request.user.pk)
         kitten.delete()
         return Response({"message": "Котёнок успешно удален."}, status=status.HTTP_204_NO_CONTENT)
+
+    def check_batch_size(self, items):
+        if not items:
+            return Response({"error": "Ожидается непустой список котят"}, status=status.HTTP_400_BAD_REQUEST)
+        max_size = kitten_setting('KITTEN_BATCH_MAX_SIZE')
+        if len(items) > max_size:
+            return Response(
+                {"error": f"В пакете должно быть не больше {max_size} котят"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return None
+
+    def owned_kittens(self, request, items, errors):
+        """
+        Выбирает одним запросом котят пользователя, перечисленных в `items`,
+        и дописывает в `errors` ошибки для элементов без `kitten_id`, с некорректным
+        или повторяющимся `kitten_id` и с чужим котенком.
+        """
+        kitten_ids = [item.get('kitten_id') if isinstance(item, dict) else None for item in items]
+        valid = [isinstance(kitten_id, int) and not isinstance(kitten_id, bool) for kitten_id in kitten_ids]
+        kittens = models.Kitten.objects.select_for_update().filter(
+            id__in=[kitten_id for kitten_id, is_valid in zip(kitten_ids, valid) if is_valid],
+            owner_id=request.user.pk,
+        ).in_bulk()
+
+        seen = set()
+        for index, (kitten_id, is_valid) in enumerate(zip(kitten_ids, valid)):
+            if not kitten_id:
+                error = "Необходим параметр 'kitten_id'"
+            elif not is_valid:
+                error = "Некорректный параметр 'kitten_id'"
+            elif kitten_id in seen:
+                error = "Котёнок указан в пакете несколько раз."
+            elif kitten_id not in kittens:
+                error = "Котёнок не найден."
+            else:
+                error = None
+            if error:
+                errors[index] = {**errors[index], "kitten_id": [error]}
+            if is_valid:
+                seen.add(kitten_id)
+        return kitten_ids, kittens
+
+    def post_many(self, request):
+        error_response = self.check_batch_size(request.data)
+        if error_response:
+            return error_response
+
+        serializer = serializers.KittenBulkSerializer(data=request.data, many=True)
+        if serializer.is_valid():
+            with transaction.atomic():
+                created = serializer.save(owner_id=request.user.pk)
+                # bulk_create не вызывает сигналы; без id новых котят устаревшим считается весь снимок
+                snapshot.schedule_rebuild(min((kitten.pk for kitten in created if kitten.pk is not None), default=None))
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def put_many(self, request):
+        error_response = self.check_batch_size(request.data)
+        if error_response:
+            return error_response
+
+        serializer = serializers.KittenBulkSerializer(data=request.data, many=True, partial=True)
+        is_valid = serializer.is_valid()
+        errors = list(serializer.errors) if not is_valid else [{} for _ in request.data]
+
+        with transaction.atomic():
+            kitten_ids, kittens = self.owned_kittens(request, request.data, errors)
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            updated, fields = [], set()
+            for kitten_id, attrs in zip(kitten_ids, serializer.validated_data):
+                kitten = kittens[kitten_id]
+                for field, value in attrs.items():
+                    setattr(kitten, field, value)
+                fields.update(attrs)
+                updated.append(kitten)
+
+            if fields:
+                models.Kitten.objects.bulk_update(kittens.values(), fields)
+                # bulk_update не вызывает сигналы
+                snapshot.schedule_rebuild(min(kittens))
+
+        return Response(serializers.DetailedKittenSerializer(updated, many=True).data, status=status.HTTP_200_OK)
+
+    def delete_many(self, request):
+        error_response = self.check_batch_size(request.data)
+        if error_response:
+            return error_response
+
+        errors = [{} for _ in request.data]
+        with transaction.atomic():
+            _, kittens = self.owned_kittens(request, request.data, errors)
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            models.Kitten.objects.filter(id__in=kittens, owner_id=request.user.pk).delete()
+
+        return Response({"message": "Котята успешно удалены."}, status=status.HTTP_204_NO_CONTENT)
     
 
 User = get_user_model()
 
-class RegisterAPIView(APIView):
+class RegisterAPIView(AsyncAPIView):
     """
     Регистрация нового пользователя.
 
@@ -412,11 +1102,17 @@ class RegisterAPIView(APIView):
     }
     ```
 
+    - **503 Service Unavailable**: очередь пула хеширования паролей заполнена, повторите запрос позже
+      (заголовок `Retry-After`).
+
     **Примечания:**
-    - Пароль перед сохранением будет хешироваться для обеспечения безопасности.
+    - Пароль перед сохранением будет хешироваться для обеспечения безопасности. Хеширование выполняется
+      в пуле процессов `kittens.hashing` и не занимает поток или цикл событий, обслуживающий запросы.
     - Пользовательский токен доступа и токен обновления будут возвращены в ответе при успешной регистрации.
     """
-    def post(self, request):
+    query_budget = 2
+
+    async def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
 
@@ -426,16 +1122,20 @@ class RegisterAPIView(APIView):
         if not password:
             return Response({"error": "Необходим параметр 'password'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        if User.objects.filter(username=username).exists():
+        if await User.objects.filter(username=username).aexists():
             return Response({"error": "Пользователь с таким именем уже существует."}, status=status.HTTP_400_BAD_REQUEST)
 
         user = User(
             username=username,
-            password=make_password(password),
+            password=await hashing.amake_password(password),
         )
-        user.save()
+        try:
+            await user.asave()
+        except IntegrityError:
+            # Пользователя с тем же именем успел зарегистрировать параллельный запрос
+            return Response({"error": "Пользователь с таким именем уже существует."}, status=status.HTTP_400_BAD_REQUEST)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
 
         return Response({
             'refresh': str(refresh),
@@ -464,6 +1164,9 @@ class RateKittenAPIView(APIView):
     **Возвращает:**
     - **201 Created**: Успешно добавленная оценка.
     - **200 OK**: Успешно обновлённая оценка.
+    - **202 Accepted**: Оценка принята в очередь отложенной записи (настройка `RATING_QUEUE`,
+      см. kittens/rating_queue.py), но еще не сохранена: она будет записана и появится
+      в агрегатах котёнка после переноса очереди.
     - **400 Bad Request**: 
         - Если отсутствует параметр `kitten_id`:
             ```json
@@ -508,10 +1211,20 @@ class RateKittenAPIView(APIView):
     }
     ```
 
+    **Пример ответа в режиме отложенной записи:**
+    ```
+    {
+        "message": "Оценка принята в очередь и будет учтена после обработки."
+    }
+    ```
+
     **Примечания:**
     - Доступ к этому API возможен только для авторизованных пользователей.
     - Пользователи могут оценивать одного котёнка только один раз. Если оценка уже существует, она будет обновлена.
+    - На PostgreSQL оценка записывается одним оператором `INSERT ... ON CONFLICT DO UPDATE`,
+      поэтому одновременные первые оценки одного пользователя не приводят к ошибке уникальности.
     """
+    query_budget = 4
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -527,15 +1240,112 @@ class RateKittenAPIView(APIView):
         if not (1 <= rating_value <= 5):
             return Response({"error": "Оценка должна быть в пределах от 1 до 5"}, status=status.HTTP_400_BAD_REQUEST)
 
-        kitten = get_object_or_404(models.Kitten, id=kitten_id)
+        if rating_queue.enabled():
+            if not models.Kitten.objects.filter(id=kitten_id).exists():
+                raise Http404("No Kitten matches the given query.")
+            rating_queue.enqueue(kitten_id, request.user.pk, rating_value)
+            return Response(
+                {"message": "Оценка принята в очередь и будет учтена после обработки."},
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-        existing_rating = models.Rating.objects.filter(kitten=kitten, user=request.user).first()
+        created = ratings.upsert_rating(kitten_id, request.user.pk, rating_value)
 
-        if existing_rating:
-            existing_rating.rating = rating_value
-            existing_rating.save()
-            return Response({"message": "Оценка обновлена."}, status=status.HTTP_200_OK)
+        if created is None:
+            raise Http404("No Kitten matches the given query.")
 
-        models.Rating.objects.create(kitten=kitten, user=request.user, rating=rating_value)
+        if not created:
+            return Response({"message": "Оценка обновлена."}, status=status.HTTP_200_OK)
 
         return Response({"message": "Оценка успешно добавлена."}, status=status.HTTP_201_CREATED)
+
+
+class RateKittenBatchAPIView(APIView):
+    """
+    Пакетная оценка котят.
+
+    Позволяет судье отправить сразу много оценок одним запросом. Весь пакет
+    проверяется в памяти, существование котят проверяется одним запросом,
+    а оценки записываются одним пакетным upsert в одной транзакции.
+
+    ## Методы
+
+    ### POST
+    Добавляет или обновляет оценки для указанных котят.
+
+    **Заголовки:**
+        - `Authorization` (string, обязательный): JWT токен в формате `Bearer <токен>`.
+
+    **Параметры:**
+    Список объектов (не больше настройки `RATING_BATCH_MAX_SIZE`):
+    - `kitten_id` (int, обязательный): Идентификатор котёнка.
+    - `rating_value` (int, обязательный): Оценка котёнка от 1 до 5.
+
+    **Возвращает:**
+    - **200 OK**: Результат по каждому элементу в том же порядке.
+    - **400 Bad Request**: Если передан не список или пакет слишком большой.
+
+    **Пример запроса:**
+    ```
+    POST /api/ratekitten/batch
+    [
+        {"kitten_id": 1, "rating_value": 5},
+        {"kitten_id": 2, "rating_value": 4},
+        {"kitten_id": 9999, "rating_value": 3},
+        {"kitten_id": 3, "rating_value": 10}
+    ]
+    ```
+
+    **Пример ответа:**
+    ```
+    [
+        {"kitten_id": 1, "status": "created"},
+        {"kitten_id": 2, "status": "updated"},
+        {"kitten_id": 9999, "status": "error", "error": "Котёнок не найден."},
+        {"kitten_id": 3, "status": "error", "error": "Оценка должна быть в пределах от 1 до 5"}
+    ]
+    ```
+
+    **Примечания:**
+    - Ошибочные элементы не мешают записи остальных.
+    - Если один котёнок встречается в пакете несколько раз, сохраняется последняя оценка.
+    """
+    query_budget = 4
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"error": "Ожидается список оценок"}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_size = kitten_setting('RATING_BATCH_MAX_SIZE')
+        if len(items) > max_size:
+            return Response(
+                {"error": f"В пакете должно быть не больше {max_size} оценок"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        parsed = []
+        for item in items:
+            try:
+                parsed.append(ratings.validate_rating_item(item))
+            except ValueError as error:
+                parsed.append(error)
+
+        results = ratings.upsert_ratings([
+            (outcome[0], request.user.pk, outcome[1]) for outcome in parsed if isinstance(outcome, tuple)
+        ])
+
+        response = []
+        for item, outcome in zip(items, parsed):
+            kitten_id = item.get('kitten_id') if isinstance(item, dict) else None
+            if isinstance(outcome, ValueError):
+                response.append({"kitten_id": kitten_id, "status": "error", "error": str(outcome)})
+                continue
+
+            created = results[kitten_id, request.user.pk]
+            if created is None:
+                response.append({"kitten_id": kitten_id, "status": "error", "error": "Котёнок не найден."})
+            else:
+                response.append({"kitten_id": kitten_id, "status": "created" if created else "updated"})
+        return Response(response, status=status.HTTP_200_OK)
@@ -0,0 +1,26 @@
+"""
+Настройки для бенчмарков: локальная база SQLite вместо PostgreSQL.
+
+Пример:
+    python manage.py migrate --settings=settings.benchmark
+    python manage.py seed_synthetic --settings=settings.benchmark
+    python manage.py benchmark_endpoints --settings=settings.benchmark --output bench.json
+"""
+
+from settings.settings import *  # noqa: F401,F403
+from settings.settings import BASE_DIR, KITTENS
+
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['localhost', 'testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',
+    }
+}
+
+# Разбивка времени по этапам для каждого запроса бенчмарка
+KITTENS = {**KITTENS, 'SERVER_TIMING_SAMPLE_RATE': 1.0}
@@ -0,0 +1,32 @@
+"""
+Настройки для локальной проверки чтения с реплик: две базы SQLite.
+
+`replica.sqlite3` заменяет реплику - это отдельный файл, который не
+получает изменений из `default`, поэтому его нужно заполнить самостоятельно
+(например, скопировать `default.sqlite3` после миграций). Так видно, из
+какой базы прочитан ответ, и проверяется, что после записи клиент читает
+из `default`.
+
+Пример:
+    python manage.py migrate --settings=settings.replica
+    cp default.sqlite3 replica.sqlite3
+    python manage.py runserver --settings=settings.replica
+    python -m pytest --ds=settings.replica -k replica
+"""
+
+from settings.settings import *  # noqa: F401,F403
+from settings.settings import BASE_DIR, KITTENS
+
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'default.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+    },
+}
+
+KITTENS = {**KITTENS, 'REPLICAS': ['replica']}
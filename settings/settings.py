@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -44,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'kittens.middleware.MetricsMiddleware',
+    'kittens.middleware.ServerTimingMiddleware',
+    'kittens.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,10 +92,25 @@ DATABASES = {
     }
 }
 
+# Реплика PostgreSQL для чтения (kittens/routers.py); в тестах она указывает на тестовую БД default
+if os.environ.get('KITTENS_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['KITTENS_REPLICA_HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['kittens.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# Пароли при входе проверяются в пуле процессов kittens.hashing
+AUTHENTICATION_BACKENDS = [
+    'kittens.authentication.PooledModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,7 +152,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'kittens.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'kittens.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 # REST_FRAMEWORK = {
@@ -145,4 +168,43 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=10),  # Время жизни токена
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),  # Время жизни refresh токена
+    'TOKEN_OBTAIN_SERIALIZER': 'kittens.serializers.UserTokenObtainPairSerializer',  # Добавляет username в токены
+}
+
+KITTENS = {
+    'PAGE_SIZE': 100,  # Размер страницы списков котят по умолчанию
+    'MAX_PAGE_SIZE': 1000,  # Максимальный размер страницы, который может запросить клиент
+    # Доля запросов с заголовком Server-Timing и строкой лога kittens.timing (0 - выключено);
+    # заголовок раскрывает внутренние замеры любому клиенту, поэтому в production выключен
+    'SERVER_TIMING_SAMPLE_RATE': float(os.environ.get('KITTENS_SERVER_TIMING_SAMPLE_RATE', 0.0)),
+    # Общий каталог метрик воркеров для /metrics; без него /metrics показывает только свой процесс
+    'METRICS_DIR': os.environ.get('KITTENS_METRICS_DIR'),
+    # Каталог снимка страниц /api/kittenlist (kittens/snapshot.py); без него список всегда читается из БД
+    'SNAPSHOT_DIR': os.environ.get('KITTENS_SNAPSHOT_DIR'),
+    # 0 - снимок пересобирает отдельный процесс `manage.py build_catalog_snapshot --watch`
+    'SNAPSHOT_BUILDER_THREAD': os.environ.get('KITTENS_SNAPSHOT_BUILDER_THREAD', '1') == '1',
+    # Псевдонимы БД-реплик, с которых читают GET-запросы (kittens/routers.py)
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    # Отложенная запись оценок /api/ratekitten через очередь (kittens/rating_queue.py)
+    'RATING_QUEUE': os.environ.get('KITTENS_RATING_QUEUE') == '1',
+    # 1 - переносить очередь в самом веб-процессе (один процесс, например runserver);
+    # иначе рядом с веб-процессами запускается `manage.py flush_ratings`
+    'RATING_QUEUE_FLUSH_THREAD': os.environ.get('KITTENS_RATING_QUEUE_FLUSH_THREAD') == '1',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Разбивка времени обработки запросов по этапам, одна JSON-строка на запрос
+        'kittens.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }